@@ -1,5 +1,19 @@
-import aws_policy_generator.auto_shortener
-import aws_policy_generator.args_generator
-import aws_policy_generator.mappings
-import aws_policy_generator.yaml_generator
-import aws_policy_generator.safe_minimizer  # noqa: F401
+import importlib
+import pkgutil
+
+# submodules are imported on first access (PEP 562), as several of them load
+# the IAM database or policyuniverse, which is slow
+SUBMODULES = sorted(
+    x.name for x in pkgutil.iter_modules(__path__) if not x.name.startswith("_")
+)
+
+
+def __getattr__(name):
+    if name in SUBMODULES:
+        return importlib.import_module(f"{__name__}.{name}")
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(SUBMODULES))
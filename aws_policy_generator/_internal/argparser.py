@@ -1,7 +1,31 @@
 import argparse
+import os
+
+from aws_policy_generator.executor import EXECUTORS
+from aws_policy_generator.server import SOCKET_ENV
+from aws_policy_generator.trie_minimizer import MINIMIZERS
+
+# --profile without a file
+PROFILE_TO_STDERR = "-"
+
+
+def positive_int(value: str) -> int:
+    try:
+        result = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: {value!r}")
+
+    if result < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1: {value}")
+
+    return result
+
 
 parser = argparse.ArgumentParser(
-    description="Generate IAM policies from the command line"
+    description="Generate IAM policies from the command line",
+    epilog="Run 'aws-policy-generator cache {stats,clear}' to manage the on-disk"
+    + " cache, 'aws-policy-generator index build' to build the action index, or"
+    + " 'aws-policy-generator serve --socket PATH' to start a daemon.",
 )
 parser.add_argument(
     "-f",
@@ -21,6 +45,14 @@ parser.add_argument(
     default=False,
     help="Attempt to automatically shorten the policy if it's too long",
 )
+parser.add_argument(
+    "--split",
+    action="store_true",
+    default=False,
+    help="If the policy is too long even after auto-shortening, split it into"
+    + " several policies, each within --max-length, written to --out-dir (or"
+    + " printed as a JSON array)",
+)
 parser.add_argument(
     "-m",
     "--minimize",
@@ -28,6 +60,14 @@ parser.add_argument(
     default=False,
     help="Attempt to minimize policies",
 )
+parser.add_argument(
+    "--minimizer",
+    choices=MINIMIZERS,
+    default=None,
+    help="Minimize with policyuniverse (the default, unless a daemon has another),"
+    + " or with a prefix trie over the IAM database's actions, which is faster"
+    + " and keeps unknown actions",
+)
 parser.add_argument(
     "-c",
     "--compact",
@@ -73,6 +113,13 @@ parser.add_argument(
     + " specified as service:type (e.g. ec2:instance) to the generated policy, can be"
     + " repeated",
 )
+parser.add_argument(
+    "--print-plan",
+    action="store_true",
+    default=False,
+    help="Print the items that will be generated to stderr, and which are skipped"
+    + " because they are duplicated, or granted by another item",
+)
 parser.add_argument(
     "--no-wildcards",
     action="store_true",
@@ -87,3 +134,158 @@ parser.add_argument(
     help="Include service-wide actions (ones not linked to a particular resource type)"
     + " when using resource types",
 )
+parser.add_argument(
+    "--no-cache",
+    action="store_true",
+    default=False,
+    help="Do not read or write the on-disk cache of generated service policies",
+)
+parser.add_argument(
+    "--no-index",
+    action="store_true",
+    default=False,
+    help="Do not use the action index, even if one has been built",
+)
+parser.add_argument(
+    "-o",
+    "--output",
+    help="Write the policy to this file, rather than to stdout",
+)
+parser.add_argument(
+    "--batch-dir",
+    help="Generate one policy per YAML file in this directory (and its"
+    + " subdirectories), writing each to --out-dir",
+)
+parser.add_argument(
+    "--out-dir",
+    help="Directory to write policies to in --batch-dir mode, mirroring the"
+    + " layout of --batch-dir, or to write numbered policies to with --split",
+)
+parser.add_argument(
+    "-j",
+    "--jobs",
+    type=positive_int,
+    default=None,
+    help="Number of worker processes to use in --batch-dir mode (default: one per"
+    + " CPU). Otherwise, generate the items of YAML files concurrently on this"
+    + " many workers (default: one after another)",
+)
+parser.add_argument(
+    "--executor",
+    choices=EXECUTORS,
+    default="process",
+    help="Kind of worker to generate the items of YAML files on with --jobs",
+)
+parser.add_argument(
+    "--incremental",
+    action="store_true",
+    default=False,
+    help="In --batch-dir mode, only regenerate policies whose YAML file, options"
+    + " or tool versions changed since the last run",
+)
+parser.add_argument(
+    "--import-profile",
+    action="store_true",
+    default=False,
+    help="Print the modules imported while generating, and how long each took,"
+    + " to stderr",
+)
+parser.add_argument(
+    "--profile",
+    nargs="?",
+    const=PROFILE_TO_STDERR,
+    metavar="JSON_FILE",
+    help="Report the wall time, CPU time and peak memory of each stage of"
+    + " generation, and counts of the work done, to stderr, or as JSON to"
+    + " JSON_FILE if given. Profiled runs are never sent to a daemon",
+)
+parser.add_argument(
+    "--profile-pstats",
+    metavar="FILE",
+    help="Write cProfile statistics for the run to FILE, for use with pstats",
+)
+parser.add_argument(
+    "--trace",
+    metavar="JSON_FILE",
+    help="Write each stage of generation to JSON_FILE as a Chrome trace, to"
+    + " open in a trace viewer such as Perfetto",
+)
+parser.add_argument(
+    "--stream",
+    action="store_true",
+    default=False,
+    help="Read specs from stdin, as JSON Lines (objects shaped like the YAML"
+    + " format) or a multi-document YAML stream, writing each one's policy to"
+    + " stdout as a line of JSON as soon as it is generated",
+)
+parser.add_argument(
+    "--socket",
+    default=os.environ.get(SOCKET_ENV),
+    help="Forward the request to the daemon listening on this Unix socket (see"
+    + f" 'aws-policy-generator serve'), if it is running. Defaults to ${SOCKET_ENV}",
+)
+
+# 'aws-policy-generator cache <command>' manages the on-disk cache
+cache_parser = argparse.ArgumentParser(
+    prog="aws-policy-generator cache",
+    description="Manage the on-disk cache of generated service policies",
+)
+cache_subparsers = cache_parser.add_subparsers(dest="command", required=True)
+cache_subparsers.add_parser("stats", help="Print cache location, size and entries")
+cache_subparsers.add_parser("clear", help="Remove all cached entries")
+
+# 'aws-policy-generator index <command>' manages the action index
+index_parser = argparse.ArgumentParser(
+    prog="aws-policy-generator index",
+    description="Manage the memory-mapped index of IAM actions, which speeds up"
+    + " policy generation. Rebuild it after upgrading aws-iam-utils.",
+)
+index_subparsers = index_parser.add_subparsers(dest="command", required=True)
+index_build_parser = index_subparsers.add_parser(
+    "build", help="Build the action index from the installed IAM database"
+)
+index_build_parser.add_argument(
+    "-o",
+    "--output",
+    help="Write the index here, rather than to the default location (an index"
+    + " written elsewhere is not used automatically)",
+)
+
+# 'aws-policy-generator serve' runs a daemon that generates policies on request
+serve_parser = argparse.ArgumentParser(
+    prog="aws-policy-generator serve",
+    description="Keep the IAM database and caches loaded in a daemon, generating"
+    + " policies for 'aws-policy-generator --socket PATH' requests",
+)
+serve_parser.add_argument(
+    "--socket",
+    required=True,
+    help="Path of the Unix socket to listen on",
+)
+serve_parser.add_argument(
+    "-j",
+    "--workers",
+    type=positive_int,
+    default=None,
+    help="Number of requests to handle at once (default: Python's thread pool"
+    + " default)",
+)
+serve_parser.add_argument(
+    "--no-cache",
+    action="store_true",
+    default=False,
+    help="Do not read or write the on-disk cache of generated service policies",
+)
+serve_parser.add_argument(
+    "--no-index",
+    action="store_true",
+    default=False,
+    help="Do not use the action index, even if one has been built",
+)
+serve_parser.add_argument(
+    "--minimizer",
+    choices=MINIMIZERS,
+    default="policyuniverse",
+    help="Minimize requests that do not name a minimizer with policyuniverse, or"
+    + " with a prefix trie over the IAM database's actions",
+)
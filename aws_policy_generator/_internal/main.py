@@ -1,45 +1,476 @@
+import importlib
 import json
+import os
+import signal
 import sys
 
-from aws_policy_generator.args_generator import generate_from_args
+from contextlib import contextmanager
+from contextlib import redirect_stdout
+
+from aws_policy_generator.action_index import ActionIndex
+from aws_policy_generator.args_generator import args_tasks
+from aws_policy_generator.action_index import build_action_index
+from aws_policy_generator.action_index import configure_action_index
+from aws_policy_generator.action_index import load_action_index
 from aws_policy_generator.auto_shortener import auto_shorten_policy
-from aws_policy_generator.yaml_generator import generate_from_yaml
+from aws_policy_generator.auto_shortener import write_shortened_policy
+from aws_policy_generator.cache import configure_disk_cache
+from aws_policy_generator.disk_cache import DiskCache
+from aws_policy_generator.imports import lazy_function
+from aws_policy_generator.imports import profile_imports
+from aws_policy_generator.json_writer import write_json
+from aws_policy_generator.planner import Plan
+from aws_policy_generator.profiler import ChromeTrace
+from aws_policy_generator.profiler import annotate
+from aws_policy_generator.profiler import count
+from aws_policy_generator.profiler import observing
+from aws_policy_generator.profiler import profile_pipeline
+from aws_policy_generator.profiler import stage
+from aws_policy_generator.policy_util import PolicyAccumulator
+from aws_policy_generator.server import PolicyServer
+from aws_policy_generator.server import request
+from aws_policy_generator.stream import documents
+from aws_policy_generator.stream import load_document
+from aws_policy_generator.splitter import auto_split_policy
 from aws_policy_generator._internal import argparser
-from aws_iam_utils.combiner import collapse_policy_statements
-from policyuniverse.expander_minimizer import expand_policy
+from aws_policy_generator._internal.argparser import PROFILE_TO_STDERR
 
+# these load the IAM database or policyuniverse, which is slow, so they are
+# imported only once a run needs them (and never for --help or bad arguments)
+generate_from_yaml = lazy_function(
+    "aws_policy_generator.yaml_generator", "generate_from_yaml"
+)
+generate_from_spec = lazy_function(
+    "aws_policy_generator.yaml_generator", "generate_from_spec"
+)
+add_tasks = lazy_function("aws_policy_generator.yaml_generator", "add_tasks")
+spec_tasks = lazy_function("aws_policy_generator.yaml_generator", "spec_tasks")
+generate_batch = lazy_function("aws_policy_generator.batch", "generate_batch")
+expand_policy = lazy_function("aws_policy_generator.expander", "expand_policy")
 
-def main(args=None, return_policy=False):
-    if args is None:
-        args = sys.argv[1:]
+# arguments that --batch-dir and --stream modes would ignore, as each spec is
+# its own policy
+SPEC_IGNORED_ARGUMENTS = {
+    "-f/--file": "file",
+    "-A/--action": "action",
+    "-a/--full-access": "full_access",
+    "-r/--read": "read",
+    "-w/--write": "write",
+    "-l/--list": "list",
+}
+
+# loaded up front by 'serve', so that the daemon's first requests are fast
+WARM_MODULES = [
+    "aws_policy_generator.args_generator",
+    "aws_policy_generator.yaml_generator",
+    "aws_policy_generator.safe_minimizer",
+    "aws_policy_generator.expander",
+    "aws_iam_utils.generator",
+    "policyuniverse.expander_minimizer",
+]
+
+
+def cache_command(args):
+    args_namespace = argparser.cache_parser.parse_args(args)
+    disk_cache = DiskCache()
+
+    if args_namespace.command == "stats":
+        return json.dumps(disk_cache.stats(), indent=2)
+
+    elif args_namespace.command == "clear":
+        return json.dumps({"removed": disk_cache.clear()}, indent=2)
+
+
+def index_command(args):
+    args_namespace = argparser.index_parser.parse_args(args)
+
+    if args_namespace.command == "build":
+        path = build_action_index(args_namespace.output)
+        return json.dumps({"path": path, "actions": len(ActionIndex(path))}, indent=2)
+
+
+def batch_command(args_namespace):
+    """Runs --batch-dir mode, returning a summary and whether any spec failed."""
+    results = generate_batch(
+        args_namespace.batch_dir,
+        args_namespace.out_dir,
+        jobs=args_namespace.jobs,
+        incremental=args_namespace.incremental,
+        no_wildcards=args_namespace.no_wildcards,
+        auto_shorten=args_namespace.auto_shorten,
+        minimize=args_namespace.minimize,
+        compact=args_namespace.compact,
+        max_length=args_namespace.max_length,
+        minimizer=args_namespace.minimizer,
+    )
+
+    failed = [x for x in results if "error" in x]
+    for result in failed:
+        print(f"error: {result['spec']}: {result['error']}", file=sys.stderr)
+
+    skipped = [x for x in results if x.get("skipped")]
+
+    summary = {
+        "generated": len(results) - len(failed) - len(skipped),
+        "skipped": len(skipped),
+        "failed": failed,
+    }
+    return json.dumps(summary, indent=2), len(failed) > 0
+
+
+def split_command(args_namespace, policy):
+    """Runs --split mode, returning the policies as a JSON array, or a summary
+    of the files they were written to if --out-dir is given."""
+    policy_strs = auto_split_policy(
+        policy,
+        minimize=args_namespace.minimize,
+        compact=args_namespace.compact,
+        max_length=args_namespace.max_length,
+        minimizer=args_namespace.minimizer,
+    )
+
+    if not args_namespace.out_dir:
+        if args_namespace.compact:
+            return "[" + ", ".join(policy_strs) + "]"
+
+        return "[\n" + ",\n".join(policy_strs) + "\n]"
+
+    os.makedirs(args_namespace.out_dir, exist_ok=True)
+
+    paths = []
+    for i, policy_str in enumerate(policy_strs, start=1):
+        paths.append(os.path.join(args_namespace.out_dir, f"policy-{i}.json"))
+        with open(paths[-1], "w") as f:
+            f.write(policy_str + "\n")
+
+    return json.dumps({"policies": paths}, indent=2)
 
-    args_namespace = argparser.parser.parse_args(args)
 
-    policies = []
+def stream_command(args_namespace, input_lines, output):
+    """Runs --stream mode, writing one line to output for each spec document
+    in input_lines: the policy as compact JSON, or {"error": ...} if that spec
+    failed.
 
-    if args_namespace.file:
-        for file in args_namespace.file:
-            with open(file, "r") as f:
-                policies.append(generate_from_yaml(f))
+    Anything else printed while generating (policyuniverse prints as it
+    minimizes) goes to stderr, so that output only ever holds JSON lines."""
+    for document in documents(input_lines):
+        try:
+            with redirect_stdout(sys.stderr):
+                policy_str = __stream_policy(args_namespace, document)
 
-    policies.append(generate_from_args(args_namespace))
+        except Exception as ex:
+            policy_str = json.dumps({"error": f"{type(ex).__name__}: {ex}"})
 
-    policy = collapse_policy_statements(*policies)
+        output.write(policy_str + "\n")
+        output.flush()
+
+
+def __stream_policy(args_namespace, document) -> str:
+    policy = generate_from_spec(
+        load_document(document),
+        jobs=args_namespace.jobs,
+        executor=args_namespace.executor,
+    )
 
     if args_namespace.no_wildcards:
         policy = expand_policy(policy)
 
     if args_namespace.auto_shorten:
-        policy_str = auto_shorten_policy(
+        return auto_shorten_policy(
             policy,
             minimize=args_namespace.minimize,
-            compact=args_namespace.compact,
+            compact=True,
             max_length=args_namespace.max_length,
+            minimizer=args_namespace.minimizer,
         )
-    else:
-        policy_str = json.dumps(policy, indent=2)
+
+    return json.dumps(policy)
+
+
+def serve_command(args):
+    args_namespace = argparser.serve_parser.parse_args(args)
+    configure_caches(args_namespace)
+
+    for module in WARM_MODULES:
+        importlib.import_module(module)
+
+    server = PolicyServer(
+        args_namespace.socket,
+        generate,
+        {
+            **vars(argparser.parser.parse_args([])),
+            "minimizer": args_namespace.minimizer,
+        },
+        workers=args_namespace.workers,
+    )
+    print(f"listening on {args_namespace.socket}", file=sys.stderr)
+
+    # stop cleanly (removing the socket) when terminated, too
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+COMMANDS = {
+    "cache": cache_command,
+    "index": index_command,
+    "serve": serve_command,
+}
+
+
+def main(args=None, return_policy=False):
+    if args is None:
+        args = sys.argv[1:]
+
+    if args and args[0] in COMMANDS:
+        output = COMMANDS[args[0]](args[1:])
+
+        if return_policy:
+            return output
+        elif output is not None:
+            print(output)
+        return
+
+    args_namespace = argparser.parser.parse_args(args)
+
+    runner = profile_command if is_profiled(args_namespace) else run
+
+    if not args_namespace.import_profile:
+        return runner(args_namespace, return_policy)
+
+    with profile_imports() as profile:
+        try:
+            return runner(args_namespace, return_policy)
+        finally:
+            print(profile.report(), file=sys.stderr)
+
+
+def is_profiled(args_namespace) -> bool:
+    return bool(
+        args_namespace.profile or args_namespace.profile_pstats or args_namespace.trace
+    )
+
+
+def profile_command(args_namespace, return_policy=False):
+    """Runs with --profile, reporting the time and memory taken by each stage
+    of the pipeline to stderr (or as JSON, to the given file), with --trace,
+    writing the stages as a Chrome trace, and/or with --profile-pstats,
+    writing cProfile statistics for the run."""
+    # imported here, as only profiled runs need it
+    import cProfile
+
+    profiler = cProfile.Profile() if args_namespace.profile_pstats else None
+    trace = ChromeTrace() if args_namespace.trace else None
+
+    with profile_pipeline(trace_memory=bool(args_namespace.profile)) as profile:
+        with observing(*([trace] if trace else [])):
+            try:
+                if profiler is not None:
+                    profiler.enable()
+
+                return run(args_namespace, return_policy)
+
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+                    profiler.dump_stats(args_namespace.profile_pstats)
+
+                if trace is not None:
+                    trace.write(args_namespace.trace)
+
+                if args_namespace.profile == PROFILE_TO_STDERR:
+                    print(profile.report(), file=sys.stderr)
+                elif args_namespace.profile:
+                    with open(args_namespace.profile, "w") as f:
+                        f.write(profile.to_json() + "\n")
+
+
+def configure_caches(args_namespace):
+    configure_disk_cache(None if args_namespace.no_cache else DiskCache())
+    configure_action_index(None if args_namespace.no_index else load_action_index())
+
+
+def __reject_spec_ignored_arguments(args_namespace, mode: str):
+    """Exits with a usage error if args_namespace has any argument that mode
+    (--batch-dir or --stream) would ignore."""
+    if args_namespace.split:
+        argparser.parser.error(f"--split cannot be used with {mode}")
+
+    for flag, name in SPEC_IGNORED_ARGUMENTS.items():
+        if getattr(args_namespace, name):
+            argparser.parser.error(f"{flag} cannot be used with {mode}")
+
+
+def run(args_namespace, return_policy=False):
+    """Generates the policy (or policies) for parsed command-line arguments."""
+    if args_namespace.batch_dir:
+        if not args_namespace.out_dir:
+            argparser.parser.error("--batch-dir requires --out-dir")
+        __reject_spec_ignored_arguments(args_namespace, "--batch-dir")
+
+        configure_caches(args_namespace)
+        output, failed = batch_command(args_namespace)
+
+        if return_policy:
+            return output
+
+        print(output)
+        if failed:
+            sys.exit(1)
+        return
+
+    if args_namespace.stream:
+        __reject_spec_ignored_arguments(args_namespace, "--stream")
+
+        configure_caches(args_namespace)
+        stream_command(args_namespace, sys.stdin, sys.stdout)
+        return
+
+    yaml_inputs = []
+    for file in args_namespace.file or []:
+        with open(file, "r") as f:
+            yaml_inputs.append(f.read())
+
+    if args_namespace.print_plan:
+        print(plan(args_namespace, yaml_inputs)[0].report(), file=sys.stderr)
+
+    policy_str = None
+
+    # a profile is of this process, so never forward profiled runs
+    if args_namespace.socket and not is_profiled(args_namespace):
+        try:
+            policy_str = request(args_namespace.socket, args_namespace, yaml_inputs)
+        except (ConnectionRefusedError, FileNotFoundError) as ex:
+            print(
+                f"warning: no daemon on {args_namespace.socket} ({ex}), generating"
+                + " locally",
+                file=sys.stderr,
+            )
 
     if return_policy:
+        if policy_str is None:
+            configure_caches(args_namespace)
+            policy_str = generate(args_namespace, yaml_inputs)
+
         return policy_str
-    else:
-        print(policy_str)
+
+    with open_output(args_namespace.output) as output:
+        if policy_str is None:
+            configure_caches(args_namespace)
+            generate(args_namespace, yaml_inputs, output)
+        else:
+            output.write(policy_str + "\n")
+
+
+@contextmanager
+def open_output(path: str = None):
+    """Yields the file to write the CLI's output to: path, if given, which
+    is only replaced once the output has been written in full, or stdout."""
+    if not path:
+        yield sys.stdout
+        return
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            yield f
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def plan(args_namespace, yaml_inputs: list[str] = []) -> tuple:
+    """Plans the items of yaml_inputs (the contents of YAML files) and of
+    args_namespace together, so that an item is skipped if it is duplicated,
+    or granted by another, in any of them.
+
+    Returns the Plan and the tasks to generate, in order.
+    """
+    # imported here to keep importing the CLI fast
+    import yaml
+
+    with stage("parse", characters=sum(len(x) for x in yaml_inputs)):
+        specs = [yaml.safe_load(x) for x in yaml_inputs]
+
+    with stage("plan"):
+        yaml_tasks = [x for y in specs for x in spec_tasks(y)]
+        arg_tasks = [x[2] for x in args_tasks(args_namespace)]
+
+        generation_plan = Plan(yaml_tasks + arg_tasks)
+        annotate(items=len(generation_plan.tasks), kept=len(generation_plan.kept))
+
+    count("items", len(generation_plan.tasks))
+    count("items skipped", len(generation_plan.skipped))
+
+    return generation_plan, generation_plan.kept_tasks
+
+
+def generate(args_namespace, yaml_inputs: list[str] = [], output=None) -> str:
+    """Returns what the CLI prints for parsed command-line arguments (other
+    than in --batch-dir mode), given the contents of their YAML files.
+
+    If output (a text file) is given, that is written to it instead, followed
+    by a newline, as print() would. The policy is written a chunk at a time as
+    it is serialized, so it is never held in memory as one string."""
+    _, tasks = plan(args_namespace, yaml_inputs)
+
+    # the items of the YAML files and of the command-line arguments are all
+    # added to one accumulator, so are merged only once
+    accumulator = PolicyAccumulator()
+    add_tasks(
+        accumulator,
+        tasks,
+        jobs=args_namespace.jobs,
+        executor=args_namespace.executor,
+    )
+
+    with stage("collapse"):
+        policy = accumulator.policy()
+        annotate(policy)
+
+    if args_namespace.no_wildcards:
+        with stage("expand"):
+            policy = expand_policy(policy)
+            annotate(policy)
+
+    count("statements emitted", len(policy["Statement"]))
+    count("actions emitted", sum(len(x["Action"]) for x in policy["Statement"]))
+
+    # (auto_shorten_policy() reports its own serialize stage)
+    if args_namespace.auto_shorten and not args_namespace.split:
+        options = {
+            "minimize": args_namespace.minimize,
+            "compact": args_namespace.compact,
+            "max_length": args_namespace.max_length,
+            "minimizer": args_namespace.minimizer,
+        }
+        if output is None:
+            return auto_shorten_policy(policy, **options)
+
+        write_shortened_policy(output, policy, **options)
+        output.write("\n")
+        return
+
+    with stage("serialize"):
+        annotate(policy)
+        if args_namespace.split:
+            policy_str = split_command(args_namespace, policy)
+            annotate(characters=len(policy_str))
+        elif output is None:
+            policy_str = json.dumps(policy, indent=2)
+            annotate(characters=len(policy_str))
+        else:
+            annotate(characters=write_json(output, policy, indent=2))
+            output.write("\n")
+            return
+
+        if output is None:
+            return policy_str
+
+        output.write(policy_str + "\n")
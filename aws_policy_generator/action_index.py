@@ -0,0 +1,459 @@
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+
+from array import array
+
+from aws_policy_generator.disk_cache import database_versions
+from aws_policy_generator.disk_cache import default_cache_dir
+
+# An action index is a compact, read-only copy of the parts of the IAM database
+# that the generators need. It is memory-mapped, so every process using it
+# shares a single copy of its pages. Layout:
+#
+#   MAGIC | u32 metadata length | metadata (JSON) | sections
+#
+# The metadata holds the services (each a contiguous range of action ids), the
+# interned access level and resource type names, and the offset and length of
+# each section. Sections are native-endian columns, indexed by action id:
+#
+#   names              utf-8 action names, concatenated
+#   name_offsets       u32, start of each name in names (one extra at the end)
+#   access_levels      u8, id into the access level names
+#   flags              u8, see FLAG_*
+#   resource_offsets   u32, start of each action's entries in resource_ids
+#   resource_ids       u32, ids into the resource type names
+
+MAGIC = b"APGIDX\x00\x01"
+
+# access level code for actions the IAM database has no data for
+UNKNOWN_ACCESS_LEVEL = 255
+
+# action only supports Resource: * (a "wildcard-ARN action")
+FLAG_WILDCARD_ONLY = 1
+# action is in policyuniverse's master permission list
+FLAG_IN_POLICYUNIVERSE = 2
+# action is only known to policyuniverse (and possibly aws-iam-utils' overrides),
+# not the IAM database
+FLAG_NOT_IN_DATABASE = 4
+
+SECTIONS = [
+    ("names", "B"),
+    ("name_offsets", "I"),
+    ("access_levels", "B"),
+    ("flags", "B"),
+    ("resource_offsets", "I"),
+    ("resource_ids", "I"),
+]
+
+# the index in use by the generators, see configure_action_index()
+ACTIVE_INDEX = None
+
+
+def configure_action_index(index):
+    """Sets the ActionIndex (or None to disable) used by the generators in
+    place of the aws-iam-utils database."""
+    global ACTIVE_INDEX
+    ACTIVE_INDEX = index
+
+
+def default_index_path() -> str:
+    """Returns the index path for the installed database versions, so an
+    upgrade means the index must be rebuilt before it is used again."""
+    digest = hashlib.sha256(
+        json.dumps(database_versions(), sort_keys=True).encode("utf-8")
+    ).hexdigest()
+    return os.path.join(default_cache_dir(), f"action-index-{digest[:16]}.bin")
+
+
+def build_action_index(path: str = None) -> str:
+    """Builds an action index from the IAM database, writing it to path (by
+    default, default_index_path()). Returns the path written."""
+    from aws_iam_utils.action_data_overrides import ACTION_DATA_OVERRIDES
+    from policy_sentry.shared.iam_data import iam_definition
+    from policyuniverse import all_permissions
+
+    path = path or default_index_path()
+
+    access_level_names = {}
+    resource_type_names = {}
+    services = {}
+
+    policyuniverse_actions = {}
+    for name in sorted(all_permissions):
+        policyuniverse_actions.setdefault(name.split(":")[0], []).append(name)
+
+    columns = {name: array(typecode) for name, typecode in SECTIONS}
+    columns["name_offsets"].append(0)
+    columns["resource_offsets"].append(0)
+
+    def intern(names, name):
+        return names.setdefault(name, len(names))
+
+    def add_action(name, access_level, resource_types, flags):
+        columns["names"].frombytes(name.encode("utf-8"))
+        columns["name_offsets"].append(len(columns["names"]))
+        columns["flags"].append(flags)
+        columns["access_levels"].append(
+            UNKNOWN_ACCESS_LEVEL
+            if access_level is None
+            else intern(access_level_names, access_level)
+        )
+        for resource_type in resource_types:
+            columns["resource_ids"].append(intern(resource_type_names, resource_type))
+        columns["resource_offsets"].append(len(columns["resource_ids"]))
+
+    count = 0
+    for service_name, service_data in iam_definition.items():
+        start = count
+        database_actions = set()
+
+        for action_name, action_data in service_data["privileges"].items():
+            name = f"{service_name}:{action_name}"
+            access_level = action_data["access_level"]
+
+            override = ACTION_DATA_OVERRIDES.get(
+                f"{service_name}:{action_name.lower()}"
+            )
+            if override:
+                name = override["action"]
+                access_level = override["access_level"]
+
+            resource_types = sorted(
+                set(
+                    x["resource_type"].strip("*").lower()
+                    for x in action_data["resource_types"].values()
+                )
+            )
+
+            flags = 0
+            if list(action_data["resource_types"].keys()) == [""]:
+                flags |= FLAG_WILDCARD_ONLY
+            if name.lower() in all_permissions:
+                flags |= FLAG_IN_POLICYUNIVERSE
+
+            add_action(name, access_level, resource_types, flags)
+            database_actions.add(name.lower())
+            count += 1
+
+        # policyuniverse knows some actions the database doesn't; these are
+        # recorded so wildcard checks can see them as aws-iam-utils does
+        for name in policyuniverse_actions.get(service_name, []):
+            if name not in database_actions:
+                override = ACTION_DATA_OVERRIDES.get(name, {})
+                add_action(
+                    name,
+                    override.get("access_level"),
+                    [],
+                    FLAG_IN_POLICYUNIVERSE | FLAG_NOT_IN_DATABASE,
+                )
+                count += 1
+
+        services[service_name] = [start, count]
+
+    metadata = {
+        "versions": database_versions(),
+        "byteorder": sys.byteorder,
+        "count": count,
+        "services": services,
+        "access_levels": list(access_level_names),
+        "resource_types": list(resource_type_names),
+        "sections": {},
+    }
+
+    # section offsets are relative to the end of the metadata, so they can be
+    # computed before the metadata's own length is known
+    offset = 0
+    for name, typecode in SECTIONS:
+        size = len(columns[name]) * columns[name].itemsize
+        metadata["sections"][name] = [offset, size]
+        offset += size + (-size % 4)  # keep u32 columns aligned
+
+    metadata_bytes = json.dumps(metadata).encode("utf-8")
+    metadata_bytes += b" " * (-(len(MAGIC) + 4 + len(metadata_bytes)) % 4)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(metadata_bytes)))
+        f.write(metadata_bytes)
+        for name, _ in SECTIONS:
+            data = columns[name].tobytes()
+            f.write(data)
+            f.write(b"\x00" * (-len(data) % 4))
+    os.replace(tmp_path, path)
+
+    return path
+
+
+def load_action_index(path: str = None):
+    """Opens the index at path (by default, default_index_path()), returning
+    None if it does not exist or was built from other database versions."""
+    path = path or default_index_path()
+    if not os.path.exists(path):
+        return None
+
+    try:
+        index = ActionIndex(path)
+    except ValueError:
+        return None
+
+    if index.versions != database_versions():
+        return None
+
+    return index
+
+
+class ActionIndex:
+    """A read-only, memory-mapped action index, see build_action_index()."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+        with open(path, "rb") as f:
+            self.__mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.__mmap[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not an action index")
+
+        (metadata_length,) = struct.unpack_from("<I", self.__mmap, len(MAGIC))
+        data_start = len(MAGIC) + 4 + metadata_length
+        metadata = json.loads(self.__mmap[len(MAGIC) + 4 : data_start])
+
+        if metadata["byteorder"] != sys.byteorder:
+            raise ValueError(f"{path} was built on a different architecture")
+
+        self.versions = metadata["versions"]
+        self.services = {k: tuple(v) for k, v in metadata["services"].items()}
+        self.access_level_names = metadata["access_levels"]
+        self.resource_type_names = metadata["resource_types"]
+
+        view = memoryview(self.__mmap)
+        self.__columns = {}
+        for name, typecode in SECTIONS:
+            offset, size = metadata["sections"][name]
+            column = view[data_start + offset : data_start + offset + size]
+            self.__columns[name] = column if typecode == "B" else column.cast(typecode)
+
+    def __len__(self):
+        return len(self.__columns["access_levels"])
+
+    def name(self, action_id: int) -> str:
+        offsets = self.__columns["name_offsets"]
+        return str(
+            self.__columns["names"][offsets[action_id] : offsets[action_id + 1]],
+            "utf-8",
+        )
+
+    def access_level(self, action_id: int) -> str:
+        code = self.__columns["access_levels"][action_id]
+        return None if code == UNKNOWN_ACCESS_LEVEL else self.access_level_names[code]
+
+    def resource_types(self, action_id: int) -> list[str]:
+        offsets = self.__columns["resource_offsets"]
+        return [
+            self.resource_type_names[x]
+            for x in self.__columns["resource_ids"][
+                offsets[action_id] : offsets[action_id + 1]
+            ]
+        ]
+
+    def action_ids(
+        self,
+        service_name: str,
+        access_levels: list[str] = None,
+        resource_type: str = None,
+        wildcard_only: bool = False,
+    ) -> list[int]:
+        """Returns the ids of actions in the IAM database for the given service,
+        optionally only those with the given access levels, linked to the given
+        resource type, or that only support Resource: *. Ids are returned in
+        database order."""
+        if service_name not in self.services:
+            raise ValueError(f"unknown service: {service_name}")
+
+        start, end = self.services[service_name]
+        levels = self.__columns["access_levels"]
+        flags = self.__columns["flags"]
+
+        level_codes = None
+        if access_levels is not None:
+            level_codes = set(
+                self.access_level_names.index(x)
+                for x in access_levels
+                if x in self.access_level_names
+            )
+
+        resource_type_id = None
+        if resource_type is not None:
+            if resource_type.lower() not in self.resource_type_names:
+                return []
+            resource_type_id = self.resource_type_names.index(resource_type.lower())
+
+        resource_offsets = self.__columns["resource_offsets"]
+        resource_ids = self.__columns["resource_ids"]
+
+        result = []
+        for i in range(start, end):
+            if flags[i] & FLAG_NOT_IN_DATABASE:
+                continue
+            if wildcard_only and not flags[i] & FLAG_WILDCARD_ONLY:
+                continue
+            if level_codes is not None and levels[i] not in level_codes:
+                continue
+            if resource_type_id is not None and resource_type_id not in (
+                resource_ids[resource_offsets[i] : resource_offsets[i + 1]]
+            ):
+                continue
+
+            result.append(i)
+
+        return result
+
+    def actions(self, service_name: str, **kwargs) -> list[str]:
+        """As action_ids(), but returns action names."""
+        return [self.name(i) for i in self.action_ids(service_name, **kwargs)]
+
+    def known_actions(self, service_name: str) -> list[str]:
+        """Returns the names of every action of the given service, including
+        those only known to policyuniverse, or [] if there is no such
+        service."""
+        if service_name not in self.services:
+            return []
+
+        return [self.name(i) for i in range(*self.services[service_name])]
+
+    def __has_only_these_access_levels(self, service_name, actions, access_levels):
+        """Mirrors aws_iam_utils.checks.policy_has_only_these_access_levels for
+        a policy granting the given actions of a single service, with
+        service:Verb* wildcards expanded against policyuniverse's master
+        permission list: the expanded actions are checked in sorted order, and
+        the first one that is invalid (None is returned) or not in
+        access_levels (False is returned) decides the result."""
+        start, end = self.services[service_name]
+        flags = self.__columns["flags"]
+
+        levels = {}
+        for i in range(start, end):
+            levels.setdefault(self.name(i).lower(), []).append(self.access_level(i))
+
+        expanded = set()
+        for action in actions:
+            action = action.lower()
+            if not action.endswith("*"):
+                expanded.add(action)
+                continue
+
+            matches = [
+                self.name(i).lower()
+                for i in range(start, end)
+                if flags[i] & FLAG_IN_POLICYUNIVERSE
+                and self.name(i).lower().startswith(action[:-1])
+            ]
+            expanded.update(matches or [action])
+
+        for action in sorted(expanded):
+            action_levels = [x for x in levels.get(action, []) if x is not None]
+            if not action_levels:
+                return None
+            if any(x not in access_levels for x in action_levels):
+                return False
+
+        return True
+
+    def generate_policy_for_service(
+        self, service_name: str, reqd_access_levels: list[str]
+    ) -> dict:
+        """Equivalent to aws_iam_utils.generator.generate_policy_for_service,
+        answered from the index."""
+        matching_actions = self.actions(service_name, access_levels=reqd_access_levels)
+
+        # shorten to verb wildcards (e.g. s3:Get*) exactly as aws-iam-utils does
+        wildcarded_matching_actions = []
+        for action in matching_actions:
+            action_name = action.split(":")[1]
+            parts = list(
+                filter(
+                    lambda x: len(x) > 0, re.split("([A-Z])", action_name, maxsplit=2)
+                )
+            )
+
+            if len(parts) >= 4:
+                wildcarded_verb = f"{service_name}:{parts[0] + parts[1]}*"
+
+                if (
+                    "Policy" not in action_name
+                    and "Tagging" not in action_name
+                    and wildcarded_verb not in wildcarded_matching_actions
+                ):
+                    wildcarded_matching_actions.append(wildcarded_verb)
+
+            else:
+                wildcarded_matching_actions.append(action)
+
+        result = self.__has_only_these_access_levels(
+            service_name, wildcarded_matching_actions, reqd_access_levels
+        )
+        if result is False:
+            wildcarded_matching_actions = matching_actions
+            result = self.__has_only_these_access_levels(
+                service_name, matching_actions, reqd_access_levels
+            )
+
+        if result is not True:
+            # aws-iam-utils rejects this policy; let it raise its own error
+            from aws_iam_utils.generator import generate_policy_for_service
+
+            return generate_policy_for_service(service_name, reqd_access_levels)
+
+        return self.__create_policy(wildcarded_matching_actions)
+
+    def generate_policy_for_service_arn_type(
+        self,
+        service_name: str,
+        arn_type: str,
+        reqd_access_levels: list[str],
+        include_service_wide_actions: bool = False,
+    ) -> dict:
+        """Equivalent to
+        aws_iam_utils.generator.generate_policy_for_service_arn_type, answered
+        from the index."""
+        if arn_type == "*":
+            action_ids = self.action_ids(service_name, wildcard_only=True)
+        else:
+            action_ids = self.action_ids(service_name, resource_type=arn_type)
+
+        if include_service_wide_actions:
+            action_ids = action_ids + self.action_ids(service_name, wildcard_only=True)
+
+        matching_actions = []
+        for i in dict.fromkeys(action_ids):  # dedupe, retaining order
+            if self.access_level(i) in reqd_access_levels:
+                matching_actions.append(self.name(i))
+
+        if (
+            self.__has_only_these_access_levels(
+                service_name, matching_actions, reqd_access_levels
+            )
+            is not True
+        ):
+            # aws-iam-utils rejects this policy; let it raise its own error
+            from aws_iam_utils.generator import generate_policy_for_service_arn_type
+
+            return generate_policy_for_service_arn_type(
+                service_name, arn_type, reqd_access_levels, include_service_wide_actions
+            )
+
+        return self.__create_policy(matching_actions)
+
+    @staticmethod
+    def __create_policy(actions):
+        return {
+            "Version": "2012-10-17",
+            "Statement": [{"Effect": "Allow", "Action": actions, "Resource": "*"}],
+        }
@@ -1,70 +1,61 @@
+from aws_policy_generator.imports import lazy_function
 from aws_policy_generator.mappings import ACCESS_LEVELS_MAPPINGS
-from aws_iam_utils.generator import generate_policy_for_service
-from aws_iam_utils.generator import generate_policy_for_service_arn_type
-from aws_iam_utils.generator import generate_full_policy_for_service
-from aws_iam_utils.combiner import collapse_policy_statements
-from aws_iam_utils.simplifier import simplify_policy
-from aws_iam_utils.util import create_policy
-from aws_iam_utils.util import statement
+from aws_policy_generator.planner import Plan
+from aws_policy_generator.planner import action_task
+from aws_policy_generator.planner import service_task
+
+# the CLI plans its arguments with args_tasks(), without loading YAML support
+generate_from_tasks = lazy_function(
+    "aws_policy_generator.yaml_generator", "generate_from_tasks"
+)
+
+# the arguments that take services, with the access level they grant
+SERVICE_ARGUMENTS = {
+    "list": "list",
+    "read": "read",
+    "write": "write",
+    "full_access": "all",
+}
+
+
+def args_tasks(args_namespace) -> list[tuple]:
+    """Returns (argument, index, task) for each item of args_namespace, where
+    task is as in planner and the item is the index-th value of argument: the
+    services given to --list, --read, --write and --full-access, then the
+    actions given to --action."""
+    items = []
+
+    for argument, access_level in SERVICE_ARGUMENTS.items():
+        for i, arg in enumerate(getattr(args_namespace, argument) or []):
+            service_name = arg
+            resource_type = "*"
+
+            if ":" in arg:
+                service_name, resource_type = arg.split(":")
+
+            items.append(
+                (
+                    argument,
+                    i,
+                    service_task(
+                        service_name,
+                        resource_type,
+                        ACCESS_LEVELS_MAPPINGS[access_level],
+                        args_namespace.include_service_wide_actions,
+                        full_access=argument == "full_access",
+                    ),
+                )
+            )
+
+    for i, action in enumerate(args_namespace.action or []):
+        items.append(("action", i, action_task(action)))
+
+    return items
 
 
 def generate_from_args(args_namespace):
-    policies = []  # list of policies that we'll mcollapse together at the end
-
-    for item in [
-        {
-            "args": args_namespace.list,
-            "access_levels": ACCESS_LEVELS_MAPPINGS["list"],
-        },
-        {
-            "args": args_namespace.read,
-            "access_levels": ACCESS_LEVELS_MAPPINGS["read"],
-        },
-        {
-            "args": args_namespace.write,
-            "access_levels": ACCESS_LEVELS_MAPPINGS["write"],
-        },
-        {
-            "args": args_namespace.full_access,
-            "access_levels": ACCESS_LEVELS_MAPPINGS["all"],
-            "service_generator": generate_full_policy_for_service,
-        },
-    ]:
-
-        if item["args"]:
-            for arg in item["args"]:
-                service_name = arg
-                resource_type = "*"
-
-                if ":" in arg:
-                    service_name, resource_type = arg.split(":")
-
-                if resource_type == "*":
-                    if "service_generator" in item:
-                        policies.append(item["service_generator"](service_name))
-                    else:
-                        policies.append(
-                            generate_policy_for_service(
-                                service_name, item["access_levels"]
-                            )
-                        )
-                else:
-                    policies.append(
-                        generate_policy_for_service_arn_type(
-                            service_name,
-                            resource_type,
-                            item["access_levels"],
-                            include_service_wide_actions=(
-                                args_namespace.include_service_wide_actions
-                            ),
-                        )
-                    )
-
-    if args_namespace.action:
-        policies.append(
-            create_policy(statement(actions=args_namespace.action, resource="*"))
-        )
-
-    policy = simplify_policy(collapse_policy_statements(*policies))
-
-    return policy
+    """Generates the policy for parsed command-line arguments. Items that are
+    duplicated, or granted by another item, are skipped (see planner.Plan)."""
+    return generate_from_tasks(
+        Plan([x[2] for x in args_tasks(args_namespace)]).kept_tasks
+    )
@@ -1,6 +1,12 @@
 import json
 
-from aws_policy_generator.safe_minimizer import minimize_policy_with_error_handling
+from aws_policy_generator import profiler
+from aws_policy_generator.imports import lazy_function
+from aws_policy_generator.json_writer import write_json
+
+minimize_policy_with_error_handling = lazy_function(
+    "aws_policy_generator.safe_minimizer", "minimize_policy_with_error_handling"
+)
 
 # auto-shorten: tuple of (minimize, compact)
 AUTO_SHORTEN_ATTEMPT = [
@@ -9,44 +15,266 @@ AUTO_SHORTEN_ATTEMPT = [
     (True, True),
 ]
 
+# json.dumps() indentation used for non-compact output
+INDENT = 2
 
-def auto_shorten_policy(
-    policy: dict, minimize: bool = False, compact: bool = False, max_length: int = 6144
-) -> str:
-    auto_shorten_attempts = AUTO_SHORTEN_ATTEMPT
-    current_minimize = minimize
-    current_compact = compact
 
-    while True:
-        if current_compact:
-            policy_str = json.dumps(policy)
-        else:
-            policy_str = json.dumps(policy, indent=2)
+def __string_length(value: str) -> int:
+    if value.isascii() and value.isprintable() and '"' not in value:
+        if "\\" not in value:
+            return len(value) + 2
+
+    return len(json.dumps(value))
+
+
+def __value_length(value, compact: bool, depth: int) -> int:
+    if isinstance(value, str):
+        return __string_length(value)
+
+    if isinstance(value, dict):
+        items = [
+            __string_length(k) + 2 + __value_length(v, compact, depth + 1)
+            for k, v in value.items()
+        ]
+    elif isinstance(value, (list, tuple)):
+        items = [__value_length(x, compact, depth + 1) for x in value]
+    else:
+        return len(json.dumps(value))
+
+    return container_length(items, compact, depth)
+
+
+def container_length(item_lengths: list[int], compact: bool, depth: int = 0) -> int:
+    """Returns the serialized length of a list (or dict) at the given nesting
+    depth, given the lengths of its items (for a dict, each "key": value)."""
+    if not item_lengths:
+        return 2
+
+    if compact:
+        # "[a, b]"
+        return 2 + sum(item_lengths) + 2 * (len(item_lengths) - 1)
+
+    # "[\n  a,\n  b\n]", with every line indented to its depth
+    return (
+        2
+        + sum(item_lengths)
+        + (len(item_lengths) - 1)
+        + len(item_lengths) * (1 + INDENT * (depth + 1))
+        + 1
+        + INDENT * depth
+    )
+
+
+def serialized_length(policy: dict, compact: bool = False, depth: int = 0) -> int:
+    """Returns len(json.dumps(policy)) if compact, or else
+    len(json.dumps(policy, indent=2)), without building the string. Dict keys
+    must be strings, as they are in any policy.
+
+    depth is the nesting depth policy is serialized at, for the length of a
+    value inside a larger document.
+    """
+    return __value_length(policy, compact, depth)
+
+
+def minimized_length_bound(policy: dict, compact: bool = False) -> int:
+    """Returns a lower bound on serialized_length() of the minimized policy,
+    without minimizing it.
+
+    The minimizer replaces each statement's actions with wildcard prefixes
+    that keep their service (or leaves an action it doesn't know as it is),
+    so at least one action of min(len(action), len(service) + 2) characters
+    remains for every service in the policy. Statements without actions grant
+    nothing, and are dropped by the minimizer, so are not counted.
+    """
+    statements = policy["Statement"]
+    if isinstance(statements, dict):
+        statements = [statements]
+
+    statements = [x for x in statements if x.get("Action")]
+    if not statements:
+        return serialized_length(
+            {"Version": policy["Version"], "Statement": []}, compact
+        )
+
+    shortest_by_service = {}
+    resources = []
+    for st in statements:
+        actions = st.get("Action", [])
+        for action in [actions] if isinstance(actions, str) else actions:
+            action = action.lower()
+            service = action.split(":")[0]
+            shortest = min(action, f"{service}:*", key=len)
+
+            current = shortest_by_service.get(service)
+            if current is None or len(shortest) < len(current):
+                shortest_by_service[service] = shortest
+
+        resource = st.get("Resource")
+        if resource is None:
+            resources = None
+        elif resources is not None:
+            resources.extend([resource] if isinstance(resource, str) else resource)
+
+    actions = sorted(shortest_by_service.values())
+    smallest = {
+        "Effect": min((x["Effect"] for x in statements), key=len),
+        "Action": actions[0] if len(actions) == 1 else actions,
+    }
+    if resources:
+        smallest["Resource"] = min(resources, key=len)
+
+    return serialized_length(
+        {"Version": policy["Version"], "Statement": [smallest]}, compact
+    )
+
 
-        if current_minimize:
-            policy_str = json.dumps(minimize_policy_with_error_handling(policy))
+class ShorteningCandidates:
+    """The forms of a policy that auto_shorten_policy() chooses between: the
+    policy as given or minimized, serialized indented or compact.
 
-        policy_length = len(policy_str)
-        if policy_length > max_length:
-            if len(auto_shorten_attempts) == 0:
-                raise ValueError(
-                    f"the generated policy is {policy_length} characters, which is"
-                    + " larger than the maximum {max_length} characters allowed. this"
-                    + " policy is too long even after auto-shortening. try specifying"
-                    + " fewer arguments"
-                )
+    Each form is computed on first use only, so the policy is minimized at
+    most once and each serialization is done at most once, however many
+    strategies ask for it. Lengths are worked out with serialized_length(),
+    so only the form finally chosen is ever serialized.
+    """
 
-            current_minimize, current_compact = auto_shorten_attempts.pop(0)
-            # loop again with new current_* args
+    def __init__(self, policy: dict, minimizer: str = None):
+        self.policy = policy
+        self.minimizer = minimizer
+        self.__minimized = None
+        self.__lengths = {}
 
+    @property
+    def is_minimized(self) -> bool:
+        return self.__minimized is not None
+
+    def minimized(self) -> dict:
+        if self.__minimized is None:
+            self.__minimized = minimize_policy_with_error_handling(
+                self.policy, minimizer=self.minimizer
+            )
+
+        return self.__minimized
+
+    def serialized(self, minimize: bool, compact: bool) -> str:
+        policy = self.minimized() if minimize else self.policy
+        if compact:
+            return json.dumps(policy)
         else:
-            break
+            return json.dumps(policy, indent=INDENT)
+
+    def write(self, output, minimize: bool, compact: bool) -> int:
+        """Writes serialized(minimize, compact) to output, a chunk at a time
+        (see json_writer.write_json()), returning its length."""
+        policy = self.minimized() if minimize else self.policy
+        return write_json(output, policy, None if compact else INDENT)
+
+    def length(self, minimize: bool, compact: bool) -> int:
+        key = (minimize, compact)
+        if key not in self.__lengths:
+            policy = self.minimized() if minimize else self.policy
+            self.__lengths[key] = serialized_length(policy, compact)
+
+        return self.__lengths[key]
+
+    def length_bound(self, minimize: bool, compact: bool) -> int:
+        """Returns length(), or a lower bound on it if that would mean
+        minimizing the policy."""
+        if minimize and not self.is_minimized:
+            return minimized_length_bound(self.policy, compact)
+
+        return self.length(minimize, compact)
+
+
+def shortening_strategies(minimize: bool = False, compact: bool = False) -> list:
+    """Returns the (minimize, compact) strategies to try, in order: the one
+    asked for, then each of AUTO_SHORTEN_ATTEMPT, never dropping an option
+    that was asked for and never repeating a strategy."""
+    strategies = [(minimize, compact)]
+    for attempt_minimize, attempt_compact in AUTO_SHORTEN_ATTEMPT:
+        strategy = (attempt_minimize or minimize, attempt_compact or compact)
+        if strategy not in strategies:
+            strategies.append(strategy)
+
+    return strategies
+
+
+def choose_strategy(
+    candidates: ShorteningCandidates, strategies: list, max_length: int
+) -> tuple:
+    """Returns the first of strategies whose form of the policy fits
+    max_length, or None if none of them does."""
+    for strategy in strategies:
+        # strategies that cannot possibly fit are skipped without minimizing
+        if candidates.length_bound(*strategy) > max_length:
+            continue
+
+        if candidates.length(*strategy) <= max_length:
+            return strategy
 
-    if policy_length > max_length:
-        raise ValueError(
-            f"the generated policy is {policy_length} characters, which is larger than"
-            + " the maximum {max_length} characters allowed. try using --compact,"
-            + " --minimize, or specifying fewer arguments"
+    return None
+
+
+def auto_shorten_policy(
+    policy: dict,
+    minimize: bool = False,
+    compact: bool = False,
+    max_length: int = 6144,
+    minimizer: str = None,
+) -> str:
+    with profiler.stage("serialize", max_length=max_length):
+        profiler.annotate(policy)
+        candidates, strategy = __shorten(
+            policy, minimize, compact, max_length, minimizer
         )
+        policy_str = candidates.serialized(*strategy)
+        profiler.annotate(characters=len(policy_str))
+
+        return policy_str
+
+
+def write_shortened_policy(
+    output,
+    policy: dict,
+    minimize: bool = False,
+    compact: bool = False,
+    max_length: int = 6144,
+    minimizer: str = None,
+) -> int:
+    """As auto_shorten_policy(), but writes the policy to output a chunk at a
+    time, rather than returning it, and returns its length. Nothing is written
+    if the policy is too long."""
+    with profiler.stage("serialize", max_length=max_length):
+        profiler.annotate(policy)
+        candidates, strategy = __shorten(
+            policy, minimize, compact, max_length, minimizer
+        )
+        length = candidates.write(output, *strategy)
+        profiler.annotate(characters=length)
+
+        return length
+
+
+def __shorten(
+    policy: dict, minimize: bool, compact: bool, max_length: int, minimizer: str
+) -> tuple:
+    # returns the ShorteningCandidates and the strategy of the form to output
+    # (minimizing with the given engine, see minimize_policy_with_error_handling)
+    candidates = ShorteningCandidates(policy, minimizer)
+    strategies = shortening_strategies(minimize, compact)
+
+    strategy = choose_strategy(candidates, strategies, max_length)
+    if strategy is not None:
+        return candidates, strategy
+
+    policy_length = candidates.length_bound(*strategies[-1])
+    if candidates.is_minimized or not strategies[-1][0]:
+        policy_length = f"{policy_length} characters"
+    else:
+        policy_length = f"at least {policy_length} characters"
 
-    return policy_str
+    raise ValueError(
+        f"the generated policy is {policy_length}, which is larger than the"
+        + f" maximum {max_length} characters allowed. this policy is too long even"
+        + " after auto-shortening. try specifying fewer arguments, or --split"
+    )
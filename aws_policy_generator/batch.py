@@ -0,0 +1,144 @@
+import json
+import os
+
+from aws_policy_generator.auto_shortener import auto_shorten_policy
+from aws_policy_generator.executor import parallel_map
+from aws_policy_generator.expander import expand_policy
+from aws_policy_generator.manifest import MANIFEST_FILENAME
+from aws_policy_generator.manifest import Manifest
+from aws_policy_generator.trie_minimizer import resolve_minimizer
+from aws_policy_generator.yaml_generator import generate_from_yaml
+
+YAML_EXTENSIONS = (".yaml", ".yml")
+
+
+def find_specs(batch_dir: str) -> list[str]:
+    """Returns the paths, relative to batch_dir, of all YAML specs under
+    batch_dir, in sorted order."""
+    specs = []
+    for dirpath, dirnames, filenames in os.walk(batch_dir):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.endswith(YAML_EXTENSIONS):
+                specs.append(
+                    os.path.relpath(os.path.join(dirpath, filename), batch_dir)
+                )
+
+    return specs
+
+
+def output_path_for(spec: str, out_dir: str) -> str:
+    """Returns where the policy for spec (relative to the batch directory) is
+    written: the same relative path under out_dir, with a .json extension."""
+    return os.path.join(out_dir, os.path.splitext(spec)[0] + ".json")
+
+
+def generate_policy_file(
+    spec_path: str,
+    output_path: str,
+    no_wildcards: bool = False,
+    auto_shorten: bool = False,
+    minimize: bool = False,
+    compact: bool = False,
+    max_length: int = 6144,
+    minimizer: str = None,
+):
+    """Generates the policy for the YAML spec at spec_path, writing it to
+    output_path as the CLI would print it for 'aws-policy-generator -f'."""
+    with open(spec_path, "r") as f:
+        policy = generate_from_yaml(f)
+
+    if no_wildcards:
+        policy = expand_policy(policy)
+
+    if auto_shorten:
+        policy_str = auto_shorten_policy(
+            policy,
+            minimize=minimize,
+            compact=compact,
+            max_length=max_length,
+            minimizer=minimizer,
+        )
+    else:
+        policy_str = json.dumps(policy, indent=2)
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, "w") as f:
+        f.write(policy_str + "\n")
+
+
+def __generate_spec(task):
+    spec, batch_dir, out_dir, options = task
+    output_path = output_path_for(spec, out_dir)
+
+    try:
+        generate_policy_file(os.path.join(batch_dir, spec), output_path, **options)
+    except Exception as ex:
+        return {"spec": spec, "error": f"{type(ex).__name__}: {ex}"}
+
+    return {"spec": spec, "output": output_path}
+
+
+def generate_batch(
+    batch_dir: str,
+    out_dir: str,
+    jobs: int = None,
+    incremental: bool = False,
+    **options,
+) -> list[dict]:
+    """Generates a policy file in out_dir for every YAML spec in batch_dir,
+    across a pool of jobs worker processes (by default, one per CPU).
+
+    Returns one result per spec, in the order of find_specs(): either
+    {"spec", "output"} or, if that spec failed, {"spec", "error"}. A failing
+    spec does not stop the rest of the batch. options are passed on to
+    generate_policy_file().
+
+    If incremental is True, a Manifest kept in out_dir is used to skip specs
+    whose inputs have not changed since they were last generated; their
+    results are marked {"skipped": True}.
+    """
+    # the engine is named, so that it is part of each spec's fingerprint
+    options["minimizer"] = resolve_minimizer(options.get("minimizer"))
+
+    specs = find_specs(batch_dir)
+    results = {}
+    fingerprints = {}
+
+    manifest = None
+    if incremental:
+        manifest = Manifest(os.path.join(out_dir, MANIFEST_FILENAME))
+
+        for spec in specs:
+            output_path = output_path_for(spec, out_dir)
+            fingerprints[spec] = manifest.fingerprint(
+                os.path.join(batch_dir, spec), options
+            )
+
+            if manifest.is_current(spec, fingerprints[spec], output_path):
+                results[spec] = {"spec": spec, "output": output_path, "skipped": True}
+
+    tasks = [
+        (spec, batch_dir, out_dir, options) for spec in specs if spec not in results
+    ]
+
+    for result in __run_tasks(tasks, jobs):
+        results[result["spec"]] = result
+
+        if manifest is not None and "error" not in result:
+            manifest.record(
+                result["spec"], fingerprints[result["spec"]], result["output"]
+            )
+
+    if manifest is not None:
+        for result in results.values():
+            if "error" in result:
+                manifest.entries.pop(result["spec"], None)
+
+        manifest.save(specs)
+
+    return [results[spec] for spec in specs]
+
+
+def __run_tasks(tasks, jobs):
+    return parallel_map(__generate_spec, tasks, jobs or os.cpu_count())
@@ -0,0 +1,151 @@
+from collections import OrderedDict
+from collections.abc import Mapping
+from threading import Lock
+from types import MappingProxyType
+
+from aws_policy_generator import profiler
+
+DEFAULT_MAXSIZE = 512
+
+
+def freeze(value):
+    """Returns a deeply immutable copy of value. Dicts become read-only
+    mappings and lists become tuples."""
+    if isinstance(value, Mapping):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+
+    return value
+
+
+def thaw(value):
+    """Returns a mutable deep copy of a value produced by freeze()."""
+    if isinstance(value, Mapping):
+        return {k: thaw(v) for k, v in value.items()}
+
+    if isinstance(value, tuple):
+        return [thaw(v) for v in value]
+
+    return value
+
+
+class LRUCache:
+    """A bounded, thread-safe least-recently-used cache.
+
+    Values are frozen on the way in, so a cached result can be shared between
+    callers without any of them being able to corrupt it.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.__data = OrderedDict()
+        self.__lock = Lock()
+
+    def get(self, key, compute):
+        """Returns the value cached under key, calling compute() and caching
+        its (frozen) result on a miss."""
+        with self.__lock:
+            if key in self.__data:
+                self.__data.move_to_end(key)
+                self.hits += 1
+                return self.__data[key]
+
+            self.misses += 1
+
+        value = freeze(compute())
+
+        with self.__lock:
+            self.__data[key] = value
+            while len(self.__data) > self.maxsize:
+                self.__data.popitem(last=False)
+
+        return value
+
+    def clear(self):
+        with self.__lock:
+            self.__data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self),
+            "maxsize": self.maxsize,
+        }
+
+    def __len__(self):
+        return len(self.__data)
+
+
+# shared between args_generator and yaml_generator, so a service/access level
+# pair is generated at most once per process however many times it is requested
+SERVICE_POLICY_CACHE = LRUCache()
+
+# optional second level behind SERVICE_POLICY_CACHE, see configure_disk_cache()
+DISK_CACHE = None
+
+# only results from these generators are persisted to DISK_CACHE
+PERSISTENT_GENERATOR_MODULE = "aws_iam_utils.generator"
+
+
+def configure_disk_cache(disk_cache):
+    """Sets the DiskCache (or None to disable) that backs SERVICE_POLICY_CACHE,
+    so generated policies survive between processes."""
+    global DISK_CACHE
+    DISK_CACHE = disk_cache
+
+
+def service_policy_key(
+    generator,
+    service_name: str,
+    resource_type: str = "*",
+    access_levels: list[str] = [],
+    include_service_wide_actions: bool = False,
+) -> tuple:
+    """Returns the SERVICE_POLICY_CACHE key for a generator call. The generator
+    itself is part of the key so that alternative (or patched) generators never
+    share entries."""
+    return (
+        generator,
+        service_name,
+        resource_type,
+        tuple(sorted(access_levels)),
+        bool(include_service_wide_actions),
+    )
+
+
+def __persistent_key(key: tuple):
+    generator = key[0]
+    if getattr(generator, "__module__", None) != PERSISTENT_GENERATOR_MODULE:
+        return None
+
+    return [f"{generator.__module__}.{generator.__qualname__}", *key[1:]]
+
+
+def cached_policy(key: tuple, generate) -> dict:
+    """Returns a fresh, mutable copy of the policy cached under key in
+    SERVICE_POLICY_CACHE, calling generate() to produce it on a miss. If a
+    disk cache is configured, it is consulted before calling generate()."""
+    disk_cache = DISK_CACHE
+
+    def load_or_generate():
+        disk_key = __persistent_key(key) if disk_cache is not None else None
+        if disk_key is None:
+            profiler.count("generator calls")
+            return generate()
+
+        policy = disk_cache.get(disk_key)
+        if policy is None:
+            profiler.count("generator calls")
+            policy = generate()
+            disk_cache.put(disk_key, policy)
+
+        return policy
+
+    return thaw(SERVICE_POLICY_CACHE.get(key, load_or_generate))
@@ -0,0 +1,178 @@
+import functools
+import hashlib
+import json
+import os
+import tempfile
+
+CACHE_DIR_ENV = "AWS_POLICY_GENERATOR_CACHE_DIR"
+
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024  # bytes
+
+# packages whose data determines generated policies; upgrading any of them
+# changes every cache key, so stale entries are never returned
+VERSIONED_PACKAGES = ["aws-iam-utils", "policy_sentry", "policyuniverse"]
+
+
+def default_cache_dir() -> str:
+    """Returns the cache directory: $AWS_POLICY_GENERATOR_CACHE_DIR if set,
+    otherwise aws-policy-generator under $XDG_CACHE_HOME (or ~/.cache)."""
+    if os.environ.get(CACHE_DIR_ENV):
+        return os.environ[CACHE_DIR_ENV]
+
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(base, "aws-policy-generator")
+
+
+@functools.lru_cache(maxsize=1)
+def database_versions() -> dict:
+    # importlib.metadata is slow to import, and --help never needs it
+    from importlib.metadata import PackageNotFoundError
+    from importlib.metadata import version
+
+    result = {}
+    for package in VERSIONED_PACKAGES:
+        try:
+            result[package] = version(package)
+        except PackageNotFoundError:
+            result[package] = None
+
+    return result
+
+
+class DiskCache:
+    """A content-addressed cache of JSON values on disk.
+
+    Entries are stored under the SHA-256 of their key and the installed
+    versions of VERSIONED_PACKAGES. When the total size of the cache exceeds
+    max_size, the least recently used entries are evicted.
+    """
+
+    def __init__(self, path: str = None, max_size: int = DEFAULT_MAX_SIZE):
+        self.path = path or default_cache_dir()
+        self.max_size = max_size
+        self.__size = None
+
+    def digest(self, key) -> str:
+        return hashlib.sha256(
+            json.dumps(
+                {"key": key, "versions": database_versions()}, sort_keys=True
+            ).encode("utf-8")
+        ).hexdigest()
+
+    def __entry_path(self, key) -> str:
+        digest = self.digest(key)
+        return os.path.join(self.path, digest[:2], f"{digest}.json")
+
+    def get(self, key):
+        """Returns the value stored under key, or None if there is none."""
+        path = self.__entry_path(key)
+
+        try:
+            with open(path, "r") as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:
+            pass
+
+        return value
+
+    def put(self, key, value):
+        path = self.__entry_path(key)
+        data = json.dumps(value).encode("utf-8")
+        directory = os.path.dirname(path)
+
+        try:
+            os.makedirs(directory, exist_ok=True)
+            try:
+                old_size = os.path.getsize(path)
+            except OSError:
+                old_size = 0
+
+            # write then rename, so concurrent readers never see partial entries
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except OSError:
+                os.remove(tmp_path)
+                raise
+
+        except OSError:
+            return  # caching is best-effort; never fail generation over it
+
+        if self.__size is not None:
+            self.__size += len(data) - old_size
+
+        if self.__total_size() > self.max_size:
+            self.evict()
+
+    def __entries(self) -> list:
+        """Returns (mtime, size, path) for every entry, oldest first."""
+        entries = []
+        if not os.path.isdir(self.path):
+            return entries
+
+        for dir_entry in os.scandir(self.path):
+            if not dir_entry.is_dir():
+                continue
+
+            for entry in os.scandir(dir_entry.path):
+                if entry.name.endswith(".json"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        return sorted(entries)
+
+    def __total_size(self) -> int:
+        if self.__size is None:
+            self.__size = sum(size for _, size, _ in self.__entries())
+
+        return self.__size
+
+    def evict(self):
+        """Removes least recently used entries until the cache fits max_size."""
+        entries = self.__entries()
+        size = sum(size for _, size, _ in entries)
+
+        for _, entry_size, path in entries:
+            if size <= self.max_size:
+                break
+
+            try:
+                os.remove(path)
+                size -= entry_size
+            except OSError:
+                pass
+
+        self.__size = size
+
+    def clear(self) -> int:
+        """Removes every entry, returning the number removed."""
+        removed = 0
+        for _, _, path in self.__entries():
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+
+        self.__size = 0
+        return removed
+
+    def stats(self) -> dict:
+        entries = self.__entries()
+
+        return {
+            "path": self.path,
+            "entries": len(entries),
+            "size": sum(size for _, size, _ in entries),
+            "max_size": self.max_size,
+            "versions": database_versions(),
+        }
@@ -0,0 +1,59 @@
+import concurrent.futures
+import importlib
+
+from aws_policy_generator import action_index
+from aws_policy_generator import cache
+from aws_policy_generator import trie_minimizer
+
+EXECUTORS = ["process", "thread"]
+
+
+def init_worker(disk_cache, index_path, minimizer="policyuniverse"):
+    """Configures a worker process's caches (and minimizer) like those of the
+    process that started it, as workers may not share its module state (e.g.
+    when spawned)."""
+    cache.configure_disk_cache(disk_cache)
+    trie_minimizer.configure_minimizer(minimizer)
+    action_index.configure_action_index(
+        action_index.load_action_index(index_path) if index_path else None
+    )
+
+
+def create_executor(kind: str = "process", jobs: int = None, preload=()):
+    """Returns a pool of jobs (by default, one per CPU) worker processes or
+    threads. The modules in preload are imported first, so that forked
+    worker processes start with them loaded rather than each loading them."""
+    if kind == "thread":
+        return concurrent.futures.ThreadPoolExecutor(max_workers=jobs)
+
+    if kind != "process":
+        raise ValueError(f"invalid executor: {kind}, must be one of {EXECUTORS}")
+
+    for module in preload:
+        importlib.import_module(module)
+
+    # (concurrent.futures only imports multiprocessing, which is slow to
+    # import, when ProcessPoolExecutor is first used)
+    index = action_index.ACTIVE_INDEX
+    return concurrent.futures.ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=init_worker,
+        initargs=(
+            cache.DISK_CACHE,
+            index.path if index else None,
+            trie_minimizer.ACTIVE_MINIMIZER,
+        ),
+    )
+
+
+def parallel_map(fn, items: list, jobs: int = None, kind="process", preload=()):
+    """Returns [fn(x) for x in items], in the same order, calling fn on a
+    pool of jobs workers of the given kind. With no jobs (or just one), or
+    fewer than two items, fn is called in this thread instead."""
+    if not jobs or jobs == 1 or len(items) <= 1:
+        return [fn(x) for x in items]
+
+    jobs = min(jobs, len(items))
+
+    with create_executor(kind, jobs, preload) as executor:
+        return list(executor.map(fn, items, chunksize=max(1, len(items) // (jobs * 4))))
@@ -0,0 +1,112 @@
+import bisect
+import copy
+import fnmatch
+import functools
+
+# characters that make an action a pattern to fnmatch; only "*" makes
+# policyuniverse's expand_policy() expand an action, so only it does here
+PATTERN_CHARS = "*?["
+
+
+@functools.lru_cache(maxsize=1)
+def __permissions() -> tuple:
+    # policyuniverse's master permission list, sorted, and the same split into
+    # sorted lists by service
+    from policyuniverse import all_permissions
+
+    by_service = {}
+    for permission in sorted(all_permissions):
+        by_service.setdefault(permission.split(":")[0], []).append(permission)
+
+    return sorted(all_permissions), by_service
+
+
+@functools.lru_cache(maxsize=4096)
+def expand_action(action: str) -> tuple:
+    """Returns the (lower case) actions in policyuniverse's master permission
+    list that action matches, or just action, lower cased, if it has no
+    wildcard or matches none.
+
+    A service:Prefix* wildcard is resolved with a range lookup in the
+    service's sorted actions, any other wildcard by matching it against the
+    service's actions only (or all actions, if the service is a wildcard).
+    Results are cached by action."""
+    action = action.lower()
+    if "*" not in action:
+        return (action,)
+
+    everything, by_service = __permissions()
+    service_name, _, name = action.partition(":")
+
+    if any(x in service_name for x in PATTERN_CHARS):
+        matches = fnmatch.filter(everything, action)
+
+    elif name.endswith("*") and not any(x in name[:-1] for x in PATTERN_CHARS):
+        actions = by_service.get(service_name, [])
+        prefix = action[:-1]
+
+        matches = []
+        for i in range(bisect.bisect_left(actions, prefix), len(actions)):
+            if not actions[i].startswith(prefix):
+                break
+            matches.append(actions[i])
+
+    else:
+        matches = fnmatch.filter(by_service.get(service_name, []), action)
+
+    # a wildcard for a service (or actions) we've never heard of is kept
+    return tuple(matches) or (action,)
+
+
+def expand_statement_actions(statement: dict) -> list[str]:
+    """Returns the sorted actions statement allows (its Action, expanded, or
+    every action its NotAction doesn't match), as policyuniverse's
+    get_actions_from_statement() does."""
+    actions = statement.get("Action", [])
+    not_actions = statement.get("NotAction", [])
+
+    allowed = set()
+    for action in [actions] if isinstance(actions, str) else actions:
+        allowed.update(expand_action(action))
+
+    inverted = set()
+    for action in [not_actions] if isinstance(not_actions, str) else not_actions:
+        inverted.update(expand_action(action))
+
+    if inverted:
+        allowed.update(set(__permissions()[0]).difference(inverted))
+
+    return sorted(allowed)
+
+
+def expand_policy(policy: dict, expand_deny: bool = False) -> dict:
+    """Returns a copy of policy with every Allow (and, if expand_deny, Deny)
+    statement's wildcards expanded, as policyuniverse's expand_policy() does,
+    but with each wildcard looked up in an index of the actions of its
+    service (see expand_action()), rather than matched against them all."""
+    result = {k: copy.deepcopy(v) for k, v in policy.items() if k != "Statement"}
+
+    statements = policy["Statement"]
+    if isinstance(statements, dict):
+        statements = [statements]
+
+    result["Statement"] = []
+    for st in statements:
+        if st["Effect"].lower() == "deny" and not expand_deny:
+            result["Statement"].append(copy.deepcopy(st))
+            continue
+
+        actions = expand_statement_actions(st)
+
+        # Action keeps its place (NotAction is dropped), as in policyuniverse
+        expanded = {}
+        for k, v in st.items():
+            if k == "Action":
+                expanded[k] = actions
+            elif k != "NotAction":
+                expanded[k] = copy.deepcopy(v)
+        expanded.setdefault("Action", actions)
+
+        result["Statement"].append(expanded)
+
+    return result
@@ -0,0 +1,100 @@
+import builtins
+import functools
+import importlib
+import sys
+import time
+
+from contextlib import contextmanager
+from importlib.util import resolve_name
+
+
+@functools.lru_cache(maxsize=None)
+def lazy_function(module_name: str, name: str):
+    """Returns a function that imports module_name on first call and calls
+    its function name, so that modules which are slow to import (such as
+    policyuniverse, or anything that loads the IAM database) are only
+    loaded by the runs that need them.
+
+    The same function is returned for every call with the same arguments,
+    and it carries the module and name of the function it stands in for, so
+    that it can be used in cache keys (see cache.service_policy_key()).
+    """
+
+    def call(*args, **kwargs):
+        return getattr(importlib.import_module(module_name), name)(*args, **kwargs)
+
+    call.__module__ = module_name
+    call.__name__ = name
+    call.__qualname__ = name
+    call.__doc__ = f"Calls {module_name}.{name}(), importing it on first use."
+
+    return call
+
+
+class ImportProfile:
+    """Times the imports made while installed as builtins.__import__ (see
+    profile_imports()). Each newly loaded module is recorded with its
+    cumulative time (including the modules it imported) and its self time."""
+
+    def __init__(self, original_import=builtins.__import__):
+        self.modules = []
+        self.__original_import = original_import
+        self.__children = [0.0]
+
+    @property
+    def total(self) -> float:
+        return self.__children[0]
+
+    def __call__(self, name, globals=None, locals=None, fromlist=(), level=0):
+        fullname = name
+        if level:
+            try:
+                fullname = resolve_name(
+                    "." * level + name, (globals or {}).get("__package__")
+                )
+            except (ImportError, ValueError):
+                pass
+
+        if fullname in sys.modules:
+            return self.__original_import(name, globals, locals, fromlist, level)
+
+        self.__children.append(0.0)
+        start = time.perf_counter()
+
+        try:
+            return self.__original_import(name, globals, locals, fromlist, level)
+
+        finally:
+            elapsed = time.perf_counter() - start
+            children = self.__children.pop()
+            self.__children[-1] += elapsed
+
+            if fullname in sys.modules:
+                self.modules.append((fullname, elapsed, elapsed - children))
+
+    def report(self, limit: int = 20) -> str:
+        """Returns the limit slowest imports, slowest first, in the style of
+        'python -X importtime'."""
+        lines = [
+            f"import profile: {self.total:.3f}s importing {len(self.modules)}"
+            + " modules",
+            f"{'cumulative':>10} | {'self':>8} | module",
+        ]
+
+        for name, cumulative, own in sorted(self.modules, key=lambda x: -x[1])[:limit]:
+            lines.append(f"{cumulative:>9.3f}s | {own:>7.3f}s | {name}")
+
+        return "\n".join(lines)
+
+
+@contextmanager
+def profile_imports():
+    """Records the imports made within the block in an ImportProfile."""
+    original_import = builtins.__import__
+    profile = ImportProfile(original_import)
+
+    builtins.__import__ = profile
+    try:
+        yield profile
+    finally:
+        builtins.__import__ = original_import
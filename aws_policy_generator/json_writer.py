@@ -0,0 +1,27 @@
+import json
+
+# characters buffered before each write to the output
+CHUNK_SIZE = 65536
+
+
+def write_json(output, value, indent: int = None, chunk_size: int = CHUNK_SIZE) -> int:
+    """Writes value to output (a text file) exactly as json.dumps(value,
+    indent=indent) would serialize it, but a chunk at a time as it is
+    encoded, so that the whole document is never held in memory as one
+    string. Returns the number of characters written."""
+    buffer = []
+    buffered = 0
+    length = 0
+
+    for chunk in json.JSONEncoder(indent=indent).iterencode(value):
+        buffer.append(chunk)
+        buffered += len(chunk)
+
+        if buffered >= chunk_size:
+            output.write("".join(buffer))
+            length += buffered
+            buffer = []
+            buffered = 0
+
+    output.write("".join(buffer))
+    return length + buffered
@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+
+from importlib.metadata import PackageNotFoundError
+from importlib.metadata import version
+
+from aws_policy_generator.disk_cache import database_versions
+from aws_policy_generator.mappings import ACCESS_LEVELS_MAPPINGS
+
+MANIFEST_FILENAME = ".aws-policy-generator-manifest.json"
+
+
+def file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            h.update(chunk)
+
+    return h.hexdigest()
+
+
+def tool_versions() -> dict:
+    """Returns the versions of aws-policy-generator and of the packages whose
+    data determines generated policies."""
+    try:
+        own_version = version("aws-policy-generator")
+    except PackageNotFoundError:
+        own_version = None
+
+    return {"aws-policy-generator": own_version, **database_versions()}
+
+
+class Manifest:
+    """Records, for each spec in a batch, a fingerprint of everything its
+    policy was generated from (the spec's content, the effective options, tool
+    versions and ACCESS_LEVELS_MAPPINGS) and a hash of the policy written. A
+    spec whose fingerprint and output are unchanged need not be regenerated.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = {}
+
+        try:
+            with open(path, "r") as f:
+                self.entries = json.load(f).get("entries", {})
+        except (OSError, ValueError):
+            pass  # no (usable) manifest: everything will be regenerated
+
+        self.__environment = json.dumps(
+            {
+                "versions": tool_versions(),
+                "access_levels_mappings": ACCESS_LEVELS_MAPPINGS,
+            },
+            sort_keys=True,
+        )
+
+    def fingerprint(self, spec_path: str, options: dict) -> str:
+        return hashlib.sha256(
+            json.dumps(
+                [file_hash(spec_path), options, self.__environment], sort_keys=True
+            ).encode("utf-8")
+        ).hexdigest()
+
+    def is_current(self, spec: str, fingerprint: str, output_path: str) -> bool:
+        """Returns True if spec was last generated from fingerprint, and the
+        output it produced is still in place, unmodified."""
+        entry = self.entries.get(spec)
+        if entry is None or entry["fingerprint"] != fingerprint:
+            return False
+
+        try:
+            return file_hash(output_path) == entry["output_hash"]
+        except OSError:
+            return False
+
+    def record(self, spec: str, fingerprint: str, output_path: str):
+        self.entries[spec] = {
+            "fingerprint": fingerprint,
+            "output_hash": file_hash(output_path),
+        }
+
+    def save(self, specs: list[str] = None):
+        """Writes the manifest. If specs is given, entries for any other specs
+        (e.g. ones since deleted) are dropped."""
+        if specs is not None:
+            self.entries = {k: v for k, v in self.entries.items() if k in specs}
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"entries": self.entries}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
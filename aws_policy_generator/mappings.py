@@ -1,11 +1,12 @@
-from aws_iam_utils.constants import (
-    READ,
-    WRITE,
-    LIST,
-    TAGGING,
-    PERMISSIONS,
-    ALL_ACCESS_LEVELS,
-)
+# access levels as named in the IAM database; the same values as
+# aws_iam_utils.constants, which can't be imported without loading the database
+READ = "Read"
+LIST = "List"
+WRITE = "Write"
+TAGGING = "Tagging"
+PERMISSIONS = "Permissions management"
+
+ALL_ACCESS_LEVELS = [READ, LIST, WRITE, TAGGING, PERMISSIONS]
 
 FULL_ACCESS = "*"
 
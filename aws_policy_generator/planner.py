@@ -0,0 +1,192 @@
+from aws_policy_generator.mappings import ACCESS_LEVELS_MAPPINGS
+
+# Items of a spec (or CLI arguments) are normalized to tasks, plain tuples that
+# can be compared and sent to worker processes:
+#
+#   ("action", action, resource)  -- action can be a list of actions
+#   ("full", service_name, access_levels)  -- service_name:*
+#   ("service", service_name, access_levels)
+#   ("arn_type", service_name, access_levels, resource_type,
+#    include_service_wide_actions)
+#
+# Only "service" and "arn_type" tasks call a generator (and need the database).
+GENERATOR_TASKS = ["service", "arn_type"]
+
+
+def service_task(
+    service_name: str,
+    resource_type: str,
+    access_levels: list[str],
+    include_service_wide_actions: bool = False,
+    full_access: bool = False,
+) -> tuple:
+    """Returns the task for access_levels to resource_type of service_name
+    (or all of it, if resource_type is "*")."""
+    if ":" in service_name:
+        raise ValueError(
+            'service name cannot include ":", use resource_type to specify'
+            + " a resource type"
+        )
+
+    if resource_type != "*":
+        return (
+            "arn_type",
+            service_name,
+            access_levels,
+            resource_type,
+            bool(include_service_wide_actions),
+        )
+
+    if full_access:
+        return ("full", service_name, access_levels)
+
+    return ("service", service_name, access_levels)
+
+
+def action_task(action: str, resource="*") -> tuple:
+    return ("action", action, resource)
+
+
+def subsumes(a: tuple, b: tuple) -> bool:
+    """Returns whether task a grants everything that task b does. All
+    generated policies are for Resource "*", so this is the case when a is
+    for more access levels than b (write > read > list), to as much of the
+    same service: all of it (full access most of all), or the same resource
+    type, with service-wide actions if b has them."""
+    if a == b:
+        return True
+
+    if a[0] == "action":
+        return False
+
+    if b[0] == "action":
+        # only full access covers any action, and only on any resource
+        return a[0] == "full" and b[2] == "*" and service_of(b) == service_of(a)
+
+    if a[1] != b[1]:
+        return False
+
+    if a[0] == "full":
+        return True
+
+    if b[0] == "full" or not set(b[2]) <= set(a[2]):
+        return False
+
+    if a[0] == "service":
+        return True
+
+    return b[0] == "arn_type" and a[3] == b[3] and (a[4] or not b[4])
+
+
+def describe_task(task: tuple) -> str:
+    """Returns a short description of task, for people."""
+    if task[0] == "action":
+        actions = task[1] if isinstance(task[1], list) else [task[1]]
+        resources = task[2] if isinstance(task[2], list) else [task[2]]
+        return f"action {', '.join(actions)} on {', '.join(resources)}"
+
+    levels = ", ".join(task[2])
+    for name, mapped in ACCESS_LEVELS_MAPPINGS.items():
+        if set(mapped) == set(task[2]):
+            levels = name
+            break
+
+    if task[0] == "full":
+        return f"{task[1]}:* (full access)"
+
+    if task[0] == "service":
+        return f"{levels} access to {task[1]}"
+
+    return f"{levels} access to {task[1]} {task[3]}" + (
+        " (with service-wide actions)" if task[4] else ""
+    )
+
+
+def task_attributes(task: tuple) -> dict:
+    """Returns the attributes of task reported to observers of the pipeline
+    (see profiler.stage())."""
+    if task[0] == "action":
+        return {"kind": "action", "action": task[1]}
+
+    attributes = {"kind": task[0], "service": task[1], "access_levels": task[2]}
+    if task[0] == "arn_type":
+        attributes["resource_type"] = task[3]
+        attributes["include_service_wide_actions"] = task[4]
+
+    return attributes
+
+
+def service_of(task: tuple) -> str:
+    """Returns the (lower case) name of the service task is for, or None for
+    actions of several services (which no other task subsumes)."""
+    if task[0] == "action":
+        actions = task[1] if isinstance(task[1], list) else [task[1]]
+        services = set(x.split(":")[0].lower() for x in actions)
+        return services.pop() if len(services) == 1 else None
+
+    return task[1].lower()
+
+
+class Plan:
+    """The tasks for a set of items, less any duplicated or subsumed by
+    another (see subsumes()), in their original order.
+
+    kept holds the index of each task to generate, and skipped maps the index
+    of each other task to that of a kept task that grants all it does.
+    """
+
+    def __init__(self, tasks: list[tuple]):
+        self.tasks = tasks
+        self.kept = []
+        self.skipped = {}
+
+        # only tasks for the same service can subsume each other
+        by_service = {}
+        for i, task in enumerate(tasks):
+            by_service.setdefault(service_of(task), []).append(i)
+
+        for i, task in enumerate(tasks):
+            same_service = by_service[service_of(task)]
+
+            # of tasks that subsume each other (duplicates), keep the first
+            if not any(
+                subsumes(tasks[j], task) and (j < i or not subsumes(task, tasks[j]))
+                for j in same_service
+                if j != i
+            ):
+                self.kept.append(i)
+
+        kept = set(self.kept)
+        for i, task in enumerate(tasks):
+            if i not in kept:
+                self.skipped[i] = next(
+                    j
+                    for j in by_service[service_of(task)]
+                    if j in kept and subsumes(tasks[j], task)
+                )
+
+    @property
+    def kept_tasks(self) -> list[tuple]:
+        return [self.tasks[i] for i in self.kept]
+
+    @property
+    def generator_calls_avoided(self) -> int:
+        return len([i for i in self.skipped if self.tasks[i][0] in GENERATOR_TASKS])
+
+    def report(self) -> str:
+        lines = [
+            f"plan: generating {len(self.kept)} of {len(self.tasks)} items,"
+            + f" {self.generator_calls_avoided} generator calls avoided"
+        ]
+
+        for i, task in enumerate(self.tasks):
+            if i in self.skipped:
+                by = self.tasks[self.skipped[i]]
+                reason = (
+                    "duplicate" if by == task else f"granted by {describe_task(by)}"
+                )
+                lines.append(f"  skip      {describe_task(task)} ({reason})")
+            else:
+                lines.append(f"  generate  {describe_task(task)}")
+
+        return "\n".join(lines)
@@ -0,0 +1,178 @@
+import json
+
+# These behave exactly as their namesakes in aws_iam_utils, which can't be
+# imported without loading the IAM database and policyuniverse (its package
+# imports all of its modules). Using these instead means that requests which
+# need no database lookups, such as full access to a service (which is just
+# "service:*") or specific actions, never load it.
+
+
+def create_policy(*statements: dict, version: str = "2012-10-17") -> dict:
+    """Shortcut function to create a policy with the given statements."""
+    return {"Version": version, "Statement": list(statements)}
+
+
+def statement(
+    effect: str = "Allow",
+    actions: list[str] = [],
+    resource: str = None,
+    condition: dict = None,
+    principal: dict = None,
+) -> dict:
+    """Shortcut function to create a Statement with the given properties."""
+    st = {}
+
+    for k, v in {
+        "Effect": effect,
+        "Action": actions,
+        "Resource": resource,
+        "Principal": principal,
+        "Condition": condition,
+    }.items():
+        if v is not None:
+            st[k] = v
+
+    return st
+
+
+def generate_full_policy_for_service(*service_name: str) -> dict:
+    """Generates an IAM policy that grants full access to all of the given service."""
+    return create_policy(
+        {
+            "Effect": "Allow",
+            "Action": [f"{s}:*" for s in service_name],
+            "Resource": "*",
+        }
+    )
+
+
+class AccumulatedStatement:
+    """A statement of a PolicyAccumulator: its Effect, Resource, Condition and
+    Principal (nested dicts as JSON), any of which may be "" if missing, and
+    the ids of its actions in the accumulator's table of actions."""
+
+    __slots__ = ("effect", "resource", "condition", "principal", "action_ids")
+
+    def __init__(self, effect: str, resource: str, condition: str, principal: str):
+        self.effect = effect
+        self.resource = resource
+        self.condition = condition
+        self.principal = principal
+        self.action_ids = set()
+
+    def as_dict(self, action_names: list[str]) -> dict:
+        st = {}
+
+        # (fresh copies of nested dicts, so the result can be modified)
+        for name, v in {
+            "Effect": self.effect or None,
+            "Condition": json.loads(self.condition) if self.condition else None,
+            "Resource": self.resource or None,
+            "Principal": json.loads(self.principal) if self.principal else None,
+        }.items():
+            if v is not None:
+                st[name] = v
+
+        st["Action"] = sorted(action_names[x] for x in self.action_ids)
+        return st
+
+
+class PolicyAccumulator:
+    """Merges the statements of policies as they are added, into one
+    canonical policy.
+
+    Like collapse_policy_statements() in aws_iam_utils, actions are combined
+    (lower case, and without duplicates) across statements with equal
+    Effect, Condition, Resource and Principal, but this is done once, as
+    each statement is added, rather than each time policies are collapsed.
+    Statements are kept as AccumulatedStatements until policy() returns them
+    as dicts, in the order they were first added, each with its actions
+    sorted.
+
+    Actions are interned as they are added: each distinct lower case action is
+    given an id, so accumulated statements hold sets of small ints, and the
+    policy built from them shares one copy of each name. The table belongs to
+    the accumulator, so it is freed along with it.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.__statements = {}
+        self.__action_ids = {}
+        self.__action_names = []
+
+    def __action_id(self, action: str) -> int:
+        name = action.lower()
+        i = self.__action_ids.get(name)
+        if i is None:
+            i = self.__action_ids[name] = len(self.__action_names)
+            self.__action_names.append(name)
+
+        return i
+
+    def add(self, policy: dict):
+        """Adds the statements of policy."""
+        if self.version is None:
+            self.version = policy["Version"]
+
+        for st in policy["Statement"]:
+            self.add_statement(st)
+
+    def add_statement(self, st: dict):
+        """Adds a single statement."""
+        for k in ["NotAction", "NotPrincipal", "NotResource"]:
+            if k in st:
+                raise ValueError(f"Policy key {k} is not supported")
+
+        resources = st.get("Resource", [None])
+        if type(resources) is str:
+            resources = [resources]
+
+        actions = st["Action"]
+        if type(actions) is str:
+            actions = [actions]
+
+        # nested dicts are keyed as json; a missing key as ""
+        effect = st.get("Effect") or ""
+        condition = st.get("Condition")
+        condition = "" if condition is None else json.dumps(condition, sort_keys=True)
+        principal = st.get("Principal")
+        principal = "" if principal is None else json.dumps(principal, sort_keys=True)
+
+        ids = [self.__action_id(x) for x in actions]
+
+        for resource in resources:
+            k = (effect, resource or "", condition, principal)
+
+            accumulated = self.__statements.get(k)
+            if accumulated is None:
+                accumulated = self.__statements[k] = AccumulatedStatement(*k)
+
+            accumulated.action_ids.update(ids)
+
+    def policy(self) -> dict:
+        """Returns the merged policy."""
+        return create_policy(
+            *[x.as_dict(self.__action_names) for x in self.__statements.values()],
+            version=self.version or "2012-10-17",
+        )
+
+
+def simplify_policy(p: dict) -> dict:
+    """For the given policy, simplify any one-item arrays into straight strings, for
+    Actions, Principals and Resources."""
+    for st in p["Statement"]:
+        for k in ["Action", "Resource"]:
+            if k in st:
+                if type(st[k]) is list and len(st[k]) == 1:
+                    st[k] = st[k][0]
+
+        if "Principal" in st:
+            principal = st["Principal"]
+
+            for k in ["AWS", "Service"]:
+                if k in principal:
+                    if type(principal[k]) is list and len(principal[k]) == 1:
+                        principal[k] = principal[k][0]
+
+    return p
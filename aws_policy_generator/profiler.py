@@ -0,0 +1,336 @@
+import contextlib
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+# Stages of the pipeline (see stage()) and counts of the work done (see
+# count()) are reported to observers (see Observer and add_observer()):
+#
+#   parse      loading a YAML spec
+#   plan       planning its items, and those of the command line
+#   generate   generating the policy for one item (tagged with its service,
+#              access levels and resource type)
+#   collapse   merging the items' policies
+#   simplify   simplifying the merged policy
+#   expand     expanding its wildcards (--no-wildcards)
+#   minimize   minimizing it
+#   serialize  serializing it, shortened or split if need be
+#
+# With no observers, stage() and count() do nothing.
+
+# the observers that stages and counts are reported to, see add_observer()
+OBSERVERS = ()
+
+__observers_lock = threading.Lock()
+__local = threading.local()
+__not_observed = contextlib.nullcontext()
+
+
+class Observer:
+    """Receives the stages of the pipeline as they start and finish, and
+    counts of the work done, from the thread that runs them. Subclasses
+    override whichever methods they need; these do nothing."""
+
+    def stage_started(self, event):
+        pass
+
+    def stage_finished(self, event):
+        pass
+
+    def counted(self, name: str, n: int):
+        pass
+
+
+class StageEvent:
+    """A run of a stage of the pipeline.
+
+    path is the names of the stages it was run within and its own, joined by
+    "/" (e.g. "serialize/minimize"), and attributes describe it, e.g. the
+    service an item is for, or the size of its output (see annotate()). start
+    is its time.perf_counter() when it started; once finished, wall and cpu
+    are the seconds it took, and error any exception it raised.
+    """
+
+    def __init__(self, name: str, path: str, attributes: dict):
+        self.name = name
+        self.path = path
+        self.attributes = attributes
+        self.thread = threading.get_ident()
+        self.start = None
+        self.wall = None
+        self.cpu = None
+        self.error = None
+
+
+def add_observer(observer: Observer):
+    global OBSERVERS
+    with __observers_lock:
+        OBSERVERS = OBSERVERS + (observer,)
+
+
+def remove_observer(observer: Observer):
+    global OBSERVERS
+    with __observers_lock:
+        OBSERVERS = tuple(x for x in OBSERVERS if x is not observer)
+
+
+@contextlib.contextmanager
+def observing(*observers: Observer):
+    """Reports the stages run within the block to observers."""
+    for observer in observers:
+        add_observer(observer)
+
+    try:
+        yield
+    finally:
+        for observer in observers:
+            remove_observer(observer)
+
+
+def stage(name: str, **attributes):
+    """Returns a context manager that reports the block as a run of the named
+    stage of the pipeline, with the given attributes, to the observers."""
+    if not OBSERVERS:
+        return __not_observed
+
+    return __observed_stage(name, attributes)
+
+
+@contextlib.contextmanager
+def __observed_stage(name: str, attributes: dict):
+    observers = OBSERVERS
+
+    if not hasattr(__local, "stack"):
+        __local.stack = []
+    stack = __local.stack
+
+    event = StageEvent(
+        name, "/".join([x.name for x in stack] + [name]), dict(attributes)
+    )
+    stack.append(event)
+
+    for observer in observers:
+        observer.stage_started(event)
+
+    event.start = time.perf_counter()
+    cpu = time.thread_time()
+    try:
+        yield
+    except BaseException as ex:
+        event.error = ex
+        raise
+    finally:
+        event.wall = time.perf_counter() - event.start
+        event.cpu = time.thread_time() - cpu
+        stack.pop()
+
+        for observer in reversed(observers):
+            observer.stage_finished(event)
+
+
+def annotate(policy: dict = None, prefix: str = "", **attributes):
+    """Adds attributes to the innermost stage running in this thread, if it is
+    observed, along with the numbers of statements and actions in policy, if
+    given (as "statements" and "actions", after prefix)."""
+    if not OBSERVERS:
+        return
+
+    stack = getattr(__local, "stack", None)
+    if not stack:
+        return
+
+    if policy is not None:
+        for name, value in policy_sizes(policy).items():
+            attributes[prefix + name] = value
+
+    stack[-1].attributes.update(attributes)
+
+
+def count(name: str, n: int = 1):
+    """Adds n to the named count of the work done, for the observers."""
+    for observer in OBSERVERS:
+        observer.counted(name, n)
+
+
+def policy_sizes(policy: dict) -> dict:
+    statements = policy["Statement"]
+    if isinstance(statements, dict):
+        statements = [statements]
+
+    actions = [x.get("Action", []) for x in statements]
+    return {
+        "statements": len(statements),
+        "actions": sum(1 if isinstance(x, str) else len(x) for x in actions),
+    }
+
+
+class Profile(Observer):
+    """Wall time, CPU time and peak memory allocated by each stage of the
+    pipeline, and the counts of the work done.
+
+    Stages are keyed by their path, so a stage run within another (such as
+    minimizing while serializing) is reported as e.g. "serialize/minimize",
+    and its time is included in its parent's. Peak memory is only measured
+    while tracemalloc is tracing (see profile_pipeline()), and is of the
+    whole process, so includes allocations by other threads. Stages run in
+    worker processes are not recorded.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+        self.__lock = threading.Lock()
+        self.__local = threading.local()
+
+    def stage_started(self, event):
+        if not hasattr(self.__local, "stack"):
+            self.__local.stack = []
+        stack = self.__local.stack
+
+        with self.__lock:
+            # (added now, so that stages are listed in the order they started)
+            self.stages.setdefault(
+                event.path, {"calls": 0, "wall": 0.0, "cpu": 0.0, "peak_memory": 0}
+            )
+
+        frame = {"peak": 0, "start_memory": 0}
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+            tracemalloc.reset_peak()
+            frame["start_memory"] = current
+
+        stack.append(frame)
+
+    def stage_finished(self, event):
+        stack = self.__local.stack
+        frame = stack.pop()
+
+        peak = 0
+        if tracemalloc.is_tracing():
+            peak = max(frame["peak"], tracemalloc.get_traced_memory()[1])
+            if stack:
+                stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+            peak -= frame["start_memory"]
+
+        with self.__lock:
+            stats = self.stages[event.path]
+            stats["calls"] += 1
+            stats["wall"] += event.wall
+            stats["cpu"] += event.cpu
+            stats["peak_memory"] = max(stats["peak_memory"], peak)
+
+    def counted(self, name: str, n: int):
+        with self.__lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def as_dict(self) -> dict:
+        return {"stages": self.stages, "counters": self.counters}
+
+    def to_json(self) -> str:
+        return json.dumps(self.as_dict(), indent=2)
+
+    def report(self) -> str:
+        """Returns the stages, in the order they were first run, and the
+        counters, as a table."""
+        lines = [
+            f"{'stage':<28} {'calls':>6} {'wall':>9} {'cpu':>9} {'peak memory':>12}"
+        ]
+
+        for path, stats in self.stages.items():
+            depth = path.count("/")
+            name = "  " * depth + path.split("/")[-1]
+            lines.append(
+                f"{name:<28} {stats['calls']:>6} {stats['wall']:>8.3f}s"
+                + f" {stats['cpu']:>8.3f}s {stats['peak_memory'] / 1024:>10.0f}KB"
+            )
+
+        for name, value in self.counters.items():
+            lines.append(f"{name + ':':<28} {value:>6}")
+
+        return "\n".join(lines)
+
+
+@contextlib.contextmanager
+def profile_pipeline(trace_memory: bool = True):
+    """Records the stages of the pipeline run within the block in a new
+    Profile, which is yielded. If trace_memory is True (the default), memory
+    allocations are traced too, which slows the pipeline down."""
+    profile = Profile()
+    start_tracing = trace_memory and not tracemalloc.is_tracing()
+
+    if start_tracing:
+        tracemalloc.start()
+
+    try:
+        with observing(profile):
+            yield profile
+    finally:
+        if start_tracing:
+            tracemalloc.stop()
+
+
+class ChromeTrace(Observer):
+    """Records the stages of the pipeline as Chrome trace events, to be
+    opened in a trace viewer such as chrome://tracing or Perfetto: one
+    complete ("X") event per run of a stage, with its attributes (and CPU
+    time) as its args, and a counter ("C") event per count."""
+
+    def __init__(self):
+        self.events = []
+        self.__origin = time.perf_counter()
+        self.__totals = {}
+        self.__lock = threading.Lock()
+
+    def __timestamp(self, seconds: float) -> float:
+        # in microseconds, from when the trace started
+        return round((seconds - self.__origin) * 1e6, 3)
+
+    def stage_finished(self, event):
+        args = dict(event.attributes)
+        args["cpu_ms"] = round(event.cpu * 1e3, 3)
+        if event.error is not None:
+            args["error"] = repr(event.error)
+
+        with self.__lock:
+            self.events.append(
+                {
+                    "name": event.name,
+                    "cat": event.path,
+                    "ph": "X",
+                    "ts": self.__timestamp(event.start),
+                    "dur": round(event.wall * 1e6, 3),
+                    "pid": os.getpid(),
+                    "tid": event.thread,
+                    "args": args,
+                }
+            )
+
+    def counted(self, name: str, n: int):
+        with self.__lock:
+            self.__totals[name] = self.__totals.get(name, 0) + n
+            self.events.append(
+                {
+                    "name": name,
+                    "ph": "C",
+                    "ts": self.__timestamp(time.perf_counter()),
+                    "pid": os.getpid(),
+                    "args": {name: self.__totals[name]},
+                }
+            )
+
+    def as_dict(self) -> dict:
+        with self.__lock:
+            events = sorted(self.events, key=lambda x: x["ts"])
+
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def to_json(self) -> str:
+        return json.dumps(self.as_dict(), default=str)
+
+    def write(self, path: str):
+        with open(path, "w") as f:
+            f.write(self.to_json() + "\n")
@@ -1,31 +1,181 @@
+import fnmatch
+import functools
+import hashlib
+import json
+import time
+
+from aws_policy_generator import cache
+from aws_policy_generator import profiler
+from aws_policy_generator import trie_minimizer
+from aws_policy_generator.cache import LRUCache
+from aws_policy_generator.cache import thaw
+from policyuniverse import all_permissions
 from policyuniverse.expander_minimizer import minimize_policy
 from aws_iam_utils.util import lowercase_policy
 from aws_iam_utils.policy import policy_from_dict
 
 ACTION_NOT_FOUND_ERR = "Desired action not found in master permission list."
 
-MAX_FAILS = 100
+# minimized policies, keyed on canonical_policy_hash(); backed by the disk
+# cache (cache.DISK_CACHE) when one is configured
+MINIMIZE_CACHE = LRUCache(maxsize=128)
+
+# only results from this minimizer are persisted to the disk cache
+PERSISTENT_MINIMIZER_MODULE = "policyuniverse.expander_minimizer"
+
+__seconds_saved = 0.0
+
+
+@functools.lru_cache(maxsize=1)
+def __permissions_by_service() -> dict:
+    result = {}
+    for permission in all_permissions:
+        result.setdefault(permission.split(":")[0], []).append(permission)
+
+    return result
+
+
+@functools.lru_cache(maxsize=4096)
+def is_known_action(action: str) -> bool:
+    """Returns True if minimize_policy() can process the given (lowercase)
+    action, i.e. it is in policyuniverse's master permission list or is a
+    wildcard matching at least one action in it."""
+    if "*" not in action and "?" not in action:
+        return action in all_permissions
+
+    service = action.split(":")[0]
+    if "*" in service or "?" in service:
+        candidates = all_permissions
+    else:
+        candidates = __permissions_by_service().get(service, [])
+
+    return any(fnmatch.fnmatchcase(x, action) for x in candidates)
 
 
-def minimize_policy_with_error_handling(policy: dict):
+def canonical_policy_hash(policy: dict) -> str:
+    """Returns a hash that is equal for policies that differ only in the case
+    of their actions, which the minimizers ignore. The order of statements and
+    actions is kept, as the minimized output follows it."""
+    return hashlib.sha256(
+        json.dumps(lowercase_policy(policy), sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+
+def minimize_cache_stats() -> dict:
+    """Returns MINIMIZE_CACHE's stats, plus the time spent in the minimizer
+    that cache hits (in memory or on disk) avoided."""
+    return {**MINIMIZE_CACHE.stats(), "seconds_saved": __seconds_saved}
+
+
+def minimize_policy_with_error_handling(policy: dict, minimizer: str = None):
     """Runs minimize_policy() but ignores errors relating to unknown
-    actions, removing them from the input and then re-adding afterward.
+    actions, removing them from the input and then re-adding afterward. If
+    minimizer is "trie" (or, if it is None, the trie minimizer is configured,
+    see trie_minimizer.configure_minimizer()), the trie minimizer is used
+    instead, and handles unknown actions itself.
+
+    Unknown actions are found with a single pass over the policy before
+    minimizing, so minimize_policy() normally runs exactly once however many
+    unknown actions there are.
+
+    Results are cached (see MINIMIZE_CACHE), so minimizing an identical policy
+    again skips minimize_policy() entirely.
     """
-    failing_actions = []
-    failing_ppis = []
+    engine = trie_minimizer.resolve_minimizer(minimizer)
+
+    with profiler.stage("minimize", engine=engine):
+        profiler.annotate(policy)
+        result = __cached_minimize_policy_with_error_handling(policy, engine)
+        profiler.annotate(result, prefix="minimized_")
+
+        return result
+
+
+def __cached_minimize_policy_with_error_handling(policy: dict, engine: str):
+    global __seconds_saved
+
+    digest = canonical_policy_hash(policy)
+    disk_cache = cache.DISK_CACHE
+    disk_key = None
+
+    if engine == "trie":
+        minimizer = __trie_minimize_policy
+        if disk_cache is not None:
+            disk_key = ["trie_minimize_policy", digest]
+    else:
+        minimizer = __minimize_policy_with_error_handling
+        if (
+            disk_cache is not None
+            and getattr(minimize_policy, "__module__", None)
+            == PERSISTENT_MINIMIZER_MODULE
+        ):
+            disk_key = ["minimize_policy", digest]
+
+    computed = []
+
+    def load_or_minimize():
+        entry = disk_cache.get(disk_key) if disk_key is not None else None
+        if entry is not None:
+            return entry
+
+        start = time.perf_counter()
+        entry = {
+            "policy": minimizer(policy),
+            "seconds": time.perf_counter() - start,
+        }
+        computed.append(entry)
+
+        if disk_key is not None:
+            disk_cache.put(disk_key, entry)
+
+        return entry
+
+    # the minimizer is part of the key so that a patched or alternative
+    # minimizer never shares entries
+    key = (minimize_policy, digest)
+    if minimizer is __trie_minimize_policy:
+        key = (trie_minimizer.minimize_policy, digest)
+
+    entry = MINIMIZE_CACHE.get(key, load_or_minimize)
+    if not computed:
+        __seconds_saved += entry["seconds"]
+        profiler.count("minimize cache hits")
+
+    return thaw(entry["policy"])
+
+
+def __trie_minimize_policy(policy: dict):
+    return trie_minimizer.minimize_policy(lowercase_policy(policy))
+
+
+def __minimize_policy_with_error_handling(policy: dict):
     policy_lowercase = policy_from_dict(lowercase_policy(policy))
 
-    fail_counter = 0
+    # index the PolicyPermissionItems by action, so that every item for an
+    # action (whatever its resource, condition, etc) can be set aside at once;
+    # known_ppis is keyed by position, so removing items keeps the rest in order
+    all_ppis = policy_lowercase.ppis
+    known_ppis = dict(enumerate(all_ppis))
+    positions_by_action = {}
+    for i, ppi in enumerate(all_ppis):
+        positions_by_action.setdefault(ppi.action, []).append(i)
 
-    while True:
-        fail_counter += 1
-        if fail_counter == MAX_FAILS:
-            raise Exception(
-                f"Reached {fail_counter} errors while processing policy, "
-                + "either this is too many errors or there is a bug in "
-                + "aws-policy-generator"
-            )
+    profiler.count("permission items minimized", len(all_ppis))
+    failing_positions = []
 
+    def set_aside(action):
+        for i in positions_by_action.pop(action, []):
+            failing_positions.append(i)
+            del known_ppis[i]
+
+    for action in list(positions_by_action):
+        if not is_known_action(action):
+            set_aside(action)
+            profiler.count("unknown actions set aside")
+
+    # (Policy.as_dict() only iterates ppis, so a view of known_ppis will do)
+    policy_lowercase.ppis = known_ppis.values()
+    while True:
         try:
             result = minimize_policy(policy_lowercase.as_dict())
             break
@@ -35,19 +185,17 @@ def minimize_policy_with_error_handling(policy: dict):
             if not ex_str.startswith(ACTION_NOT_FOUND_ERR):
                 raise ex
 
+            # policyuniverse rejected an action we thought it knew about;
+            # set it aside along with the rest and try again
             failing_action = ex_str[len(ACTION_NOT_FOUND_ERR) + 1 :]
-            failing_actions.append(failing_action)
+            if failing_action not in positions_by_action:
+                raise ex
 
-        # capture the PolicyPermissionItems where failing actions appear, so
-        # we also capture condition, resource, etc
-        for failing_action in failing_actions:
-            for ppi in policy_lowercase.ppis:
-                if ppi.action == failing_action:
-                    failing_ppis.append(ppi)
-                    policy_lowercase.ppis.remove(ppi)
-                    break
+            set_aside(failing_action)
+            profiler.count("minimizer retries")
 
+    # re-add in their original order, however they were found
     result_policy = policy_from_dict(result)
-    result_policy.ppis.extend(failing_ppis)
+    result_policy.ppis.extend(all_ppis[i] for i in sorted(failing_positions))
 
     return result_policy.as_dict()
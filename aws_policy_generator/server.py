@@ -0,0 +1,151 @@
+import argparse
+import json
+import os
+import socket
+import socketserver
+
+from concurrent.futures import ThreadPoolExecutor
+
+SOCKET_ENV = "AWS_POLICY_GENERATOR_SOCKET"
+
+# arguments that only make sense to the process they are given to, and so
+# are never forwarded to a daemon (which has its own pool of workers)
+LOCAL_ARGUMENTS = [
+    "file",
+    "output",
+    "socket",
+    "import_profile",
+    "print_plan",
+    "profile",
+    "profile_pstats",
+    "trace",
+    "no_cache",
+    "no_index",
+    "jobs",
+    "executor",
+]
+
+
+class DaemonError(Exception):
+    """Raised by request() when the daemon failed to generate a policy."""
+
+
+class PolicyServer(socketserver.UnixStreamServer):
+    """Serves generate(args_namespace, yaml_inputs) over a Unix domain socket,
+    handling each connection on a pool of worker threads.
+
+    Each connection carries one request, a JSON object with the (non-local)
+    parsed command-line arguments in "args" (any that are None, or missing,
+    are taken from defaults) and the contents of any YAML files in "yaml",
+    and gets one response: {"output": ...} with what the CLI would print, or
+    {"error": ...}. Connections are closed after responding.
+    """
+
+    def __init__(self, path: str, generate, defaults: dict, workers: int = None):
+        self.generate = generate
+        self.defaults = defaults
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+        remove_stale_socket(path)
+
+        # only the owner may send requests; the socket is created that way,
+        # rather than changed after binding, when others could already connect
+        umask = os.umask(0o177)
+        try:
+            super().__init__(path, RequestHandler)
+        finally:
+            os.umask(umask)
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self.__process_request, request, client_address)
+
+    def __process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+        try:
+            os.unlink(self.server_address)
+        except OSError:
+            pass
+
+    def respond(self, request: dict) -> dict:
+        try:
+            # arguments the client left unset take the daemon's defaults
+            args = dict(self.defaults)
+            for name, value in request.get("args", {}).items():
+                if value is not None:
+                    args[name] = value
+
+            for name in LOCAL_ARGUMENTS:
+                args[name] = self.defaults.get(name)
+
+            output = self.generate(argparse.Namespace(**args), request.get("yaml", []))
+            return {"output": output}
+
+        except Exception as ex:
+            return {"error": f"{type(ex).__name__}: {ex}"}
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.read())
+        except ValueError as ex:
+            response = {"error": f"invalid request: {ex}"}
+        else:
+            response = self.server.respond(request)
+
+        self.wfile.write(json.dumps(response).encode("utf-8"))
+
+
+def remove_stale_socket(path: str):
+    """Removes the socket at path, left behind by a daemon that is no longer
+    running. Raises OSError if a daemon is still listening on it."""
+    if not os.path.exists(path):
+        return
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        try:
+            s.connect(path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.unlink(path)
+            return
+
+    raise OSError(f"a daemon is already listening on {path}")
+
+
+def request(path: str, args_namespace, yaml_inputs: list[str]) -> str:
+    """Asks the daemon listening at path to generate the policy for
+    args_namespace and yaml_inputs (the contents of its YAML files), returning
+    what the CLI would print. Raises OSError if no daemon is listening, or
+    DaemonError if it fails."""
+    args = {k: v for k, v in vars(args_namespace).items() if k not in LOCAL_ARGUMENTS}
+    if args.get("out_dir"):
+        # the daemon's working directory is not ours
+        args["out_dir"] = os.path.abspath(args["out_dir"])
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(path)
+        s.sendall(json.dumps({"args": args, "yaml": yaml_inputs}).encode("utf-8"))
+        s.shutdown(socket.SHUT_WR)
+
+        chunks = []
+        while True:
+            chunk = s.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+
+    response = json.loads(b"".join(chunks))
+    if "error" in response:
+        raise DaemonError(response["error"])
+
+    return response["output"]
@@ -0,0 +1,150 @@
+import json
+
+from aws_policy_generator.auto_shortener import INDENT
+from aws_policy_generator.auto_shortener import ShorteningCandidates
+from aws_policy_generator.auto_shortener import choose_strategy
+from aws_policy_generator.auto_shortener import container_length
+from aws_policy_generator.auto_shortener import serialized_length
+from aws_policy_generator.auto_shortener import shortening_strategies
+
+# nesting depth of statements in a policy, and of their actions
+STATEMENT_DEPTH = 2
+ACTION_DEPTH = STATEMENT_DEPTH + 1
+
+
+def __item_costs(compact: bool, depth: int) -> tuple:
+    # a non-empty container at depth is fixed + sum(length + per_item) long
+    one = container_length([0], compact, depth)
+    per_item = container_length([0, 0], compact, depth) - one
+
+    return one - per_item, per_item
+
+
+def __first_fit_decreasing(sizes: list[int], capacity: int) -> list[list[int]]:
+    # returns bins of indices into sizes, each bin in ascending order
+    bins = []
+    remaining = []
+
+    for i in sorted(range(len(sizes)), key=lambda x: -sizes[x]):
+        for b, space in enumerate(remaining):
+            if sizes[i] <= space:
+                bins[b].append(i)
+                remaining[b] -= sizes[i]
+                break
+        else:
+            bins.append([i])
+            remaining.append(capacity - sizes[i])
+
+    return [sorted(x) for x in bins]
+
+
+def __split_statement(statement: dict, capacity: int, compact: bool) -> list[dict]:
+    # splits statement's actions across as few copies of it as will each cost
+    # at most capacity, keeping each service's actions together where possible
+    actions = statement.get("Action")
+    if not actions or isinstance(actions, str):
+        raise ValueError(
+            f"a statement of {serialized_length(statement, compact)} characters"
+            + " cannot be split any further to fit the maximum length"
+        )
+
+    fixed, per_action = __item_costs(compact, ACTION_DEPTH)
+    action_capacity = (
+        capacity
+        - serialized_length({**statement, "Action": []}, compact, STATEMENT_DEPTH)
+        + 2  # the empty list
+        - fixed
+    )
+
+    # chunks of actions, and their total cost, by service; a service whose
+    # actions cannot all fit together is split into several chunks
+    chunks_by_service = {}
+    for action in actions:
+        cost = serialized_length(action) + per_action
+        if cost > action_capacity:
+            raise ValueError(f"the action {action} cannot fit the maximum length")
+
+        chunks = chunks_by_service.setdefault(action.split(":")[0].lower(), [])
+        if not chunks or chunks[-1][1] + cost > action_capacity:
+            chunks.append([[], 0])
+
+        chunks[-1][0].append(action)
+        chunks[-1][1] += cost
+
+    chunks = [x for service in chunks_by_service.values() for x in service]
+    bins = __first_fit_decreasing([x[1] for x in chunks], action_capacity)
+
+    return [{**statement, "Action": [x for i in b for x in chunks[i][0]]} for b in bins]
+
+
+def split_policy(
+    policy: dict, max_length: int = 6144, compact: bool = False
+) -> list[dict]:
+    """Packs the statements of policy into as few policies as possible, each
+    no longer than max_length when serialized (indented, unless compact).
+
+    Statements are packed whole, first-fit-decreasing, except for any too long
+    to fit in a policy on their own, which are split into statements for
+    groups of their actions first. Lengths are worked out once per statement
+    and summed, so nothing is serialized more than once.
+    """
+    statements = policy["Statement"]
+    if isinstance(statements, dict):
+        statements = [statements]
+    if not statements:
+        return [policy]
+
+    fixed, per_statement = __item_costs(compact, STATEMENT_DEPTH - 1)
+    capacity = (
+        max_length
+        - serialized_length({**policy, "Statement": []}, compact)
+        + 2  # the empty list
+        - fixed
+    )
+
+    pieces = []
+    sizes = []
+    for statement in statements:
+        size = serialized_length(statement, compact, STATEMENT_DEPTH) + per_statement
+        if size <= capacity:
+            pieces.append(statement)
+            sizes.append(size)
+            continue
+
+        for piece in __split_statement(statement, capacity - per_statement, compact):
+            pieces.append(piece)
+            sizes.append(
+                serialized_length(piece, compact, STATEMENT_DEPTH) + per_statement
+            )
+
+    return [
+        {**policy, "Statement": [pieces[i] for i in b]}
+        for b in __first_fit_decreasing(sizes, capacity)
+    ]
+
+
+def auto_split_policy(
+    policy: dict,
+    minimize: bool = False,
+    compact: bool = False,
+    max_length: int = 6144,
+    minimizer: str = None,
+) -> list[str]:
+    """Like auto_shorten_policy(), but rather than failing when even the
+    shortest form of the policy is too long, returns that form split into
+    several policies with split_policy()."""
+    candidates = ShorteningCandidates(policy, minimizer)
+    strategies = shortening_strategies(minimize, compact)
+
+    strategy = choose_strategy(candidates, strategies, max_length)
+    if strategy is not None:
+        return [candidates.serialized(*strategy)]
+
+    minimize, compact = strategies[-1]
+    if minimize:
+        policy = candidates.minimized()
+
+    return [
+        json.dumps(x) if compact else json.dumps(x, indent=INDENT)
+        for x in split_policy(policy, max_length, compact)
+    ]
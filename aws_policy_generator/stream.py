@@ -0,0 +1,55 @@
+import json
+
+# lines that end a YAML document (and, for "---", start the next one)
+DOCUMENT_MARKERS = ["---", "..."]
+
+
+def __is_marker(line: str) -> bool:
+    return line in DOCUMENT_MARKERS or line.startswith("--- ")
+
+
+def documents(lines):
+    """Yields each document in lines as soon as it is complete: a JSON object
+    on a line of its own (JSON Lines), or a YAML document, which ends at the
+    next --- or ... line, or at the end of lines. Blank and comment lines
+    between documents are skipped."""
+    yaml_lines = []
+
+    for line in lines:
+        stripped = line.strip()
+
+        if __is_marker(stripped):
+            if yaml_lines:
+                yield "".join(yaml_lines)
+                yaml_lines = []
+
+            if stripped.startswith("--- "):
+                yaml_lines.append(stripped[4:] + "\n")
+            continue
+
+        if not yaml_lines:
+            if not stripped or stripped.startswith("#"):
+                continue
+
+            if stripped.startswith("{"):
+                yield stripped
+                continue
+
+        yaml_lines.append(line)
+
+    if yaml_lines:
+        yield "".join(yaml_lines)
+
+
+def load_document(document: str):
+    """Loads a document yielded by documents()."""
+    if document.startswith("{") and "\n" not in document:
+        try:
+            return json.loads(document)
+        except ValueError:
+            pass  # e.g. a YAML flow mapping
+
+    # imported here to keep importing the CLI fast
+    import yaml
+
+    return yaml.safe_load(document)
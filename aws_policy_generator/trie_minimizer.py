@@ -0,0 +1,200 @@
+import fnmatch
+import functools
+
+from aws_policy_generator import action_index
+
+# the engines minimize_policy_with_error_handling() can minimize with
+MINIMIZERS = ["policyuniverse", "trie"]
+
+# the engine used when none is given, see configure_minimizer()
+ACTIVE_MINIMIZER = "policyuniverse"
+
+
+def resolve_minimizer(name: str = None) -> str:
+    """Returns name, or ACTIVE_MINIMIZER if it is None, checking that it is
+    one of MINIMIZERS."""
+    name = name or ACTIVE_MINIMIZER
+    if name not in MINIMIZERS:
+        raise ValueError(f"invalid minimizer: {name}, must be one of {MINIMIZERS}")
+
+    return name
+
+
+def configure_minimizer(name: str):
+    """Sets the engine safe_minimizer minimizes policies with when none is
+    given: policyuniverse's minimize_policy(), or this module's."""
+    global ACTIVE_MINIMIZER
+    ACTIVE_MINIMIZER = resolve_minimizer(name)
+
+
+@functools.lru_cache(maxsize=1)
+def __database_actions() -> dict:
+    # every action known to the IAM database or policyuniverse, by service, as
+    # the action index has them (see action_index.build_action_index())
+    from aws_iam_utils.action_data_overrides import ACTION_DATA_OVERRIDES
+    from policy_sentry.shared.iam_data import iam_definition
+    from policyuniverse import all_permissions
+
+    result = {}
+    for service_name, service_data in iam_definition.items():
+        actions = result.setdefault(service_name, set())
+        for action_name in service_data["privileges"]:
+            name = f"{service_name}:{action_name}".lower()
+            actions.add(ACTION_DATA_OVERRIDES.get(name, {}).get("action", name))
+
+    for name in all_permissions:
+        result.setdefault(name.split(":")[0], set()).add(name)
+
+    return result
+
+
+def service_actions(service_name: str) -> list[str]:
+    """Returns the (lower case) names of every action of the given service
+    known to the IAM database or policyuniverse, from the active action index
+    if there is one."""
+    index = action_index.ACTIVE_INDEX
+    if index is not None:
+        actions = index.known_actions(service_name)
+    else:
+        actions = __database_actions().get(service_name, [])
+
+    return sorted(set(x.lower() for x in actions))
+
+
+class ActionTrie:
+    """A prefix trie of the names of a service's actions (without the
+    "service:"), in which each node counts the actions below it.
+
+    Nodes are [children by character, number of actions, is an action].
+    """
+
+    def __init__(self, service_name: str, actions: list[str]):
+        self.service_name = service_name
+        self.actions = set(actions)
+        self.root = [{}, 0, False]
+
+        for action in self.actions:
+            node = self.root
+            node[1] += 1
+            for char in action.split(":", 1)[1]:
+                node = node[0].setdefault(char, [{}, 0, False])
+                node[1] += 1
+            node[2] = True
+
+    def minimize(self, granted: set) -> list[str]:
+        """Returns the fewest, shortest "service:prefix*" patterns (or exact
+        actions) that match every action in granted, and no other action of
+        the service. granted must be a subset of the trie's actions."""
+        # the number of granted actions below each node
+        hits = {}
+        for action in granted:
+            node = self.root
+            hits[id(node)] = hits.get(id(node), 0) + 1
+            for char in action.split(":", 1)[1]:
+                node = node[0][char]
+                hits[id(node)] = hits.get(id(node), 0) + 1
+
+        patterns = []
+        stack = [(self.root, "")]
+        while stack:
+            node, prefix = stack.pop()
+            children, size, is_action = node
+
+            if hits.get(id(node), 0) == size:
+                # every action below here is granted, so one pattern covers
+                # them; a single action is given exactly if that is as short
+                patterns.append(f"{self.service_name}:{prefix}*")
+                if size == 1 and prefix:
+                    action = self.__only_action(node, prefix)
+                    if len(action) <= len(prefix) + 1:
+                        patterns[-1] = f"{self.service_name}:{action}"
+                continue
+
+            if is_action and f"{self.service_name}:{prefix}" in granted:
+                patterns.append(f"{self.service_name}:{prefix}")
+
+            for char, child in children.items():
+                if id(child) in hits:
+                    stack.append((child, prefix + char))
+
+        return sorted(patterns)
+
+    @staticmethod
+    def __only_action(node, prefix: str) -> str:
+        # the name of the one action below node
+        while not node[2]:
+            char, node = next(iter(node[0].items()))
+            prefix += char
+
+        return prefix
+
+
+@functools.lru_cache(maxsize=512)
+def __trie(service_name: str, index) -> ActionTrie:
+    # (index is part of the key, so that each index has its own tries)
+    return ActionTrie(service_name, service_actions(service_name))
+
+
+def action_trie(service_name: str) -> ActionTrie:
+    return __trie(service_name, action_index.ACTIVE_INDEX)
+
+
+def minimize_actions(actions: list[str]) -> list[str]:
+    """Returns the fewest, shortest patterns that match exactly the actions
+    of each service that actions match, in lower case and sorted.
+
+    Actions (and patterns) unknown to the IAM database and policyuniverse,
+    such as newly released ones, are kept as they are, unless a pattern
+    already matches them."""
+    granted = {}
+    unknown = []
+
+    for action in dict.fromkeys(x.lower() for x in actions):
+        service_name = action.split(":")[0]
+        if ":" not in action or "*" in service_name or "?" in service_name:
+            unknown.append(action)
+            continue
+
+        trie = action_trie(service_name)
+        if "*" in action or "?" in action:
+            matches = [x for x in trie.actions if fnmatch.fnmatchcase(x, action)]
+        else:
+            matches = [action] if action in trie.actions else []
+
+        if matches:
+            granted.setdefault(service_name, set()).update(matches)
+        else:
+            unknown.append(action)
+
+    patterns = []
+    for service_name, service_granted in granted.items():
+        patterns.extend(action_trie(service_name).minimize(service_granted))
+
+    wildcards = [x for x in patterns if x.endswith("*")]
+    for action in unknown:
+        if not any(fnmatch.fnmatchcase(action, x) for x in wildcards):
+            patterns.append(action)
+
+    return sorted(set(patterns))
+
+
+def minimize_policy(policy: dict) -> dict:
+    """Returns policy with each statement's Action minimized (see
+    minimize_actions()). Unlike policyuniverse's minimize_policy(), this never
+    fails on unknown actions, and minimizes Deny statements too."""
+    statements = policy["Statement"]
+    if isinstance(statements, dict):
+        statements = [statements]
+
+    result = []
+    for st in statements:
+        st = dict(st)
+        if "Action" in st:
+            actions = st["Action"]
+            st["Action"] = minimize_actions(
+                [actions] if isinstance(actions, str) else actions
+            )
+
+        result.append(st)
+
+    return {**policy, "Statement": result}
@@ -2,14 +2,32 @@
 
 import yaml
 
+from aws_policy_generator import action_index
+from aws_policy_generator import profiler
+from aws_policy_generator.cache import cached_policy
+from aws_policy_generator.cache import service_policy_key
+from aws_policy_generator.executor import parallel_map
 from aws_policy_generator.mappings import ACCESS_LEVELS_MAPPINGS
-from aws_iam_utils.generator import generate_policy_for_service
-from aws_iam_utils.generator import generate_policy_for_service_arn_type
-from aws_iam_utils.generator import generate_full_policy_for_service
-from aws_iam_utils.combiner import collapse_policy_statements
-from aws_iam_utils.simplifier import simplify_policy
-from aws_iam_utils.util import create_policy
-from aws_iam_utils.util import statement
+from aws_policy_generator.imports import lazy_function
+from aws_policy_generator.planner import GENERATOR_TASKS
+from aws_policy_generator.planner import Plan
+from aws_policy_generator.planner import task_attributes
+from aws_policy_generator.planner import action_task
+from aws_policy_generator.planner import service_task
+from aws_policy_generator.policy_util import PolicyAccumulator
+from aws_policy_generator.policy_util import create_policy
+from aws_policy_generator.policy_util import generate_full_policy_for_service
+from aws_policy_generator.policy_util import simplify_policy
+from aws_policy_generator.policy_util import statement
+
+# only these need the IAM database, which is loaded on their first call
+DATABASE_MODULE = "aws_iam_utils.generator"
+generate_policy_for_service = lazy_function(
+    DATABASE_MODULE, "generate_policy_for_service"
+)
+generate_policy_for_service_arn_type = lazy_function(
+    DATABASE_MODULE, "generate_policy_for_service_arn_type"
+)
 
 # YAML example:
 #
@@ -28,14 +46,12 @@ from aws_iam_utils.util import statement
 # The access_level key can be list, read, write, tagging, permissions or all.
 
 
-def __generate_yaml_action_item(item, options):
-    action_name = item["action"]
-    resource = item.get("resource", "*")
-    return [create_policy(statement(actions=action_name, resource=resource))]
+def __yaml_action_item_tasks(item, options):
+    return [action_task(item["action"], item.get("resource", "*"))]
 
 
-def __generate_yaml_service_item(item, options):
-    result = []
+def __yaml_service_item_tasks(item, options):
+    tasks = []
 
     service_names = []
     if type(item["service"]) is list:
@@ -47,12 +63,6 @@ def __generate_yaml_service_item(item, options):
         resource_types = item.get("resource_type", ["*"])
         access_level = item.get("access_level", "read")
 
-        if ":" in service_name:
-            raise ValueError(
-                'service name cannot include ":", use resource_type to specify'
-                + " a resource type"
-            )
-
         if type(resource_types) is str:
             resource_types = [resource_types]
 
@@ -68,46 +78,118 @@ def __generate_yaml_service_item(item, options):
                     "include_service_wide_actions", False
                 )
 
-            if resource_type == "*":
-                if access_level == "all":
-                    result.append(generate_full_policy_for_service(service_name))
-                else:
-                    result.append(
-                        generate_policy_for_service(
-                            service_name,
-                            access_levels,
-                        )
-                    )
-
-            else:
-                result.append(
-                    generate_policy_for_service_arn_type(
-                        service_name,
-                        resource_type,
-                        access_levels,
-                        include_service_wide_actions=include_service_wide_actions,
-                    )
+            tasks.append(
+                service_task(
+                    service_name,
+                    resource_type,
+                    access_levels,
+                    include_service_wide_actions,
+                    full_access=access_level == "all",
                 )
+            )
 
-    return result
+    return tasks
+
+
+def __generate_task(task):
+    if not profiler.OBSERVERS:
+        return __generate_task_policy(task)
+
+    with profiler.stage("generate", **task_attributes(task)):
+        policy = __generate_task_policy(task)
+        profiler.annotate(policy)
+
+        return policy
+
+
+def __generate_task_policy(task):
+    # tasks are plain tuples, so that they can be sent to worker processes
+    kind, name = task[:2]
+
+    if kind == "action":
+        return create_policy(statement(actions=name, resource=task[2]))
+
+    if kind == "full":
+        return cached_policy(
+            service_policy_key(
+                generate_full_policy_for_service, name, access_levels=task[2]
+            ),
+            lambda: generate_full_policy_for_service(name),
+        )
+
+    policy_for_service = generate_policy_for_service
+    policy_for_service_arn_type = generate_policy_for_service_arn_type
+
+    # answer database lookups from the action index, if one is in use
+    index = action_index.ACTIVE_INDEX
+    if index is not None:
+        policy_for_service = index.generate_policy_for_service
+        policy_for_service_arn_type = index.generate_policy_for_service_arn_type
+
+    if kind == "service":
+        access_levels = task[2]
+        return cached_policy(
+            service_policy_key(policy_for_service, name, access_levels=access_levels),
+            lambda: policy_for_service(name, access_levels),
+        )
+
+    access_levels, resource_type, include_service_wide_actions = task[2:]
+    return cached_policy(
+        service_policy_key(
+            policy_for_service_arn_type,
+            name,
+            resource_type,
+            access_levels,
+            include_service_wide_actions,
+        ),
+        lambda: policy_for_service_arn_type(
+            name,
+            resource_type,
+            access_levels,
+            include_service_wide_actions=include_service_wide_actions,
+        ),
+    )
 
 
 def generate_from_yaml(
-    yamlInput, minimize=False, compact=False, auto_shorten=False, max_length=6144
+    yamlInput,
+    minimize=False,
+    compact=False,
+    auto_shorten=False,
+    max_length=6144,
+    jobs=None,
+    executor="process",
 ):
-    yamlData = yaml.safe_load(yamlInput)
+    with profiler.stage("parse"):
+        yamlData = yaml.safe_load(yamlInput)
+
+    return generate_from_spec(yamlData, jobs, executor)
+
+
+def generate_from_spec(yamlData, jobs=None, executor="process"):
+    """Generates the policy for a spec already loaded from YAML (or JSON): a
+    dict with the same "policies" and "options" keys as a YAML file. Items
+    that are duplicated, or granted by another item, are skipped (see
+    planner.Plan)."""
+    return generate_from_tasks(Plan(spec_tasks(yamlData)).kept_tasks, jobs, executor)
+
+
+def spec_tasks(yamlData) -> list[tuple]:
+    """Returns the tasks (see planner) for the items of a spec, in order."""
+    if yamlData is not None and not isinstance(yamlData, dict):
+        raise ValueError(f"invalid input: {yamlData}, must be a mapping")
 
-    policies = []  # list of policies that we'll collapse together at the end
+    tasks = []
 
     if yamlData and yamlData.get("policies"):
         options = yamlData.get("options", {})
 
         for yamlDataPolicy in yamlData["policies"]:
             if "action" in yamlDataPolicy:
-                policies.extend(__generate_yaml_action_item(yamlDataPolicy, options))
+                tasks.extend(__yaml_action_item_tasks(yamlDataPolicy, options))
 
             elif "service" in yamlDataPolicy:
-                policies.extend(__generate_yaml_service_item(yamlDataPolicy, options))
+                tasks.extend(__yaml_service_item_tasks(yamlDataPolicy, options))
 
             else:
                 raise ValueError(
@@ -115,6 +197,44 @@ def generate_from_yaml(
                     + ' or "action" key'
                 )
 
-    policy = simplify_policy(collapse_policy_statements(*policies))
+    return tasks
+
+
+def generate_from_tasks(tasks: list[tuple], jobs=None, executor="process"):
+    """Generates the policy for tasks (see planner), merging their policies
+    (see add_tasks())."""
+    accumulator = PolicyAccumulator()
+    add_tasks(accumulator, tasks, jobs, executor)
+
+    with profiler.stage("collapse"):
+        policy = accumulator.policy()
+        profiler.annotate(policy)
+
+    with profiler.stage("simplify"):
+        policy = simplify_policy(policy)
+        profiler.annotate(policy)
+
+        return policy
+
+
+def add_tasks(accumulator, tasks: list[tuple], jobs=None, executor="process"):
+    """Generates the policy for each of tasks (see planner), adding it to
+    accumulator, a PolicyAccumulator.
+
+    The tasks are independent of each other, so with jobs they are generated
+    concurrently on a pool of that many worker processes or threads (see
+    executor.EXECUTORS). The accumulated policy is sorted, so it is the same
+    however they are generated.
+    """
+    # forked worker processes share the database if it is loaded up front
+    preload = []
+    if action_index.ACTIVE_INDEX is None and any(
+        x[0] in GENERATOR_TASKS for x in tasks
+    ):
+        preload.append(DATABASE_MODULE)
+
+    policies = parallel_map(__generate_task, tasks, jobs, executor, preload)
 
-    return policy
+    with profiler.stage("collapse", policies=len(policies)):
+        for policy in policies:
+            accumulator.add(policy)
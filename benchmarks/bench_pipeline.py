@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""Times each stage of the policy generation pipeline on synthetic workloads
+of increasing size (see workload.py), records the results as JSON and
+compares them with a baseline, to catch stages that have become slower or
+scale worse than they did.
+
+    python benchmarks/bench_pipeline.py --output results.json
+    python benchmarks/bench_pipeline.py --save-baseline
+    python benchmarks/bench_pipeline.py --compare
+
+Caches are cleared before every run of a stage, so each is timed cold. By
+default, service policies are generated from the action index (built into a
+temporary directory if need be); --no-index times the IAM database instead,
+which is far slower.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from aws_policy_generator import action_index  # noqa: E402
+from aws_policy_generator import cache  # noqa: E402
+from aws_policy_generator import safe_minimizer  # noqa: E402
+from aws_policy_generator import trie_minimizer  # noqa: E402
+from aws_policy_generator._internal import argparser  # noqa: E402
+from aws_policy_generator.args_generator import generate_from_args  # noqa: E402
+from aws_policy_generator.auto_shortener import auto_shorten_policy  # noqa: E402
+from aws_policy_generator.disk_cache import database_versions  # noqa: E402
+from aws_policy_generator.policy_util import PolicyAccumulator  # noqa: E402
+from aws_policy_generator.yaml_generator import generate_from_spec  # noqa: E402
+from aws_policy_generator.yaml_generator import generate_from_yaml  # noqa: E402
+from aws_policy_generator.expander import expand_policy  # noqa: E402
+
+import workload  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# timings below this are mostly noise, so are never reported as regressions
+NOISE_FLOOR = 0.005
+
+# scaling exponents are fitted only to timings well above the noise floor,
+# where jitter barely moves them
+SCALING_FLOOR = 4 * NOISE_FLOOR
+
+
+def __accumulate(policies):
+    accumulator = PolicyAccumulator()
+    for policy in policies:
+        accumulator.add(policy)
+
+    return accumulator.policy()
+
+
+def __auto_shorten(policy):
+    try:
+        return auto_shorten_policy(policy, minimize=True)
+    except ValueError:
+        return None  # too long even when minimized, which takes as long
+
+
+def stages(n: int, services: dict) -> dict:
+    """Returns {stage: (function, argument)} for a workload of n items."""
+    spec = workload.spec(n, services)
+    spec_yaml = json.dumps(spec)  # JSON is YAML, and far quicker to write
+    args_namespace = argparser.parser.parse_args(workload.args(n, services))
+
+    # the inputs of the later stages are the outputs of the earlier ones
+    item_policies = [generate_from_spec({"policies": [x]}) for x in spec["policies"]]
+    policy = generate_from_spec(spec)
+
+    return {
+        "generate_from_args": (generate_from_args, args_namespace),
+        "generate_from_yaml": (generate_from_yaml, spec_yaml),
+        "accumulate": (__accumulate, item_policies),
+        "minimize": (safe_minimizer.minimize_policy_with_error_handling, policy),
+        "minimize_trie": (trie_minimizer.minimize_policy, policy),
+        "auto_shorten": (__auto_shorten, policy),
+        "expand": (expand_policy, policy),
+    }
+
+
+def clear_caches():
+    cache.SERVICE_POLICY_CACHE.clear()
+    safe_minimizer.MINIMIZE_CACHE.clear()
+
+
+def timed(fn, argument, repeat: int, budget: float) -> float:
+    """Returns the shortest of up to repeat runs of fn(argument), stopping
+    early once budget seconds have been spent."""
+    best = None
+    spent = 0.0
+
+    for _ in range(repeat):
+        clear_caches()
+
+        # policyuniverse prints as it minimizes
+        with contextlib.redirect_stdout(io.StringIO()):
+            with contextlib.redirect_stderr(io.StringIO()):
+                start = time.perf_counter()
+                fn(argument)
+                elapsed = time.perf_counter() - start
+
+        best = elapsed if best is None else min(best, elapsed)
+        spent += elapsed
+        if spent >= budget:
+            break
+
+    return best
+
+
+def run(sizes: list[int], only: list[str], repeat: int, budget: float) -> dict:
+    services = workload.catalogue()
+    results = {}
+
+    for n in sizes:
+        for stage, (fn, argument) in stages(n, services).items():
+            if only and stage not in only:
+                continue
+
+            seconds = timed(fn, argument, repeat, budget)
+            results.setdefault(stage, {})[str(n)] = seconds
+            print(f"{stage:>20} {n:>6} items {seconds:>9.4f}s", file=sys.stderr)
+
+    return results
+
+
+def scaling_exponent(timings: dict) -> float:
+    """Returns k, where time grows as items**k (1 is linear, 2 quadratic), as
+    the least-squares fit of log time against log items over all of timings,
+    or None if they are for fewer than two workloads."""
+    points = [(math.log(int(n)), math.log(t)) for n, t in timings.items()]
+    if len(points) < 2:
+        return None
+
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / sum(
+        (x - mean_x) ** 2 for x, _ in points
+    )
+
+
+def compare(results: dict, baseline: dict, tolerance: float, slack: float) -> list:
+    """Returns a description of each regression in results against baseline:
+    a stage and workload at least tolerance times slower, or a stage whose
+    scaling_exponent() grew by more than slack, over the workloads both timed
+    above SCALING_FLOOR."""
+    regressions = []
+
+    for stage, timings in results.items():
+        base_timings = baseline.get(stage, {})
+
+        for n, seconds in timings.items():
+            base = base_timings.get(n)
+            if base is None or seconds < NOISE_FLOOR:
+                continue
+
+            if seconds > max(base, NOISE_FLOOR) * tolerance:
+                regressions.append(
+                    f"{stage}: {n} items took {seconds:.4f}s, {seconds / base:.1f}x"
+                    + f" the baseline of {base:.4f}s"
+                )
+
+        # both exponents are fitted to the same workloads
+        common = [
+            n
+            for n, t in timings.items()
+            if min(t, base_timings.get(n, 0)) >= SCALING_FLOOR
+        ]
+        exponent = scaling_exponent({n: timings[n] for n in common})
+        base_exponent = scaling_exponent({n: base_timings[n] for n in common})
+
+        if exponent is not None and base_exponent is not None:
+            if exponent > base_exponent + slack:
+                regressions.append(
+                    f"{stage}: scales as items^{exponent:.2f}, up from"
+                    + f" items^{base_exponent:.2f} in the baseline"
+                )
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[1, 10, 100, 1000],
+        help="Numbers of items to benchmark with",
+    )
+    parser.add_argument(
+        "--stage",
+        action="append",
+        help="Only benchmark this stage (can be repeated)",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="Run each stage up to this many times, taking the fastest",
+    )
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=2.0,
+        help="Stop repeating a stage once it has taken this many seconds",
+    )
+    parser.add_argument(
+        "--no-index",
+        action="store_true",
+        default=False,
+        help="Generate service policies from the IAM database, not the index",
+    )
+    parser.add_argument("-o", "--output", help="Write the results here")
+    parser.add_argument(
+        "--baseline", default=BASELINE_PATH, help="Baseline results to compare with"
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        default=False,
+        help="Write the results to --baseline",
+    )
+    parser.add_argument(
+        "--compare",
+        action="store_true",
+        default=False,
+        help="Compare the results with --baseline, exiting non-zero on regressions",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=2.0,
+        help="Report a workload as a regression if it is this many times slower",
+    )
+    parser.add_argument(
+        "--slack",
+        type=float,
+        default=0.25,
+        help="Report a stage as a regression if its scaling exponent grew by more"
+        + " than this",
+    )
+    args = parser.parse_args()
+
+    cache.configure_disk_cache(None)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = None
+        if not args.no_index:
+            index = action_index.load_action_index() or action_index.load_action_index(
+                action_index.build_action_index(f"{tmp}/index")
+            )
+        action_index.configure_action_index(index)
+
+        results = run(args.sizes, args.stage, args.repeat, args.budget)
+
+    document = {
+        "environment": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "index": not args.no_index,
+            "versions": database_versions(),
+        },
+        "results": results,
+    }
+    output = json.dumps(document, indent=2)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            f.write(output + "\n")
+    if not args.output and not args.save_baseline:
+        print(output)
+
+    if args.compare:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+
+        if baseline["environment"] != document["environment"]:
+            print(
+                "warning: the baseline was recorded in a different environment:"
+                + f" {json.dumps(baseline['environment'])}",
+                file=sys.stderr,
+            )
+
+        regressions = compare(results, baseline["results"], args.tolerance, args.slack)
+        for regression in regressions:
+            print(f"regression: {regression}", file=sys.stderr)
+
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""Shows how minimize_policy_with_error_handling scales with the number of
+permission items and rejected actions, compared with the previous
+implementation (a linear search plus list.remove() for every failing action on
+every retry).
+
+minimize_policy() is replaced with a stub that rejects one action per call, as
+policyuniverse does, so that only the error handling itself is measured.
+
+    python benchmarks/bench_safe_minimizer.py
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from aws_policy_generator import safe_minimizer  # noqa: E402
+from aws_policy_generator.safe_minimizer import ACTION_NOT_FOUND_ERR  # noqa: E402
+from aws_iam_utils.policy import policy_from_dict  # noqa: E402
+from aws_iam_utils.util import create_policy  # noqa: E402
+from aws_iam_utils.util import lowercase_policy  # noqa: E402
+from aws_iam_utils.util import statement  # noqa: E402
+
+RESOURCES_PER_ACTION = 4
+
+
+def legacy_minimize_policy_with_error_handling(policy: dict):
+    """The retry loop as it was before permission items were indexed by
+    action (without its MAX_FAILS ceiling)."""
+    failing_actions = []
+    failing_ppis = []
+    policy_lowercase = policy_from_dict(lowercase_policy(policy))
+
+    while True:
+        try:
+            result = safe_minimizer.minimize_policy(policy_lowercase.as_dict())
+            break
+
+        except Exception as ex:
+            ex_str = str(ex)
+            if not ex_str.startswith(ACTION_NOT_FOUND_ERR):
+                raise ex
+
+            failing_actions.append(ex_str[len(ACTION_NOT_FOUND_ERR) + 1 :])
+
+        for failing_action in failing_actions:
+            for ppi in policy_lowercase.ppis:
+                if ppi.action == failing_action:
+                    failing_ppis.append(ppi)
+                    policy_lowercase.ppis.remove(ppi)
+                    break
+
+    result_policy = policy_from_dict(result)
+    result_policy.ppis.extend(failing_ppis)
+
+    return result_policy.as_dict()
+
+
+def rejecting_minimize_policy(rejected_actions):
+    """Returns a minimize_policy() stub that rejects the given actions, one per
+    call, in order, while they remain in the policy."""
+    remaining = list(rejected_actions)
+
+    def minimize_policy(policy):
+        present = set()
+        for st in policy["Statement"]:
+            present.update(st["Action"])
+
+        while remaining and remaining[0] not in present:
+            remaining.pop(0)
+
+        if remaining:
+            raise Exception(f"{ACTION_NOT_FOUND_ERR} {remaining[0]}")
+
+        return policy
+
+    return minimize_policy
+
+
+def workload(actions: int, rejected: int) -> tuple:
+    """Returns a policy granting the given number of actions, each on
+    RESOURCES_PER_ACTION resources, and the actions to reject."""
+    names = [f"svc:action{i}" for i in range(actions)]
+    policy = create_policy(
+        *[
+            statement(actions=names, resource=f"arn:aws:svc:::r{r}")
+            for r in range(RESOURCES_PER_ACTION)
+        ]
+    )
+
+    return policy, names[:rejected]
+
+
+def timed(fn, policy, rejected_actions) -> float:
+    with patch.object(
+        safe_minimizer,
+        "minimize_policy",
+        new=rejecting_minimize_policy(rejected_actions),
+    ):
+        # treat every action as known, so all of them go through the retry loop
+        with patch.object(safe_minimizer, "is_known_action", new=lambda x: True):
+            start = time.perf_counter()
+            fn(policy)
+            return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[100, 200, 400, 800],
+        help="Numbers of actions to benchmark with",
+    )
+    parser.add_argument(
+        "--rejected-fraction",
+        type=float,
+        default=0.1,
+        help="Fraction of actions that minimize_policy() rejects",
+    )
+    args = parser.parse_args()
+
+    print(f"{'actions':>8} {'items':>8} {'rejected':>9} {'before (s)':>11}", end="")
+    print(f" {'after (s)':>10}")
+    for size in args.sizes:
+        policy, rejected_actions = workload(size, int(size * args.rejected_fraction))
+
+        before = timed(
+            legacy_minimize_policy_with_error_handling, policy, rejected_actions
+        )
+        after = timed(
+            safe_minimizer.minimize_policy_with_error_handling, policy, rejected_actions
+        )
+
+        print(
+            f"{size:>8} {size * RESOURCES_PER_ACTION:>8} {len(rejected_actions):>9}"
+            + f" {before:>11.3f} {after:>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
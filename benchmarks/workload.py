@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""Generates synthetic specs of any number of items, spread across all
+services, access levels and item kinds (whole services, resource types and
+single actions), for benchmarking.
+
+    python benchmarks/workload.py 500 > spec.yaml
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from aws_policy_generator.action_index import build_action_index  # noqa: E402
+from aws_policy_generator.action_index import load_action_index  # noqa: E402
+from aws_policy_generator.mappings import ACCESS_LEVELS_MAPPINGS  # noqa: E402
+
+ACCESS_LEVELS = ["list", "read", "write", "tagging", "permissions", "all"]
+
+# every RESOURCE_TYPE_EVERY-th item is for a resource type, and every
+# ACTION_EVERY-th for a single action, rather than a whole service
+RESOURCE_TYPE_EVERY = 5
+ACTION_EVERY = 7
+
+
+def catalogue(index=None) -> dict:
+    """Returns {service: (resource types, actions)} for every service that
+    the generators can produce policies for at every access level. Some
+    services can't be, because of gaps in the IAM database.
+
+    index is the ActionIndex to read services from; by default, the one
+    built for the installed database (which is built now, into a temporary
+    directory, if it has not been already)."""
+    if index is None:
+        index = load_action_index()
+
+    if index is None:
+        with tempfile.TemporaryDirectory() as tmp:
+            return catalogue(load_action_index(build_action_index(f"{tmp}/index")))
+
+    services = {}
+    for service_name in sorted(index.services):
+        try:
+            for access_level in ACCESS_LEVELS:
+                index.generate_policy_for_service(
+                    service_name, ACCESS_LEVELS_MAPPINGS[access_level]
+                )
+        except ValueError:
+            continue
+
+        resource_types = set()
+        for i in index.action_ids(service_name):
+            resource_types.update(index.resource_types(i))
+
+        actions = index.actions(service_name)
+        if actions:
+            services[service_name] = (sorted(resource_types), actions)
+
+    return services
+
+
+def items(n: int, services: dict, seed: int = 0) -> list[dict]:
+    """Returns n spec items, cycling through services (see catalogue()) and,
+    on each pass over them, the next access level, with every few items for a
+    resource type or an action instead. Resource types and actions are picked
+    at random, with the given seed."""
+    rng = random.Random(seed)
+    names = sorted(services)
+    result = []
+
+    for i in range(n):
+        service_name = names[i % len(names)]
+        access_level = ACCESS_LEVELS[(i // len(names)) % len(ACCESS_LEVELS)]
+        resource_types, actions = services[service_name]
+
+        if i % ACTION_EVERY == ACTION_EVERY - 1:
+            result.append({"action": rng.choice(actions)})
+
+        elif i % RESOURCE_TYPE_EVERY == RESOURCE_TYPE_EVERY - 1 and resource_types:
+            result.append(
+                {
+                    "service": service_name,
+                    "resource_type": rng.choice(resource_types),
+                    "access_level": access_level,
+                }
+            )
+
+        else:
+            result.append({"service": service_name, "access_level": access_level})
+
+    return result
+
+
+def spec(n: int, services: dict, seed: int = 0) -> dict:
+    """Returns a spec (as loaded from YAML) of n items, see items()."""
+    return {"policies": items(n, services, seed)}
+
+
+def args(n: int, services: dict, seed: int = 0) -> list[str]:
+    """Returns command-line arguments for n items, see items(). Items for
+    levels the command line has no option for (tagging and permissions) are
+    given as read."""
+    options = {"list": "--list", "read": "--read", "write": "--write"}
+    result = []
+
+    for item in items(n, services, seed):
+        if "action" in item:
+            result += ["--action", item["action"]]
+            continue
+
+        arg = item["service"]
+        if "resource_type" in item:
+            arg += ":" + item["resource_type"]
+
+        if item["access_level"] == "all":
+            result += ["--full-access", arg]
+        else:
+            result += [options.get(item["access_level"], "--read"), arg]
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("items", type=int, help="Number of items")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args_namespace = parser.parse_args()
+
+    # imported here, as only this script needs it
+    import yaml
+
+    workload = spec(args_namespace.items, catalogue(), args_namespace.seed)
+    print(yaml.safe_dump(workload, sort_keys=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+import pytest
+
+from aws_policy_generator.disk_cache import CACHE_DIR_ENV
+
+
+@pytest.fixture(autouse=True, scope="session")
+def isolated_cache_dir(tmp_path_factory):
+    """Keeps the on-disk cache used by main() out of the user's home
+    directory."""
+    mp = pytest.MonkeyPatch()
+    mp.setenv(CACHE_DIR_ENV, str(tmp_path_factory.mktemp("cache")))
+    yield
+    mp.undo()
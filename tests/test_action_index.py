@@ -0,0 +1,131 @@
+import json
+
+import pytest
+
+from unittest.mock import patch
+
+from aws_policy_generator import action_index
+from aws_policy_generator.action_index import ActionIndex
+from aws_policy_generator.action_index import build_action_index
+from aws_policy_generator.action_index import load_action_index
+from aws_policy_generator.expander import expand_policy
+from aws_policy_generator._internal.main import main
+from aws_iam_utils.constants import LIST, READ, WRITE, ALL_ACCESS_LEVELS
+from aws_iam_utils.generator import generate_policy_for_service
+from aws_iam_utils.generator import generate_policy_for_service_arn_type
+
+DATABASE_VERSIONS_ADDR = "aws_policy_generator.action_index.database_versions"
+
+
+@pytest.fixture(scope="module")
+def index(tmp_path_factory):
+    return ActionIndex(build_action_index(str(tmp_path_factory.mktemp("idx") / "i")))
+
+
+def test_actions_for_access_level_and_resource_type(index):
+    actions = index.actions("ec2", access_levels=[WRITE], resource_type="instance")
+
+    assert "ec2:RunInstances" in actions
+    assert "ec2:DescribeInstances" not in actions
+
+
+def test_wildcard_only_actions(index):
+    assert "ssm:DescribeParameters" in index.actions("ssm", wildcard_only=True)
+
+
+def test_unknown_service(index):
+    with pytest.raises(ValueError):
+        index.actions("notaservice")
+
+
+@pytest.mark.parametrize(
+    "service_name,access_levels",
+    [
+        ("iam", [LIST]),
+        ("s3", [LIST, READ]),
+        ("lambda", [LIST, READ, WRITE]),
+        ("ec2", [LIST, READ]),
+        ("sqs", ALL_ACCESS_LEVELS),
+    ],
+)
+def test_generate_policy_for_service_matches_aws_iam_utils(
+    index, service_name, access_levels
+):
+    assert index.generate_policy_for_service(
+        service_name, access_levels
+    ) == generate_policy_for_service(service_name, access_levels)
+
+
+def outcome(generator, *args):
+    try:
+        return generator(*args)
+    except (AssertionError, ValueError) as ex:
+        return type(ex), str(ex)
+
+
+@pytest.mark.parametrize(
+    "access_levels", [[x] for x in ALL_ACCESS_LEVELS] + [ALL_ACCESS_LEVELS]
+)
+def test_generate_policy_for_every_service_matches_aws_iam_utils(index, access_levels):
+    # policyuniverse's expand_policy() makes aws-iam-utils' checks slow; the
+    # expander's is identical, and keeps this test quick
+    with patch("aws_iam_utils.checks.expand_policy", new=expand_policy):
+        for service_name in index.services:
+            assert outcome(
+                index.generate_policy_for_service, service_name, access_levels
+            ) == outcome(
+                generate_policy_for_service, service_name, access_levels
+            ), service_name
+
+
+@pytest.mark.parametrize(
+    "service_name,arn_type,access_levels,include_service_wide_actions",
+    [
+        ("iam", "role", ALL_ACCESS_LEVELS, False),
+        ("ec2", "instance", [LIST, READ, WRITE], False),
+        ("ssm", "parameter", [LIST, READ], True),
+        ("s3", "*", [LIST], False),
+    ],
+)
+def test_generate_policy_for_service_arn_type_matches_aws_iam_utils(
+    index, service_name, arn_type, access_levels, include_service_wide_actions
+):
+    assert index.generate_policy_for_service_arn_type(
+        service_name,
+        arn_type,
+        access_levels,
+        include_service_wide_actions=include_service_wide_actions,
+    ) == generate_policy_for_service_arn_type(
+        service_name,
+        arn_type,
+        access_levels,
+        include_service_wide_actions=include_service_wide_actions,
+    )
+
+
+def test_load_action_index_rejects_other_versions(index):
+    assert load_action_index(index.path) is not None
+
+    with patch(DATABASE_VERSIONS_ADDR, return_value={"aws-iam-utils": "0"}):
+        assert load_action_index(index.path) is None
+
+
+def test_load_action_index_missing(tmp_path):
+    assert load_action_index(str(tmp_path / "missing")) is None
+
+
+def test_main_uses_built_index(tmp_path, monkeypatch):
+    monkeypatch.setenv("AWS_POLICY_GENERATOR_CACHE_DIR", str(tmp_path))
+
+    without_index = main("-r ec2:instance --no-cache".split(" "), return_policy=True)
+    assert action_index.ACTIVE_INDEX is None
+
+    result = json.loads(main(["index", "build"], return_policy=True))
+    assert result["actions"] > 0
+
+    with_index = main("-r ec2:instance --no-cache".split(" "), return_policy=True)
+    assert action_index.ACTIVE_INDEX.path == result["path"]
+    assert with_index == without_index
+
+    main("-r ec2:instance --no-index".split(" "), return_policy=True)
+    assert action_index.ACTIVE_INDEX is None
@@ -19,13 +19,13 @@ from .testutil import FULL_ACCESS
 from .testutil import namespace
 
 GENERATE_POLICY_FOR_SERVICE_ADDR = (
-    "aws_policy_generator.args_generator.generate_policy_for_service"
+    "aws_policy_generator.yaml_generator.generate_policy_for_service"
 )
 GENERATE_POLICY_FOR_SERVICE_ARN_TYPE_ADDR = (
-    "aws_policy_generator.args_generator.generate_policy_for_service_arn_type"
+    "aws_policy_generator.yaml_generator.generate_policy_for_service_arn_type"
 )
 GENERATE_FULL_POLICY_FOR_SERVICE_ADDR = (
-    "aws_policy_generator.args_generator.generate_full_policy_for_service"
+    "aws_policy_generator.yaml_generator.generate_full_policy_for_service"
 )
 
 
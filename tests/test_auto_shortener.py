@@ -0,0 +1,174 @@
+import json
+
+import pytest
+
+from io import StringIO
+
+from unittest.mock import Mock
+from unittest.mock import patch
+
+from aws_policy_generator.auto_shortener import auto_shorten_policy
+from aws_policy_generator.auto_shortener import minimized_length_bound
+from aws_policy_generator.auto_shortener import serialized_length
+from aws_policy_generator.auto_shortener import shortening_strategies
+from aws_policy_generator.auto_shortener import write_shortened_policy
+from aws_policy_generator.safe_minimizer import minimize_policy_with_error_handling
+from aws_iam_utils.constants import LIST, READ
+from aws_iam_utils.generator import generate_policy_for_service
+from aws_iam_utils.util import create_policy
+from aws_iam_utils.util import statement
+
+MINIMIZE_ADDR = (
+    "aws_policy_generator.auto_shortener.minimize_policy_with_error_handling"
+)
+
+POLICY = create_policy(
+    statement(actions=[f"s3:GetObject{x}" for x in ["", "Acl", "Tagging", "Version"]])
+)
+MINIMIZED = create_policy(statement(actions=["s3:getobject*"]))
+
+
+def lengths():
+    return {
+        "raw": len(json.dumps(POLICY, indent=2)),
+        "compact": len(json.dumps(POLICY)),
+        "minimized": len(json.dumps(MINIMIZED, indent=2)),
+        "minimized_compact": len(json.dumps(MINIMIZED)),
+    }
+
+
+def test_shortening_strategies():
+    assert shortening_strategies() == [(False, False), (True, False), (True, True)]
+    assert shortening_strategies(compact=True) == [(False, True), (True, True)]
+    assert shortening_strategies(minimize=True) == [(True, False), (True, True)]
+
+
+def test_auto_shorten_policy_returns_policy_if_short_enough():
+    mp = Mock(return_value=MINIMIZED)
+
+    with patch(MINIMIZE_ADDR, new=mp):
+        result = auto_shorten_policy(POLICY, max_length=lengths()["raw"])
+
+    assert result == json.dumps(POLICY, indent=2)
+    mp.assert_not_called()
+
+
+def test_auto_shorten_policy_minimizes_indented_first():
+    mp = Mock(return_value=MINIMIZED)
+
+    with patch(MINIMIZE_ADDR, new=mp):
+        result = auto_shorten_policy(POLICY, max_length=lengths()["minimized"])
+
+    assert result == json.dumps(MINIMIZED, indent=2)
+
+
+def test_auto_shorten_policy_minimizes_at_most_once():
+    mp = Mock(return_value=MINIMIZED)
+
+    with patch(MINIMIZE_ADDR, new=mp):
+        result = auto_shorten_policy(POLICY, max_length=lengths()["minimized_compact"])
+
+    assert result == json.dumps(MINIMIZED)
+    mp.assert_called_once_with(POLICY, minimizer=None)
+
+
+def test_auto_shorten_policy_keeps_requested_options():
+    mp = Mock(return_value=MINIMIZED)
+
+    with patch(MINIMIZE_ADDR, new=mp):
+        result = auto_shorten_policy(POLICY, compact=True, max_length=10000)
+
+    assert result == json.dumps(POLICY)
+    mp.assert_not_called()
+
+
+def test_auto_shorten_policy_too_long():
+    mp = Mock(return_value=MINIMIZED)
+    max_length = lengths()["minimized_compact"] - 1
+
+    with patch(MINIMIZE_ADDR, new=mp):
+        with pytest.raises(ValueError, match=f"maximum {max_length} characters"):
+            auto_shorten_policy(POLICY, max_length=max_length)
+
+        # the module's strategy list must survive a failed attempt
+        result = auto_shorten_policy(POLICY, max_length=lengths()["raw"])
+
+    assert result == json.dumps(POLICY, indent=2)
+
+
+def test_write_shortened_policy():
+    mp = Mock(return_value=MINIMIZED)
+    output = StringIO()
+
+    with patch(MINIMIZE_ADDR, new=mp):
+        length = write_shortened_policy(
+            output, POLICY, max_length=lengths()["minimized"]
+        )
+
+        with pytest.raises(ValueError):
+            write_shortened_policy(output, POLICY, max_length=10)
+
+    assert output.getvalue() == json.dumps(MINIMIZED, indent=2)
+    assert length == lengths()["minimized"]
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        POLICY,
+        MINIMIZED,
+        {},
+        [],
+        {"a": [], "b": {}, "c": [[], [{}]]},
+        {"escaped": 'quote " backslash \\ newline \n tab \t bell \x07'},
+        {"unicode": ["caf\u00e9", "\u2603", "\U0001f600"], "del": "\x7f"},
+        {"scalars": [1, -2.5, True, False, None, 10**20]},
+        create_policy(
+            statement(
+                actions="s3:GetObject",
+                resource=["arn:aws:s3:::a/*", "arn:aws:s3:::b/*"],
+                condition={"Bool": {"aws:SecureTransport": "true"}},
+            )
+        ),
+    ],
+)
+def test_serialized_length(value):
+    assert serialized_length(value, compact=True) == len(json.dumps(value))
+    assert serialized_length(value) == len(json.dumps(value, indent=2))
+
+
+@pytest.mark.parametrize(
+    "policy",
+    [
+        POLICY,
+        generate_policy_for_service("s3", [LIST, READ]),
+        generate_policy_for_service("ec2", [LIST]),
+        create_policy(
+            statement(actions=["s3:GetObject", "unknown:Action", "*"]),
+            statement(actions="s3:ListBucket", resource="arn:aws:s3:::foo"),
+        ),
+        create_policy(statement(actions=[], resource="arn:aws:s3:::foo")),
+        create_policy(
+            statement(actions=[], resource="*"),
+            statement(actions="s3:ListBucket", resource="arn:aws:s3:::foo"),
+        ),
+    ],
+)
+def test_minimized_length_bound(policy):
+    minimized = minimize_policy_with_error_handling(policy)
+
+    for compact in [False, True]:
+        assert minimized_length_bound(policy, compact) <= serialized_length(
+            minimized, compact
+        )
+
+
+def test_auto_shorten_policy_fails_fast_without_minimizing():
+    mp = Mock(return_value=MINIMIZED)
+    max_length = minimized_length_bound(POLICY, compact=True) - 1
+
+    with patch(MINIMIZE_ADDR, new=mp):
+        with pytest.raises(ValueError, match=f"at least {max_length + 1} characters"):
+            auto_shorten_policy(POLICY, max_length=max_length)
+
+    mp.assert_not_called()
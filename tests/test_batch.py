@@ -0,0 +1,101 @@
+import json
+
+import pytest
+
+from aws_policy_generator.batch import find_specs
+from aws_policy_generator.batch import generate_batch
+from aws_policy_generator._internal.main import main
+from aws_iam_utils.checks import policies_are_equal
+from aws_iam_utils.util import create_policy
+from aws_iam_utils.util import statement
+
+VALID_SPEC = """
+policies:
+    - action: s3:ListBucket
+      resource: arn:aws:s3:::{name}
+"""
+
+INVALID_SPEC = """
+policies:
+    - access_level: read
+"""
+
+
+@pytest.fixture
+def batch_dir(tmp_path):
+    batch_dir = tmp_path / "in"
+    (batch_dir / "team").mkdir(parents=True)
+
+    (batch_dir / "a.yaml").write_text(VALID_SPEC.format(name="a"))
+    (batch_dir / "team" / "b.yml").write_text(VALID_SPEC.format(name="b"))
+    (batch_dir / "broken.yaml").write_text(INVALID_SPEC)
+    (batch_dir / "README.md").write_text("not a spec")
+
+    return str(batch_dir)
+
+
+def expected_policy(name):
+    return create_policy(
+        statement(actions="s3:listbucket", resource=f"arn:aws:s3:::{name}")
+    )
+
+
+def test_find_specs(batch_dir):
+    assert find_specs(batch_dir) == ["a.yaml", "broken.yaml", "team/b.yml"]
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_generate_batch(batch_dir, tmp_path, jobs):
+    out_dir = tmp_path / "out"
+
+    results = generate_batch(batch_dir, str(out_dir), jobs=jobs)
+
+    assert [x["spec"] for x in results] == ["a.yaml", "broken.yaml", "team/b.yml"]
+    assert "must have" in results[1]["error"]
+    assert not (out_dir / "broken.json").exists()
+
+    for name, path in [("a", out_dir / "a.json"), ("b", out_dir / "team" / "b.json")]:
+        assert policies_are_equal(json.loads(path.read_text()), expected_policy(name))
+
+
+def test_main_batch_mode(batch_dir, tmp_path):
+    out_dir = tmp_path / "out"
+
+    summary = json.loads(
+        main(
+            ["--batch-dir", batch_dir, "--out-dir", str(out_dir), "--compact"],
+            return_policy=True,
+        )
+    )
+
+    assert summary["generated"] == 2
+    assert [x["spec"] for x in summary["failed"]] == ["broken.yaml"]
+    assert (out_dir / "team" / "b.json").exists()
+
+
+def test_main_batch_mode_exits_non_zero_on_failure(batch_dir, tmp_path, capsys):
+    with pytest.raises(SystemExit) as ex:
+        main(["--batch-dir", batch_dir, "--out-dir", str(tmp_path / "out")])
+
+    assert ex.value.code == 1
+    assert "error: broken.yaml: ValueError" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize(
+    "flag", [["-f", "x.yaml"], ["-r", "s3"], ["-A", "s3:GetObject"]]
+)
+def test_main_batch_mode_rejects_items(batch_dir, tmp_path, capsys, flag):
+    with pytest.raises(SystemExit) as ex:
+        main(["--batch-dir", batch_dir, "--out-dir", str(tmp_path / "out")] + flag)
+
+    assert ex.value.code == 2
+    assert "cannot be used with --batch-dir" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("jobs", ["0", "-1", "x"])
+def test_main_rejects_invalid_jobs(batch_dir, tmp_path, capsys, jobs):
+    with pytest.raises(SystemExit) as ex:
+        main(["--batch-dir", batch_dir, "--out-dir", str(tmp_path), "--jobs", jobs])
+
+    assert ex.value.code == 2
+    assert "--jobs" in capsys.readouterr().err
@@ -0,0 +1,103 @@
+from unittest.mock import Mock
+from unittest.mock import patch
+from io import StringIO
+
+import pytest
+
+from aws_policy_generator import args_generator
+from aws_policy_generator import yaml_generator
+from aws_policy_generator.cache import LRUCache
+from aws_policy_generator.cache import cached_policy
+from aws_policy_generator.cache import freeze
+from aws_policy_generator.cache import thaw
+from aws_iam_utils.constants import READ, LIST
+
+from .testutil import dummy_policy
+from .testutil import namespace
+
+GENERATE_POLICY_FOR_SERVICE_ADDR = (
+    "aws_policy_generator.yaml_generator.generate_policy_for_service"
+)
+
+
+def test_lru_cache_counts_hits_and_misses():
+    cache = LRUCache()
+    compute = Mock(side_effect=lambda: {"a": [1, 2]})
+
+    assert cache.get("k", compute) == cache.get("k", compute)
+
+    compute.assert_called_once()
+    assert cache.stats() == {"hits": 1, "misses": 1, "size": 1, "maxsize": 512}
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+
+    cache.get("a", lambda: 1)
+    cache.get("b", lambda: 2)
+    cache.get("a", lambda: 1)  # 'b' is now the least recently used
+    cache.get("c", lambda: 3)
+
+    compute = Mock(return_value=2)
+    cache.get("b", compute)
+    compute.assert_called_once()
+
+    compute = Mock(return_value=1)
+    cache.get("c", compute)
+    compute.assert_not_called()
+
+
+def test_cached_values_are_immutable():
+    cache = LRUCache()
+    value = cache.get("k", lambda: dummy_policy("iam", [LIST]))
+
+    with pytest.raises(TypeError):
+        value["Version"] = "foo"
+
+    with pytest.raises(AttributeError):
+        value["Statement"].append({})
+
+    assert thaw(value) == dummy_policy("iam", [LIST])
+
+
+def test_cached_policy_returns_independent_copies():
+    key = ("test_cached_policy_returns_independent_copies",)
+
+    first = cached_policy(key, lambda: dummy_policy("iam", [LIST]))
+    first["Statement"][0]["Action"].append("iam:extra")
+
+    assert cached_policy(key, lambda: None) == dummy_policy("iam", [LIST])
+
+
+def test_freeze_thaw_round_trip():
+    policy = dummy_policy("s3", [LIST, READ])
+    assert thaw(freeze(policy)) == policy
+
+
+def test_args_generator_generates_repeated_services_once():
+    generate_policy_for_service = Mock(side_effect=dummy_policy)
+
+    with patch(GENERATE_POLICY_FOR_SERVICE_ADDR, new=generate_policy_for_service):
+        args_generator.generate_from_args(namespace(read=["iam", "iam"]))
+        args_generator.generate_from_args(namespace(read=["iam"]))
+
+    generate_policy_for_service.assert_called_once_with("iam", [LIST, READ])
+
+
+def test_yaml_generator_generates_repeated_services_once():
+    input = """
+    policies:
+        - service: lambda
+          access_level: read
+        - access_level: read
+          service:
+            - lambda
+            - iam
+    """
+    generate_policy_for_service = Mock(side_effect=dummy_policy)
+
+    with patch(GENERATE_POLICY_FOR_SERVICE_ADDR, new=generate_policy_for_service):
+        with StringIO(input) as y:
+            yaml_generator.generate_from_yaml(y)
+
+    assert generate_policy_for_service.call_count == 2
@@ -0,0 +1,130 @@
+import json
+import os
+import threading
+
+from unittest.mock import Mock
+from unittest.mock import patch
+
+from aws_policy_generator import cache
+from aws_policy_generator.cache import LRUCache
+from aws_policy_generator.cache import cached_policy
+from aws_policy_generator.cache import service_policy_key
+from aws_policy_generator.disk_cache import DiskCache
+from aws_policy_generator._internal.main import main
+from aws_iam_utils.constants import LIST
+
+from .testutil import dummy_policy
+
+DATABASE_VERSIONS_ADDR = "aws_policy_generator.disk_cache.database_versions"
+
+
+def test_put_get(tmp_path):
+    disk_cache = DiskCache(str(tmp_path))
+    disk_cache.put(["iam", "*"], dummy_policy("iam"))
+
+    assert disk_cache.get(["iam", "*"]) == dummy_policy("iam")
+    assert disk_cache.get(["s3", "*"]) is None
+
+
+def test_upgrade_invalidates_entries(tmp_path):
+    disk_cache = DiskCache(str(tmp_path))
+
+    with patch(DATABASE_VERSIONS_ADDR, new=Mock(return_value={"aws-iam-utils": "1"})):
+        disk_cache.put(["iam", "*"], dummy_policy("iam"))
+        assert disk_cache.get(["iam", "*"]) == dummy_policy("iam")
+
+    with patch(DATABASE_VERSIONS_ADDR, new=Mock(return_value={"aws-iam-utils": "2"})):
+        assert disk_cache.get(["iam", "*"]) is None
+
+
+def test_evicts_least_recently_used_entries(tmp_path):
+    entry_size = len(json.dumps(dummy_policy("svc0")))
+    disk_cache = DiskCache(str(tmp_path), max_size=entry_size * 2)
+
+    for i in range(3):
+        disk_cache.put([f"svc{i}"], dummy_policy(f"svc{i}"))
+        # ensure distinct mtimes, regardless of filesystem timestamp resolution
+        os.utime(disk_cache._DiskCache__entry_path([f"svc{i}"]), (i, i))
+
+    disk_cache.put(["svc3"], dummy_policy("svc3"))
+
+    assert disk_cache.get(["svc0"]) is None
+    assert disk_cache.get(["svc1"]) is None
+    assert disk_cache.get(["svc2"]) == dummy_policy("svc2")
+    assert disk_cache.get(["svc3"]) == dummy_policy("svc3")
+    assert disk_cache.stats()["size"] <= entry_size * 2
+
+
+def test_overwrite_counts_entry_once(tmp_path):
+    disk_cache = DiskCache(str(tmp_path))
+    disk_cache.put(["iam"], dummy_policy("iam"))
+    disk_cache.put(["iam"], dummy_policy("iam"))
+    disk_cache.put(["iam"], dummy_policy("iam"))
+
+    assert disk_cache._DiskCache__size == disk_cache.stats()["size"]
+
+
+def test_concurrent_puts_of_one_key(tmp_path):
+    disk_cache = DiskCache(str(tmp_path))
+    threads = [
+        threading.Thread(target=disk_cache.put, args=(["iam"], dummy_policy("iam")))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert disk_cache.get(["iam"]) == dummy_policy("iam")
+    assert [x.name for x in tmp_path.rglob("*.tmp")] == []
+
+
+def test_clear(tmp_path):
+    disk_cache = DiskCache(str(tmp_path))
+    disk_cache.put(["iam"], dummy_policy("iam"))
+    disk_cache.put(["s3"], dummy_policy("s3"))
+
+    assert disk_cache.stats()["entries"] == 2
+    assert disk_cache.clear() == 2
+    assert disk_cache.stats()["entries"] == 0
+
+
+def test_cached_policy_persists_aws_iam_utils_results(tmp_path):
+    generator = Mock(side_effect=dummy_policy)
+    generator.__module__ = "aws_iam_utils.generator"
+    generator.__qualname__ = "generate_policy_for_service"
+    key = service_policy_key(generator, "iam", access_levels=[LIST])
+
+    with patch.object(cache, "DISK_CACHE", new=DiskCache(str(tmp_path))):
+        with patch.object(cache, "SERVICE_POLICY_CACHE", new=LRUCache()):
+            cached_policy(key, lambda: generator("iam", [LIST]))
+
+        # a new process starts with an empty in-memory cache
+        with patch.object(cache, "SERVICE_POLICY_CACHE", new=LRUCache()):
+            result = cached_policy(key, lambda: generator("iam", [LIST]))
+
+    generator.assert_called_once_with("iam", [LIST])
+    assert result == dummy_policy("iam", [LIST])
+
+
+def test_cached_policy_does_not_persist_other_generators(tmp_path):
+    disk_cache = DiskCache(str(tmp_path))
+    generator = Mock(side_effect=dummy_policy)
+    key = service_policy_key(generator, "iam", access_levels=[LIST])
+
+    with patch.object(cache, "DISK_CACHE", new=disk_cache):
+        cached_policy(key, lambda: generator("iam", [LIST]))
+
+    assert disk_cache.stats()["entries"] == 0
+
+
+def test_main_cache_stats_and_clear(tmp_path, monkeypatch):
+    monkeypatch.setenv("AWS_POLICY_GENERATOR_CACHE_DIR", str(tmp_path))
+    DiskCache().put(["iam"], dummy_policy("iam"))
+
+    stats = json.loads(main(["cache", "stats"], return_policy=True))
+    assert stats["path"] == str(tmp_path)
+    assert stats["entries"] == 1
+
+    assert json.loads(main(["cache", "clear"], return_policy=True)) == {"removed": 1}
+    assert json.loads(main(["cache", "stats"], return_policy=True))["entries"] == 0
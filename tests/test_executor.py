@@ -0,0 +1,22 @@
+import pytest
+
+from aws_policy_generator.executor import EXECUTORS
+from aws_policy_generator.executor import parallel_map
+
+
+@pytest.mark.parametrize("kind", EXECUTORS)
+@pytest.mark.parametrize("jobs", [None, 1, 3])
+def test_parallel_map_keeps_order(kind, jobs):
+    items = list(range(-20, 20))
+
+    assert parallel_map(abs, items, jobs, kind) == [abs(x) for x in items]
+
+
+def test_parallel_map_raises_errors():
+    with pytest.raises(TypeError):
+        parallel_map(abs, [1, "a", 2], 2, "thread")
+
+
+def test_parallel_map_invalid_executor():
+    with pytest.raises(ValueError, match="invalid executor"):
+        parallel_map(abs, [1, 2], 2, "fibers")
@@ -0,0 +1,49 @@
+import pytest
+
+from aws_policy_generator.expander import expand_action
+from aws_policy_generator.expander import expand_policy
+
+from aws_iam_utils.util import create_policy, statement
+from policyuniverse.expander_minimizer import expand_policy as policyuniverse_expand
+
+POLICIES = [
+    create_policy(statement(actions=["ec2:*", "iam:*", "s3:*"], resource="*")),
+    create_policy(
+        statement(
+            actions=["s3:Get*", "S3:PutObject", "ec2:Describe?nstances", "ec2:*Tags"],
+            resource="*",
+        ),
+        statement(effect="Deny", actions=["s3:Delete*"], resource="*"),
+    ),
+    create_policy(
+        statement(actions=["newservice:*", "s3:NoSuch*", "*:DescribeRegions*"]),
+    ),
+    {
+        "Version": "2012-10-17",
+        "Statement": {"Effect": "Allow", "NotAction": ["s3:*", "iam:*"]},
+    },
+]
+
+
+@pytest.mark.parametrize("policy", POLICIES)
+def test_expand_policy_matches_policyuniverse(policy):
+    assert expand_policy(policy) == policyuniverse_expand(policy)
+    assert expand_policy(policy, expand_deny=True) == policyuniverse_expand(
+        policy, expand_deny=True
+    )
+
+
+def test_expand_policy_does_not_mutate():
+    policy = create_policy(statement(actions=["s3:Get*"], resource="*"))
+    expanded = expand_policy(policy)
+
+    expanded["Statement"][0]["Resource"] = "foo"
+    assert policy == create_policy(statement(actions=["s3:Get*"], resource="*"))
+
+
+def test_expand_action():
+    assert expand_action("S3:GetObject") == ("s3:getobject",)
+    assert "s3:getobjectacl" in expand_action("s3:GetObject*")
+    assert all(x.startswith("s3:get") for x in expand_action("s3:Get*"))
+    assert expand_action("newservice:Get*") == ("newservice:get*",)
+    assert expand_action("s3:Get*") is expand_action("s3:Get*")
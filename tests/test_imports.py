@@ -0,0 +1,125 @@
+import json
+import subprocess
+import sys
+
+from unittest.mock import Mock
+from unittest.mock import patch
+
+from aws_policy_generator.imports import lazy_function
+from aws_policy_generator.imports import profile_imports
+from aws_policy_generator._internal.main import main
+
+from .testutil import dummy_policy
+
+# seconds; importing the CLI used to take ~0.3s, almost all of it loading the
+# IAM database and policyuniverse
+IMPORT_TIME_BUDGET = 0.15
+
+DATABASE_MODULES = ["aws_iam_utils", "policy_sentry", "policyuniverse"]
+HEAVY_MODULES = DATABASE_MODULES + ["yaml"]
+
+GENERATE_POLICY_FOR_SERVICE_ADDR = (
+    "aws_policy_generator.yaml_generator.generate_policy_for_service"
+)
+
+
+def run_python(code):
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def test_import_time_within_budget():
+    code = f"""
+import json, sys, time
+start = time.perf_counter()
+import aws_policy_generator._internal.main
+elapsed = time.perf_counter() - start
+print(json.dumps([elapsed, [x for x in {HEAVY_MODULES!r} if x in sys.modules]]))
+"""
+    # best of a few runs, to allow for a busy machine
+    runs = [run_python(code) for _ in range(3)]
+
+    assert all(heavy == [] for elapsed, heavy in runs)
+    assert min(elapsed for elapsed, heavy in runs) < IMPORT_TIME_BUDGET
+
+
+def test_help_does_not_load_heavy_modules():
+    code = f"""
+import json, sys
+from aws_policy_generator._internal.main import main
+try:
+    main(["--help"])
+except SystemExit:
+    pass
+print(json.dumps([x for x in {HEAVY_MODULES!r} if x in sys.modules]))
+"""
+    assert run_python(code) == []
+
+
+def test_database_free_requests_do_not_load_database(tmp_path):
+    spec = tmp_path / "spec.yaml"
+    spec.write_text("policies:\n  - service: sqs\n    access_level: all\n")
+
+    code = f"""
+import json, sys
+from aws_policy_generator._internal.main import main
+main(["-a", "s3", "-A", "ec2:DescribeRegions", "-f", {str(spec)!r}])
+print(json.dumps([x for x in {DATABASE_MODULES!r} if x in sys.modules]))
+"""
+    assert run_python(code) == []
+
+
+def test_every_submodule_is_an_attribute():
+    code = """
+import json, os
+import aws_policy_generator
+names = sorted(
+    x[:-3]
+    for x in os.listdir(os.path.dirname(aws_policy_generator.__file__))
+    if x.endswith(".py") and not x.startswith("_")
+)
+print(json.dumps([names, [getattr(aws_policy_generator, x).__name__ for x in names]]))
+"""
+    names, modules = run_python(code)
+
+    assert modules == [f"aws_policy_generator.{x}" for x in names]
+    assert "stream" in names
+
+
+def test_lazy_function():
+    dumps = lazy_function("json", "dumps")
+
+    assert dumps.__name__ == "dumps"
+    assert dumps({"a": 1}, sort_keys=True) == json.dumps({"a": 1})
+
+    with patch("json.dumps", new=Mock(return_value="patched")):
+        assert dumps({}) == "patched"
+
+
+def test_profile_imports(tmp_path, monkeypatch):
+    (tmp_path / "apg_profile_outer.py").write_text("import apg_profile_inner\n")
+    (tmp_path / "apg_profile_inner.py").write_text("import time\ntime.sleep(0.01)\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    with profile_imports() as profile:
+        import apg_profile_outer  # noqa: F401
+
+    modules = {name: (cumulative, own) for name, cumulative, own in profile.modules}
+    assert modules["apg_profile_inner"][0] >= 0.01
+    assert modules["apg_profile_outer"][0] >= modules["apg_profile_inner"][0]
+    assert modules["apg_profile_outer"][1] < modules["apg_profile_inner"][0]
+
+    report = profile.report()
+    assert report.index("apg_profile_outer") < report.index("apg_profile_inner")
+
+    for name in modules:
+        sys.modules.pop(name, None)
+
+
+def test_main_import_profile(capsys):
+    with patch(GENERATE_POLICY_FOR_SERVICE_ADDR, new=Mock(side_effect=dummy_policy)):
+        main(["--list", "iam", "--import-profile"], return_policy=True)
+
+    assert capsys.readouterr().err.startswith("import profile: ")
@@ -0,0 +1,43 @@
+import json
+
+import pytest
+
+from io import StringIO
+
+from aws_policy_generator.json_writer import write_json
+
+from aws_iam_utils.util import create_policy
+from aws_iam_utils.util import statement
+
+POLICY = create_policy(
+    statement(actions=[f"s3:GetObject{x}" for x in ["", "Acl", "Tagging", "Version"]]),
+    statement(
+        actions=["ec2:DescribeRegions"],
+        resource="foo",
+        condition={"StringEquals": {"aws:RequestedRegion": "eu-west-1"}},
+    ),
+)
+
+
+@pytest.mark.parametrize("indent", [None, 2])
+@pytest.mark.parametrize("chunk_size", [1, 64, 65536])
+def test_write_json(indent, chunk_size):
+    output = StringIO()
+
+    length = write_json(output, POLICY, indent=indent, chunk_size=chunk_size)
+
+    assert output.getvalue() == json.dumps(POLICY, indent=indent)
+    assert length == len(output.getvalue())
+
+
+def test_write_json_in_chunks():
+    writes = []
+
+    class Output:
+        def write(self, s):
+            writes.append(s)
+
+    write_json(Output(), POLICY, indent=2, chunk_size=64)
+
+    assert len(writes) > 1
+    assert all(len(x) < 64 + 64 for x in writes)
@@ -1,100 +1,166 @@
 import json
 
+import pytest
+
 from unittest.mock import Mock
+from unittest.mock import call
 from unittest.mock import patch
 
 from aws_policy_generator._internal.main import main
+from aws_policy_generator.mappings import ACCESS_LEVELS_MAPPINGS
+from aws_policy_generator.policy_util import PolicyAccumulator
+from aws_iam_utils.constants import READ, WRITE, LIST
 from aws_iam_utils.checks import policies_are_equal
+from aws_iam_utils.combiner import collapse_policy_statements
+from aws_iam_utils.util import create_policy
+from aws_iam_utils.util import statement
 
 from .testutil import dummy_policy
-from .testutil import namespace
-
-GENERATE_FROM_ARGS_ADDR = "aws_policy_generator._internal.main.generate_from_args"
+from .testutil import dummy_policy_arn_type
+
+GENERATE_POLICY_FOR_SERVICE_ADDR = (
+    "aws_policy_generator.yaml_generator.generate_policy_for_service"
+)
+GENERATE_POLICY_FOR_SERVICE_ARN_TYPE_ADDR = (
+    "aws_policy_generator.yaml_generator.generate_policy_for_service_arn_type"
+)
+GENERATE_FULL_POLICY_FOR_SERVICE_ADDR = (
+    "aws_policy_generator.yaml_generator.generate_full_policy_for_service"
+)
 EXPAND_POLICY_ADDR = "aws_policy_generator._internal.main.expand_policy"
 
 
 def test_args_generate_single_list():
-    expected_policy = dummy_policy()
-    generate_from_args = Mock(side_effect=[expected_policy])
+    generate_policy_for_service = Mock(side_effect=dummy_policy)
 
-    with patch(GENERATE_FROM_ARGS_ADDR, new=generate_from_args):
+    with patch(GENERATE_POLICY_FOR_SERVICE_ADDR, new=generate_policy_for_service):
         result = main(["--list", "iam"], return_policy=True)
 
-    generate_from_args.assert_called_with(namespace(list=["iam"]))
+    generate_policy_for_service.assert_called_once_with("iam", [LIST])
 
-    assert policies_are_equal(json.loads(result), expected_policy)
+    assert policies_are_equal(json.loads(result), dummy_policy("iam", [LIST]))
 
 
 def test_args_generate_single_list_no_wildcards():
-    expected_policy = dummy_policy()
-    generate_from_args = Mock(side_effect=[expected_policy])
+    generate_policy_for_service = Mock(side_effect=dummy_policy)
     expand_policy = Mock(side_effect=lambda x: x)
 
-    with patch(GENERATE_FROM_ARGS_ADDR, new=generate_from_args):
+    with patch(GENERATE_POLICY_FOR_SERVICE_ADDR, new=generate_policy_for_service):
         with patch(EXPAND_POLICY_ADDR, new=expand_policy):
             result = main(["--list", "iam", "--no-wildcards"], return_policy=True)
 
-    generate_from_args.assert_called_with(namespace(list=["iam"], no_wildcards=True))
-    expand_policy.assert_called_with(expected_policy)
+    generate_policy_for_service.assert_called_once_with("iam", [LIST])
+    expand_policy.assert_called_once()
 
-    assert policies_are_equal(json.loads(result), expected_policy)
+    assert policies_are_equal(json.loads(result), dummy_policy("iam", [LIST]))
 
 
 def test_generate_single_read():
-    expected_policy = dummy_policy()
-    generate_from_args = Mock(side_effect=[expected_policy])
+    generate_policy_for_service = Mock(side_effect=dummy_policy)
 
-    with patch(GENERATE_FROM_ARGS_ADDR, new=generate_from_args):
+    with patch(GENERATE_POLICY_FOR_SERVICE_ADDR, new=generate_policy_for_service):
         result = main(["--read", "iam"], return_policy=True)
 
-    generate_from_args.assert_called_with(namespace(read=["iam"]))
+    generate_policy_for_service.assert_called_once_with("iam", [LIST, READ])
 
-    assert policies_are_equal(json.loads(result), expected_policy)
+    assert policies_are_equal(json.loads(result), dummy_policy("iam", [LIST, READ]))
 
 
 def test_generate_single_write():
-    expected_policy = dummy_policy()
-    generate_from_args = Mock(side_effect=[expected_policy])
+    generate_policy_for_service = Mock(side_effect=dummy_policy)
 
-    with patch(GENERATE_FROM_ARGS_ADDR, new=generate_from_args):
+    with patch(GENERATE_POLICY_FOR_SERVICE_ADDR, new=generate_policy_for_service):
         result = main(["--write", "iam"], return_policy=True)
 
-    generate_from_args.assert_called_with(namespace(write=["iam"]))
+    generate_policy_for_service.assert_called_once_with("iam", [LIST, READ, WRITE])
 
-    assert policies_are_equal(json.loads(result), expected_policy)
+    assert policies_are_equal(
+        json.loads(result), dummy_policy("iam", [LIST, READ, WRITE])
+    )
 
 
 def test_generate_single_full_access():
-    expected_policy = dummy_policy()
-    generate_from_args = Mock(side_effect=[expected_policy])
+    generate_full_policy_for_service = Mock(side_effect=dummy_policy)
 
-    with patch(GENERATE_FROM_ARGS_ADDR, new=generate_from_args):
+    with patch(
+        GENERATE_FULL_POLICY_FOR_SERVICE_ADDR, new=generate_full_policy_for_service
+    ):
         result = main(["--full-access", "iam"], return_policy=True)
 
-    generate_from_args.assert_called_with(namespace(full_access=["iam"]))
+    generate_full_policy_for_service.assert_called_once_with("iam")
 
-    assert policies_are_equal(json.loads(result), expected_policy)
+    assert policies_are_equal(json.loads(result), dummy_policy("iam"))
 
 
 def test_generate_single_full_access_arn_type():
-    expected_policy = dummy_policy()
-    generate_from_args = Mock(side_effect=[expected_policy])
+    generate_policy_for_service_arn_type = Mock(side_effect=dummy_policy_arn_type)
 
-    with patch(GENERATE_FROM_ARGS_ADDR, new=generate_from_args):
+    with patch(
+        GENERATE_POLICY_FOR_SERVICE_ARN_TYPE_ADDR,
+        new=generate_policy_for_service_arn_type,
+    ):
         result = main(["--full-access", "iam:instance-profile"], return_policy=True)
 
-    generate_from_args.assert_called_with(
-        namespace(full_access=["iam:instance-profile"])
+    generate_policy_for_service_arn_type.assert_called_once_with(
+        "iam",
+        "instance-profile",
+        ACCESS_LEVELS_MAPPINGS["all"],
+        include_service_wide_actions=False,
     )
 
-    assert policies_are_equal(json.loads(result), expected_policy)
+    assert policies_are_equal(
+        json.loads(result),
+        dummy_policy_arn_type("iam", "instance-profile", ACCESS_LEVELS_MAPPINGS["all"]),
+    )
 
 
 def test_generate_multi():
-    expected_policy = dummy_policy()
-    generate_from_args = Mock(side_effect=[expected_policy])
+    generate_policy_for_service = Mock(side_effect=dummy_policy)
+    generate_full_policy_for_service = Mock(side_effect=dummy_policy)
+
+    with patch(GENERATE_POLICY_FOR_SERVICE_ADDR, new=generate_policy_for_service):
+        with patch(
+            GENERATE_FULL_POLICY_FOR_SERVICE_ADDR, new=generate_full_policy_for_service
+        ):
+            result = main(
+                [
+                    "--list",
+                    "iam",
+                    "--full-access",
+                    "s3",
+                    "--full-access",
+                    "ec2",
+                    "--read",
+                    "lambda",
+                    "--read",
+                    "cloudwatch",
+                ],
+                return_policy=True,
+            )
+
+    generate_policy_for_service.assert_has_calls(
+        [
+            call("iam", [LIST]),
+            call("lambda", [LIST, READ]),
+            call("cloudwatch", [LIST, READ]),
+        ]
+    )
+    generate_full_policy_for_service.assert_has_calls([call("s3"), call("ec2")])
+
+    expected_policy = collapse_policy_statements(
+        dummy_policy("iam", [LIST]),
+        dummy_policy("lambda", [LIST, READ]),
+        dummy_policy("cloudwatch", [LIST, READ]),
+        dummy_policy("s3"),
+        dummy_policy("ec2"),
+    )
+    assert policies_are_equal(json.loads(result), expected_policy)
+
+
+def test_generate_multi_with_actions():
+    generate_policy_for_service = Mock(side_effect=dummy_policy)
 
-    with patch(GENERATE_FROM_ARGS_ADDR, new=generate_from_args):
+    with patch(GENERATE_POLICY_FOR_SERVICE_ADDR, new=generate_policy_for_service):
         result = main(
             [
                 "--list",
@@ -103,55 +169,185 @@ def test_generate_multi():
                 "s3",
                 "--full-access",
                 "ec2",
-                "--read",
-                "lambda",
-                "--read",
-                "cloudwatch",
+                "--action",
+                "ec2:DescribeInstances",
+                "--action",
+                "s3:ListAllMyBuckets",
             ],
             return_policy=True,
         )
 
-    generate_from_args.assert_called_with(
-        namespace(
-            list=["iam"], full_access=["s3", "ec2"], read=["lambda", "cloudwatch"]
-        )
-    )
+    generate_policy_for_service.assert_called_once_with("iam", [LIST])
 
+    # both actions are granted by --full-access, so are skipped
+    expected_policy = collapse_policy_statements(
+        dummy_policy("iam", [LIST]),
+        create_policy(statement(actions=["s3:*", "ec2:*"], resource="*")),
+    )
     assert policies_are_equal(json.loads(result), expected_policy)
 
 
-def test_generate_multi_with_actions():
-    expected_policy = dummy_policy()
-    generate_from_args = Mock(side_effect=[expected_policy])
+def test_generate_skips_subsumed_items(tmp_path):
+    spec = tmp_path / "spec.yaml"
+    spec.write_text("""
+        policies:
+            - service: iam
+              access_level: read
+            - action: sqs:SendMessage
+        """)
+    generate_policy_for_service = Mock(side_effect=dummy_policy)
 
-    with patch(GENERATE_FROM_ARGS_ADDR, new=generate_from_args):
+    with patch(GENERATE_POLICY_FOR_SERVICE_ADDR, new=generate_policy_for_service):
         result = main(
             [
+                "-f",
+                str(spec),
                 "--list",
                 "iam",
-                "--full-access",
+                "--list",
                 "s3",
-                "--full-access",
-                "ec2",
                 "--read",
-                "lambda",
-                "--read",
-                "cloudwatch",
+                "s3",
                 "--action",
-                "ec2:DescribeInstances",
+                "sqs:SendMessage",
                 "--action",
-                "s3:ListAllMyBuckets",
+                "ec2:DescribeRegions",
             ],
             return_policy=True,
         )
 
-    generate_from_args.assert_called_with(
-        namespace(
-            list=["iam"],
-            full_access=["s3", "ec2"],
-            read=["lambda", "cloudwatch"],
-            action=["ec2:DescribeInstances", "s3:ListAllMyBuckets"],
-        )
+    assert generate_policy_for_service.call_args_list == [
+        call("iam", [LIST, READ]),
+        call("s3", [LIST, READ]),
+    ]
+
+    expected_policy = collapse_policy_statements(
+        dummy_policy("iam", [LIST, READ]),
+        dummy_policy("s3", [LIST, READ]),
+        create_policy(
+            statement(actions=["sqs:SendMessage", "ec2:DescribeRegions"], resource="*")
+        ),
     )
-
     assert policies_are_equal(json.loads(result), expected_policy)
+
+
+def test_generate_merges_items_once():
+    generate_policy_for_service = Mock(side_effect=dummy_policy)
+    add = Mock(side_effect=PolicyAccumulator.add)
+
+    with patch(GENERATE_POLICY_FOR_SERVICE_ADDR, new=generate_policy_for_service):
+        with patch.object(PolicyAccumulator, "add", new=lambda *x: add(*x)):
+            main(["--list", "iam", "--read", "s3", "-A", "s3:GetObject"], True)
+
+    # each item's policy is added once, to the one accumulator
+    assert add.call_count == 3
+    assert len(set(x.args[0] for x in add.call_args_list)) == 1
+
+
+def test_print_plan(capsys):
+    generate_policy_for_service = Mock(side_effect=dummy_policy)
+
+    with patch(GENERATE_POLICY_FOR_SERVICE_ADDR, new=generate_policy_for_service):
+        main(["--read", "iam", "--write", "iam", "--print-plan"], return_policy=True)
+
+    assert capsys.readouterr().err.splitlines() == [
+        "plan: generating 1 of 2 items, 1 generator calls avoided",
+        "  skip      read access to iam (granted by write access to iam)",
+        "  generate  write access to iam",
+    ]
+
+
+def test_profile(capsys):
+    generate_policy_for_service = Mock(side_effect=dummy_policy)
+    expand_policy = Mock(side_effect=lambda x: x)
+
+    with patch(GENERATE_POLICY_FOR_SERVICE_ADDR, new=generate_policy_for_service):
+        with patch(EXPAND_POLICY_ADDR, new=expand_policy):
+            main(["--read", "iam", "--no-wildcards", "--profile"], return_policy=True)
+
+    stages = [x.split()[0] for x in capsys.readouterr().err.splitlines()[1:7]]
+    assert stages == ["parse", "plan", "generate", "collapse", "expand", "serialize"]
+
+
+def test_profile_json(tmp_path):
+    generate_policy_for_service = Mock(side_effect=dummy_policy)
+
+    with patch(GENERATE_POLICY_FOR_SERVICE_ADDR, new=generate_policy_for_service):
+        main(
+            [
+                "--read",
+                "iam",
+                "--profile",
+                str(tmp_path / "profile.json"),
+                "--profile-pstats",
+                str(tmp_path / "profile.pstats"),
+            ],
+            return_policy=True,
+        )
+
+    generate_policy_for_service.assert_called_once_with("iam", [LIST, READ])
+
+    with open(tmp_path / "profile.json") as f:
+        profile = json.load(f)
+
+    assert list(profile["stages"]) == [
+        "parse",
+        "plan",
+        "generate",
+        "collapse",
+        "serialize",
+    ]
+    assert profile["counters"]["items"] == 1
+    assert (tmp_path / "profile.pstats").exists()
+
+
+def test_trace(tmp_path):
+    generate_policy_for_service = Mock(side_effect=dummy_policy)
+
+    with patch(GENERATE_POLICY_FOR_SERVICE_ADDR, new=generate_policy_for_service):
+        main(
+            ["--read", "iam", "--trace", str(tmp_path / "trace.json")],
+            return_policy=True,
+        )
+
+    with open(tmp_path / "trace.json") as f:
+        events = json.load(f)["traceEvents"]
+
+    stages = [x["name"] for x in events if x["ph"] == "X"]
+    # items' policies are added to the accumulator, then merged into one
+    assert stages == ["parse", "plan", "generate", "collapse", "collapse", "serialize"]
+
+
+def test_output(tmp_path, capsys):
+    expected_policy = dummy_policy("iam", [LIST])
+    generate_policy_for_service = Mock(side_effect=dummy_policy)
+
+    with patch(GENERATE_POLICY_FOR_SERVICE_ADDR, new=generate_policy_for_service):
+        main(["--list", "iam", "--output", str(tmp_path / "policy.json")])
+        main(["--list", "iam"])
+
+    with open(tmp_path / "policy.json") as f:
+        assert f.read() == json.dumps(expected_policy, indent=2) + "\n"
+
+    assert capsys.readouterr().out == json.dumps(expected_policy, indent=2) + "\n"
+    assert list(tmp_path.iterdir()) == [tmp_path / "policy.json"]
+
+
+def test_output_too_long(tmp_path):
+    generate_policy_for_service = Mock(side_effect=dummy_policy)
+
+    with patch(GENERATE_POLICY_FOR_SERVICE_ADDR, new=generate_policy_for_service):
+        with pytest.raises(ValueError):
+            main(
+                [
+                    "--list",
+                    "iam",
+                    "--auto-shorten",
+                    "--max-length",
+                    "10",
+                    "--output",
+                    str(tmp_path / "policy.json"),
+                ]
+            )
+
+    assert list(tmp_path.iterdir()) == []
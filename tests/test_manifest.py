@@ -0,0 +1,122 @@
+import json
+
+import pytest
+
+from unittest.mock import patch
+
+from aws_policy_generator.batch import generate_batch
+from aws_policy_generator.manifest import MANIFEST_FILENAME
+from aws_policy_generator._internal.main import main
+
+SPEC = """
+policies:
+    - action: s3:ListBucket
+      resource: arn:aws:s3:::{name}
+"""
+
+ACCESS_LEVELS_MAPPINGS_ADDR = "aws_policy_generator.manifest.ACCESS_LEVELS_MAPPINGS"
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    batch_dir = tmp_path / "in"
+    batch_dir.mkdir()
+    for name in ["a", "b", "c"]:
+        (batch_dir / f"{name}.yaml").write_text(SPEC.format(name=name))
+
+    return batch_dir, tmp_path / "out"
+
+
+def regenerated(batch_dir, out_dir, **options):
+    results = generate_batch(
+        str(batch_dir), str(out_dir), jobs=1, incremental=True, **options
+    )
+    return [x["spec"] for x in results if not x.get("skipped")]
+
+
+def test_unchanged_specs_are_skipped(dirs):
+    batch_dir, out_dir = dirs
+
+    assert regenerated(batch_dir, out_dir) == ["a.yaml", "b.yaml", "c.yaml"]
+    assert regenerated(batch_dir, out_dir) == []
+
+    manifest = json.loads((out_dir / MANIFEST_FILENAME).read_text())
+    assert sorted(manifest["entries"]) == ["a.yaml", "b.yaml", "c.yaml"]
+
+
+def test_changed_spec_is_regenerated(dirs):
+    batch_dir, out_dir = dirs
+    regenerated(batch_dir, out_dir)
+
+    (batch_dir / "b.yaml").write_text(SPEC.format(name="changed"))
+
+    assert regenerated(batch_dir, out_dir) == ["b.yaml"]
+    assert "changed" in (out_dir / "b.json").read_text()
+
+
+def test_changed_options_block_is_regenerated(dirs):
+    batch_dir, out_dir = dirs
+    regenerated(batch_dir, out_dir)
+
+    spec = batch_dir / "a.yaml"
+    spec.write_text(
+        "options:\n  include_service_wide_actions: true\n" + spec.read_text()
+    )
+
+    assert regenerated(batch_dir, out_dir) == ["a.yaml"]
+
+
+def test_changed_cli_options_regenerate_everything(dirs):
+    batch_dir, out_dir = dirs
+    regenerated(batch_dir, out_dir)
+
+    assert regenerated(batch_dir, out_dir, compact=True) == [
+        "a.yaml",
+        "b.yaml",
+        "c.yaml",
+    ]
+
+
+def test_changed_access_levels_mappings_regenerate_everything(dirs):
+    batch_dir, out_dir = dirs
+    regenerated(batch_dir, out_dir)
+
+    with patch(ACCESS_LEVELS_MAPPINGS_ADDR, new={"list": ["List"]}):
+        assert len(regenerated(batch_dir, out_dir)) == 3
+
+
+def test_modified_or_deleted_output_is_regenerated(dirs):
+    batch_dir, out_dir = dirs
+    regenerated(batch_dir, out_dir)
+
+    (out_dir / "a.json").write_text("{}")
+    (out_dir / "c.json").unlink()
+
+    assert regenerated(batch_dir, out_dir) == ["a.yaml", "c.yaml"]
+
+
+def test_failed_specs_are_retried(dirs):
+    batch_dir, out_dir = dirs
+    (batch_dir / "broken.yaml").write_text("policies:\n  - access_level: read\n")
+
+    assert "broken.yaml" in regenerated(batch_dir, out_dir)
+    assert regenerated(batch_dir, out_dir) == ["broken.yaml"]
+
+
+def test_changed_minimizer_regenerates_everything(dirs):
+    batch_dir, out_dir = dirs
+    options = {"auto_shorten": True, "minimize": True}
+    regenerated(batch_dir, out_dir, minimizer="policyuniverse", **options)
+
+    assert len(regenerated(batch_dir, out_dir, minimizer="trie", **options)) == 3
+
+
+def test_main_batch_mode_passes_minimizer(dirs):
+    batch_dir, out_dir = dirs
+    args = ["--batch-dir", str(batch_dir), "--out-dir", str(out_dir)]
+    args += ["--incremental", "--auto-shorten", "-m", "1"]
+
+    main(args, return_policy=True)
+    summary = json.loads(main(args + ["--minimizer", "trie"], return_policy=True))
+
+    assert summary["generated"] == 3
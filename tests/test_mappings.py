@@ -0,0 +1,9 @@
+from aws_policy_generator import mappings
+from aws_iam_utils import constants
+
+
+def test_access_levels_match_aws_iam_utils():
+    for name in ["READ", "LIST", "WRITE", "TAGGING", "PERMISSIONS"]:
+        assert getattr(mappings, name) == getattr(constants, name)
+
+    assert mappings.ALL_ACCESS_LEVELS == constants.ALL_ACCESS_LEVELS
@@ -0,0 +1,150 @@
+import pytest
+
+from aws_policy_generator.mappings import ACCESS_LEVELS_MAPPINGS
+from aws_policy_generator.planner import Plan
+from aws_policy_generator.planner import action_task
+from aws_policy_generator.planner import describe_task
+from aws_policy_generator.planner import service_task
+from aws_policy_generator.planner import subsumes
+
+LIST = ACCESS_LEVELS_MAPPINGS["list"]
+READ = ACCESS_LEVELS_MAPPINGS["read"]
+WRITE = ACCESS_LEVELS_MAPPINGS["write"]
+TAGGING = ACCESS_LEVELS_MAPPINGS["tagging"]
+ALL = ACCESS_LEVELS_MAPPINGS["all"]
+
+
+@pytest.mark.parametrize(
+    "a, b, expected",
+    [
+        # access levels: write > read > list, but not tagging
+        (service_task("iam", "*", READ), service_task("iam", "*", LIST), True),
+        (service_task("iam", "*", LIST), service_task("iam", "*", READ), False),
+        (service_task("iam", "*", WRITE), service_task("iam", "*", TAGGING), False),
+        (service_task("iam", "*", READ), service_task("s3", "*", LIST), False),
+        # full access grants everything for the service
+        (
+            service_task("s3", "*", ALL, full_access=True),
+            service_task("s3", "bucket", ALL, True),
+            True,
+        ),
+        (
+            service_task("s3", "*", ALL, full_access=True),
+            action_task("S3:ListBucket"),
+            True,
+        ),
+        (
+            service_task("s3", "*", ALL, full_access=True),
+            action_task("s3:ListBucket", "arn:aws:s3:::bucket"),
+            False,
+        ),
+        (
+            service_task("s3", "*", ALL),
+            service_task("s3", "*", ALL, full_access=True),
+            False,
+        ),
+        # a whole service covers its resource types
+        (service_task("s3", "*", READ), service_task("s3", "bucket", LIST, True), True),
+        (service_task("s3", "bucket", WRITE), service_task("s3", "*", LIST), False),
+        # resource types must match, and have any service-wide actions
+        (service_task("s3", "bucket", READ), service_task("s3", "bucket", LIST), True),
+        (service_task("s3", "bucket", READ), service_task("s3", "object", LIST), False),
+        (
+            service_task("s3", "bucket", READ),
+            service_task("s3", "bucket", LIST, True),
+            False,
+        ),
+        (
+            service_task("s3", "bucket", READ, True),
+            service_task("s3", "bucket", LIST),
+            True,
+        ),
+        (action_task("s3:ListBucket"), action_task("s3:ListBucket"), True),
+        (action_task("s3:ListBucket"), action_task("s3:GetObject"), False),
+        # full access covers a list of actions only if they are all its own
+        (
+            service_task("s3", "*", ALL, full_access=True),
+            action_task(["s3:ListBucket", "S3:GetObject"]),
+            True,
+        ),
+        (
+            service_task("s3", "*", ALL, full_access=True),
+            action_task(["s3:ListBucket", "ec2:DescribeRegions"]),
+            False,
+        ),
+    ],
+)
+def test_subsumes(a, b, expected):
+    assert subsumes(a, b) == expected
+
+
+def test_service_task_rejects_resource_type_in_name():
+    with pytest.raises(ValueError, match="cannot include"):
+        service_task("s3:bucket", "*", READ)
+
+
+def test_plan():
+    tasks = [
+        service_task("iam", "*", LIST),
+        service_task("s3", "*", READ),
+        service_task("iam", "*", READ),
+        service_task("s3", "*", READ),
+        action_task("s3:ListBucket"),
+        service_task("s3", "*", ALL, full_access=True),
+        action_task("sqs:SendMessage"),
+        action_task("sqs:SendMessage"),
+    ]
+
+    plan = Plan(tasks)
+
+    assert plan.kept == [2, 5, 6]
+    assert plan.kept_tasks == [tasks[2], tasks[5], tasks[6]]
+    assert plan.skipped == {0: 2, 1: 5, 3: 5, 4: 5, 7: 6}
+    assert plan.generator_calls_avoided == 3
+
+
+def test_plan_with_actions_of_several_services():
+    tasks = [
+        service_task("s3", "*", ALL, full_access=True),
+        action_task(["ec2:DescribeRegions", "s3:ListBucket"]),
+        action_task(["ec2:DescribeRegions", "s3:ListBucket"]),
+    ]
+
+    plan = Plan(tasks)
+
+    assert plan.kept == [0, 1]
+    assert plan.skipped == {2: 1}
+    assert describe_task(tasks[1]) == ("action ec2:DescribeRegions, s3:ListBucket on *")
+
+
+def test_plan_keeps_first_duplicate():
+    tasks = [service_task("iam", "*", READ), service_task("iam", "*", READ)]
+
+    assert Plan(tasks).skipped == {1: 0}
+
+
+def test_plan_report():
+    plan = Plan(
+        [
+            service_task("iam", "role", READ, True),
+            service_task("iam", "role", LIST),
+            action_task("s3:ListBucket", ["arn:aws:s3:::a", "arn:aws:s3:::b"]),
+        ]
+    )
+
+    assert plan.report().splitlines() == [
+        "plan: generating 2 of 3 items, 1 generator calls avoided",
+        "  generate  read access to iam role (with service-wide actions)",
+        "  skip      list access to iam role (granted by read access to iam role"
+        + " (with service-wide actions))",
+        "  generate  action s3:ListBucket on arn:aws:s3:::a, arn:aws:s3:::b",
+    ]
+
+
+def test_describe_task():
+    assert describe_task(service_task("s3", "*", ALL, full_access=True)) == (
+        "s3:* (full access)"
+    )
+    assert describe_task(service_task("s3", "*", ["Read", "Tagging"])) == (
+        "Read, Tagging access to s3"
+    )
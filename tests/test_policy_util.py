@@ -0,0 +1,99 @@
+import copy
+
+import pytest
+
+from aws_policy_generator import policy_util
+from aws_iam_utils import combiner
+from aws_iam_utils import generator
+from aws_iam_utils import simplifier
+from aws_iam_utils import util
+
+POLICIES = [
+    util.create_policy(
+        util.statement(actions=["s3:GetObject", "S3:PutObject"], resource="*"),
+        util.statement(actions="s3:getobject", resource=["*", "arn:aws:s3:::b"]),
+    ),
+    util.create_policy(
+        util.statement(
+            actions=["sqs:SendMessage", "s3:GetObject"],
+            resource="arn:aws:s3:::b",
+            condition={"Bool": {"aws:SecureTransport": "true"}},
+        ),
+        util.statement(effect="Deny", actions=["iam:*"]),
+        util.statement(actions=["kms:Decrypt"], principal={"AWS": ["arn:aws:iam::1"]}),
+        version="2008-10-17",
+    ),
+    util.create_policy(),
+]
+
+
+def test_simplify_policy_matches_aws_iam_utils():
+    policy = combiner.collapse_policy_statements(*copy.deepcopy(POLICIES))
+    expected = simplifier.simplify_policy(copy.deepcopy(policy))
+
+    assert policy_util.simplify_policy(policy) == expected
+
+
+def test_generate_full_policy_for_service_matches_aws_iam_utils():
+    assert policy_util.generate_full_policy_for_service(
+        "s3", "ec2"
+    ) == generator.generate_full_policy_for_service("s3", "ec2")
+
+
+@pytest.mark.parametrize(
+    "policies", [[], POLICIES[:1], POLICIES[1:2], POLICIES, POLICIES[::-1]]
+)
+def test_policy_accumulator_matches_aws_iam_utils_with_sorted_actions(policies):
+    # aws_iam_utils modifies its input
+    expected = combiner.collapse_policy_statements(*copy.deepcopy(policies))
+    for st in expected["Statement"]:
+        st["Action"] = sorted(st["Action"])
+
+    accumulator = policy_util.PolicyAccumulator()
+    for policy in policies:
+        accumulator.add(policy)
+
+    assert accumulator.policy() == expected
+
+
+def test_policy_accumulator_does_not_share_input():
+    policy = copy.deepcopy(POLICIES[1])
+    accumulator = policy_util.PolicyAccumulator()
+    accumulator.add(policy)
+
+    policy_util.simplify_policy(accumulator.policy())
+
+    assert policy == POLICIES[1]
+
+
+def test_policy_accumulator_rejects_not_keys():
+    with pytest.raises(ValueError, match="NotAction"):
+        policy_util.PolicyAccumulator().add_statement(
+            {"Effect": "Allow", "NotAction": "s3:*", "Action": []}
+        )
+
+
+def test_policy_accumulator_interns_lower_case_actions():
+    accumulator = policy_util.PolicyAccumulator()
+    accumulator.add(
+        util.create_policy(
+            util.statement(actions=["S3:GetObject"], resource="arn:aws:s3:::a"),
+            util.statement(
+                actions=["s3:getobject", "s3:GETOBJECT"], resource="arn:aws:s3:::b"
+            ),
+        )
+    )
+
+    a, b = accumulator.policy()["Statement"]
+    assert a["Action"] == b["Action"] == ["s3:getobject"]
+    assert a["Action"][0] is b["Action"][0]
+
+
+def test_policy_accumulator_shares_interned_actions():
+    accumulator = policy_util.PolicyAccumulator()
+    accumulator.add(POLICIES[0])
+    accumulator.add(POLICIES[1])
+
+    first, second = accumulator.policy(), accumulator.policy()
+    assert first == second
+    assert first["Statement"][0]["Action"][0] is (second["Statement"][0]["Action"][0])
@@ -0,0 +1,163 @@
+import json
+
+from aws_policy_generator import profiler
+from aws_policy_generator.profiler import ChromeTrace
+from aws_policy_generator.profiler import Observer
+from aws_policy_generator.profiler import Profile
+from aws_policy_generator.profiler import annotate
+from aws_policy_generator.profiler import count
+from aws_policy_generator.profiler import observing
+from aws_policy_generator.profiler import profile_pipeline
+from aws_policy_generator.profiler import stage
+
+
+class Recorder(Observer):
+    def __init__(self):
+        self.events = []
+
+    def stage_started(self, event):
+        self.events.append(("started", event.path, dict(event.attributes)))
+
+    def stage_finished(self, event):
+        self.events.append(("finished", event.path, dict(event.attributes)))
+
+    def counted(self, name, n):
+        self.events.append(("counted", name, n))
+
+
+def test_no_observers():
+    with stage("generate", service="s3"):
+        annotate({"Statement": []})
+        count("items")
+
+    assert profiler.OBSERVERS == ()
+
+
+def test_observing():
+    recorder = Recorder()
+
+    with observing(recorder):
+        with stage("generate", service="s3"):
+            annotate({"Statement": [{"Action": ["s3:GetObject", "s3:PutObject"]}]})
+            with stage("collapse"):
+                count("items", 2)
+                annotate(characters=10)
+
+    assert profiler.OBSERVERS == ()
+    assert recorder.events == [
+        ("started", "generate", {"service": "s3"}),
+        ("started", "generate/collapse", {}),
+        ("counted", "items", 2),
+        ("finished", "generate/collapse", {"characters": 10}),
+        ("finished", "generate", {"service": "s3", "statements": 1, "actions": 2}),
+    ]
+
+
+def test_stage_error():
+    events = []
+
+    class ErrorRecorder(Observer):
+        def stage_finished(self, event):
+            events.append(event)
+
+    with observing(ErrorRecorder()):
+        try:
+            with stage("generate"):
+                raise ValueError("invalid")
+        except ValueError:
+            pass
+
+    assert isinstance(events[0].error, ValueError)
+    assert events[0].wall >= 0
+
+
+def test_chrome_trace(tmp_path):
+    trace = ChromeTrace()
+
+    with observing(trace):
+        with stage("serialize", max_length=6144):
+            with stage("minimize"):
+                count("minimizer retries")
+
+    trace.write(tmp_path / "trace.json")
+    with open(tmp_path / "trace.json") as f:
+        document = json.load(f)
+
+    events = document["traceEvents"]
+    assert [(x["name"], x["ph"]) for x in events] == [
+        ("serialize", "X"),
+        ("minimize", "X"),
+        ("minimizer retries", "C"),
+    ]
+
+    serialize, minimize, retries = events
+    assert serialize["args"]["max_length"] == 6144
+    assert minimize["cat"] == "serialize/minimize"
+    assert serialize["ts"] <= minimize["ts"] <= retries["ts"]
+    assert minimize["ts"] + minimize["dur"] <= serialize["ts"] + serialize["dur"]
+    assert retries["args"] == {"minimizer retries": 1}
+
+
+def test_stages_and_counters():
+    with profile_pipeline() as profile:
+        with stage("generate"):
+            count("items", 2)
+        with stage("serialize"):
+            with stage("minimize"):
+                data = [0] * 100000
+                count("items")
+            del data
+        with stage("generate"):
+            pass
+
+    assert profiler.OBSERVERS == ()
+    assert list(profile.stages) == ["generate", "serialize", "serialize/minimize"]
+    assert profile.stages["generate"]["calls"] == 2
+    assert profile.counters == {"items": 3}
+
+    minimize = profile.stages["serialize/minimize"]
+    serialize = profile.stages["serialize"]
+    assert minimize["wall"] <= serialize["wall"]
+    assert minimize["peak_memory"] >= 800000
+    assert serialize["peak_memory"] >= minimize["peak_memory"]
+
+
+def test_without_memory():
+    with profile_pipeline(trace_memory=False) as profile:
+        with stage("generate"):
+            data = [0] * 100000
+            del data
+
+    assert profile.stages["generate"]["peak_memory"] == 0
+
+
+def test_stage_raises():
+    profile = Profile()
+    with observing(profile):
+        try:
+            with stage("generate"):
+                raise ValueError()
+        except ValueError:
+            pass
+
+        with stage("collapse"):
+            pass
+
+    assert list(profile.stages) == ["generate", "collapse"]
+    assert profile.stages["generate"]["calls"] == 1
+
+
+def test_report():
+    profile = Profile()
+    with observing(profile):
+        with stage("serialize"):
+            with stage("minimize"):
+                count("minimizer retries", 4)
+
+    lines = profile.report().splitlines()
+    assert lines[0].split() == ["stage", "calls", "wall", "cpu", "peak", "memory"]
+    assert lines[1].startswith("serialize ")
+    assert lines[2].startswith("  minimize ")
+    assert lines[3].split() == ["minimizer", "retries:", "4"]
+
+    assert json.loads(profile.to_json()) == profile.as_dict()
@@ -1,8 +1,15 @@
 from unittest.mock import Mock
 from unittest.mock import patch
 
+from aws_policy_generator import cache
+from aws_policy_generator.disk_cache import DiskCache
+from aws_policy_generator.safe_minimizer import canonical_policy_hash
+from aws_policy_generator.safe_minimizer import minimize_cache_stats
 from aws_policy_generator.safe_minimizer import minimize_policy_with_error_handling
 from aws_policy_generator.safe_minimizer import ACTION_NOT_FOUND_ERR
+from aws_policy_generator.safe_minimizer import MINIMIZE_CACHE
+from aws_policy_generator.safe_minimizer import is_known_action
+from aws_policy_generator.trie_minimizer import configure_minimizer
 
 from aws_iam_utils.util import create_policy, statement, lowercase_policy
 from aws_iam_utils.util import extract_policy_permission_items
@@ -85,3 +92,175 @@ def test_minimize_policy_with_error_in_multiple_statement_with_qualifiers():
         result = minimize_policy_with_error_handling(policy)
 
     assert policies_are_equal(result, lowercase_policy(policy))
+
+
+def test_minimize_policy_with_error_handling_unknown_actions_minimized_once():
+    unknown_actions = [f"notaservice:Action{i}" for i in range(150)]
+    policy = create_policy(
+        statement(actions=["s3:GetObject"] + unknown_actions),
+        statement(actions=["notaservice:Get*"], resource="foo"),
+    )
+
+    mp = Mock(side_effect=lambda x: x)
+
+    with patch(MINIMIZE_POLICY_ADDR, new=mp):
+        result = minimize_policy_with_error_handling(policy)
+
+    mp.assert_called_once_with(
+        lowercase_policy(create_policy(statement(actions=["s3:GetObject"])))
+    )
+    assert policies_are_equal(result, lowercase_policy(policy))
+
+
+def test_is_known_action():
+    assert is_known_action("s3:getobject")
+    assert is_known_action("s3:get*")
+    assert is_known_action("s3:getobjec?")
+    assert is_known_action("*:getobject")
+    assert not is_known_action("s3:notanaction")
+    assert not is_known_action("s3:notanaction*")
+    assert not is_known_action("notaservice:*")
+
+
+def test_minimize_policy_with_error_handling_with_policyuniverse():
+    policy = create_policy(
+        statement(actions=["s3:GetObject", "s3:GetObjectAcl", "s3:NewAction"]),
+    )
+
+    result = minimize_policy_with_error_handling(policy)
+
+    assert "s3:newaction" in result["Statement"][0]["Action"]
+    assert policies_are_equal(
+        result,
+        create_policy(
+            statement(actions=["s3:GetObject", "s3:GetObjectAcl", "s3:NewAction"])
+        ),
+    )
+
+
+def test_minimize_policy_with_error_handling_sets_aside_all_items_for_action():
+    policy = create_policy(
+        statement(actions=["s3:GetObject", "s3:PutObject"], resource="a"),
+        statement(actions=["s3:PutObject"], resource="b"),
+        statement(
+            actions=["s3:PutObject"],
+            resource="c",
+            condition={"StringEquals": {"bucketName": "bat"}},
+        ),
+    )
+
+    mp = Mock(side_effect=create_failing_minimize_policy(["s3:PutObject"]))
+
+    with patch(MINIMIZE_POLICY_ADDR, new=mp):
+        result = minimize_policy_with_error_handling(policy)
+
+    assert mp.call_count == 2
+    assert policies_are_equal(result, lowercase_policy(policy))
+
+
+def test_canonical_policy_hash():
+    policy = create_policy(
+        statement(actions=["s3:GetObject", "s3:PutObject"]),
+        statement(actions=["s3:ListBucket"], resource="foo"),
+    )
+    reordered = create_policy(
+        statement(actions=["s3:ListBucket"], resource="foo"),
+        statement(actions=["s3:putobject", "s3:GetObject"]),
+    )
+    different = create_policy(statement(actions=["s3:GetObject"]))
+
+    assert canonical_policy_hash(policy) == canonical_policy_hash(
+        lowercase_policy(policy)
+    )
+    assert canonical_policy_hash(policy) != canonical_policy_hash(reordered)
+    assert canonical_policy_hash(policy) != canonical_policy_hash(different)
+
+
+def test_minimize_policy_with_error_handling_caches_results():
+    policy = create_policy(statement(actions=["s3:PutObject", "s3:GetObject"]))
+    lowercase = create_policy(statement(actions=["s3:putobject", "s3:getobject"]))
+
+    mp = Mock(side_effect=lambda x: x)
+    seconds_saved = minimize_cache_stats()["seconds_saved"]
+
+    with patch(MINIMIZE_POLICY_ADDR, new=mp):
+        first = minimize_policy_with_error_handling(policy)
+        first["Statement"].clear()  # must not corrupt the cached result
+
+        second = minimize_policy_with_error_handling(lowercase)
+
+    mp.assert_called_once()
+    assert policies_are_equal(second, lowercase_policy(policy))
+    assert minimize_cache_stats()["seconds_saved"] > seconds_saved
+
+
+def test_minimize_policy_with_error_handling_keeps_statement_order():
+    policy = create_policy(
+        statement(actions=["s3:PutObject", "s3:GetObject"]),
+        statement(actions=["s3:ListBucket"], resource="foo"),
+    )
+    reordered = create_policy(
+        statement(actions=["s3:ListBucket"], resource="foo"),
+        statement(actions=["s3:GetObject", "s3:PutObject"]),
+    )
+
+    # an order-preserving minimizer, with and without the cache
+    with patch(MINIMIZE_POLICY_ADDR, new=Mock(side_effect=lambda x: x)):
+        uncached = minimize_policy_with_error_handling(reordered)
+        MINIMIZE_CACHE.clear()
+
+        minimize_policy_with_error_handling(policy)
+        cached = minimize_policy_with_error_handling(reordered)
+
+    assert cached == uncached
+    assert cached["Statement"][0]["Resource"] == "foo"
+
+
+def test_minimize_policy_with_error_handling_uses_disk_cache(tmp_path):
+    policy = create_policy(statement(actions=["s3:GetObject", "s3:GetObjectAcl"]))
+    disk_cache = DiskCache(str(tmp_path))
+
+    with patch.object(cache, "DISK_CACHE", new=disk_cache):
+        result = minimize_policy_with_error_handling(policy)
+
+    assert (
+        disk_cache.get(["minimize_policy", canonical_policy_hash(policy)])["policy"]
+        == result
+    )
+
+
+def test_minimize_policy_with_error_handling_with_trie(tmp_path):
+    policy = create_policy(
+        statement(actions=["s3:GetObject", "s3:GetObjectAcl", "s3:NewAction"]),
+    )
+    disk_cache = DiskCache(str(tmp_path))
+    mp = Mock(side_effect=lambda x: x)
+
+    configure_minimizer("trie")
+    try:
+        with patch(MINIMIZE_POLICY_ADDR, new=mp):
+            with patch.object(cache, "DISK_CACHE", new=disk_cache):
+                result = minimize_policy_with_error_handling(policy)
+    finally:
+        configure_minimizer("policyuniverse")
+
+    mp.assert_not_called()
+    assert "s3:newaction" in result["Statement"][0]["Action"]
+    assert policies_are_equal(result, lowercase_policy(policy))
+    assert (
+        disk_cache.get(["trie_minimize_policy", canonical_policy_hash(policy)])[
+            "policy"
+        ]
+        == result
+    )
+
+
+def test_minimize_policy_with_error_handling_with_given_minimizer():
+    policy = create_policy(statement(actions=["s3:GetObject", "s3:NewAction"]))
+    mp = Mock(side_effect=lambda x: x)
+
+    with patch(MINIMIZE_POLICY_ADDR, new=mp):
+        result = minimize_policy_with_error_handling(policy, minimizer="trie")
+
+    mp.assert_not_called()
+    assert result["Statement"][0]["Action"] == ["s3:getobject", "s3:newaction"]
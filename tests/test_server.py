@@ -0,0 +1,162 @@
+import json
+import os
+import stat
+import threading
+
+from contextlib import contextmanager
+
+import pytest
+
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock
+from unittest.mock import patch
+
+from aws_policy_generator.server import DaemonError
+from aws_policy_generator.server import PolicyServer
+from aws_policy_generator.server import request
+from aws_policy_generator._internal import argparser
+from aws_policy_generator._internal.main import generate
+from aws_policy_generator._internal.main import main
+from aws_policy_generator._internal.main import plan
+
+from .testutil import dummy_policy
+
+GENERATE_POLICY_FOR_SERVICE_ADDR = (
+    "aws_policy_generator.yaml_generator.generate_policy_for_service"
+)
+PLAN_ADDR = "aws_policy_generator._internal.main.plan"
+
+SPEC = """
+policies:
+    - service: s3
+      access_level: all
+"""
+
+
+@contextmanager
+def serving(path, **defaults):
+    """Runs a daemon at path, whose defaults are the CLI's but for defaults."""
+    server = PolicyServer(
+        path,
+        generate,
+        {**vars(argparser.parser.parse_args([])), **defaults},
+        workers=4,
+    )
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+
+    try:
+        yield path
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    with serving(str(tmp_path / "apg.sock")) as path:
+        yield path
+
+
+def parse_args(*args):
+    return argparser.parser.parse_args(list(args))
+
+
+def test_request(socket_path):
+    args_namespace = parse_args("-A", "ec2:DescribeRegions")
+
+    result = request(socket_path, args_namespace, [SPEC])
+
+    assert result == generate(args_namespace, [SPEC])
+    assert json.loads(result)["Statement"][0]["Action"] == [
+        "ec2:describeregions",
+        "s3:*",
+    ]
+
+
+def test_concurrent_requests(socket_path):
+    def generate_for(i):
+        return request(socket_path, parse_args("-A", f"svc:Action{i}"), [])
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(generate_for, range(32)))
+
+    for i, result in enumerate(results):
+        assert json.loads(result)["Statement"][0]["Action"] == [f"svc:action{i}"]
+
+
+def test_request_error(socket_path):
+    with pytest.raises(DaemonError, match="ValueError"):
+        request(socket_path, parse_args(), ["policies:\n  - access_level: read\n"])
+
+
+def test_request_no_daemon(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        request(str(tmp_path / "missing.sock"), parse_args(), [])
+
+
+def test_socket_is_created_private(tmp_path):
+    umask = os.umask(0)
+    try:
+        with serving(str(tmp_path / "apg.sock")) as path:
+            assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    finally:
+        assert os.umask(umask) == 0
+
+
+def test_second_daemon_on_same_socket(socket_path):
+    with pytest.raises(OSError, match="already listening"):
+        PolicyServer(socket_path, generate, {})
+
+
+def test_main_forwards_to_daemon(socket_path, tmp_path):
+    spec = tmp_path / "spec.yaml"
+    spec.write_text(SPEC)
+    daemon_plan = Mock(wraps=plan)
+
+    with patch(PLAN_ADDR, new=daemon_plan):
+        with patch(
+            GENERATE_POLICY_FOR_SERVICE_ADDR, new=Mock(side_effect=dummy_policy)
+        ):
+            result = main(
+                ["-f", str(spec), "-l", "iam", "--socket", socket_path],
+                return_policy=True,
+            )
+
+    # the daemon receives the YAML itself, not the path to it
+    args_namespace, yaml_inputs = daemon_plan.call_args.args
+    assert yaml_inputs == [SPEC]
+    assert args_namespace.list == ["iam"]
+    assert args_namespace.file is None
+    assert args_namespace.socket is None
+
+    assert "s3:*" in json.loads(result)["Statement"][0]["Action"]
+
+
+def test_main_without_daemon_generates_locally(tmp_path, capsys):
+    result = main(
+        ["-A", "s3:GetObject", "--socket", str(tmp_path / "missing.sock")],
+        return_policy=True,
+    )
+
+    assert json.loads(result)["Statement"][0]["Action"] == ["s3:getobject"]
+    assert "generating locally" in capsys.readouterr().err
+
+
+def test_request_uses_the_clients_minimizer(tmp_path):
+    minimize = ["-A", "s3:GetObject", "-A", "s3:GetObjectAcl", "--auto-shorten"]
+    minimize += ["-m", "1", "-c"]
+
+    results = {}
+    with serving(str(tmp_path / "apg.sock"), minimizer="trie") as path:
+        for minimizer in ["policyuniverse", "trie"]:
+            args_namespace = parse_args(*minimize, "--minimizer", minimizer)
+            results[minimizer] = request(path, args_namespace, [])
+
+            assert results[minimizer] == generate(args_namespace, [])
+
+        # a request that names no minimizer uses the daemon's
+        assert request(path, parse_args(*minimize), []) == results["trie"]
+
+    assert results["policyuniverse"] != results["trie"]
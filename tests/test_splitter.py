@@ -0,0 +1,131 @@
+import json
+
+import pytest
+
+from unittest.mock import Mock
+from unittest.mock import patch
+
+from aws_policy_generator.splitter import auto_split_policy
+from aws_policy_generator.splitter import split_policy
+from aws_policy_generator._internal.main import main
+from aws_iam_utils.util import create_policy
+from aws_iam_utils.util import statement
+
+MINIMIZE_ADDR = (
+    "aws_policy_generator.auto_shortener.minimize_policy_with_error_handling"
+)
+
+
+def actions(service, count):
+    return [f"{service}:Action{i:03}" for i in range(count)]
+
+
+POLICY = create_policy(
+    statement(actions=actions("s3", 40), resource="arn:aws:s3:::bucket/*"),
+    statement(actions=actions("ec2", 60) + actions("iam", 30) + actions("sqs", 5)),
+    *[
+        statement(actions=actions("lambda", 3), resource=f"arn:aws:lambda:::f{i}")
+        for i in range(20)
+    ],
+)
+
+
+def serialize(policy, compact):
+    return json.dumps(policy) if compact else json.dumps(policy, indent=2)
+
+
+def permissions(*policies):
+    return sorted(
+        (json.dumps(st.get("Resource")), action)
+        for policy in policies
+        for st in policy["Statement"]
+        for action in st["Action"]
+    )
+
+
+@pytest.mark.parametrize("compact", [False, True])
+@pytest.mark.parametrize("max_length", [1000, 2000, 6144])
+def test_split_policy(compact, max_length):
+    result = split_policy(POLICY, max_length, compact)
+
+    assert permissions(*result) == permissions(POLICY)
+    assert all(len(serialize(x, compact)) <= max_length for x in result)
+
+    # first-fit-decreasing stays close to the least possible number of policies
+    total = sum(len(serialize(x, compact)) for x in result)
+    assert len(result) <= total // max_length + 2
+
+
+def test_split_policy_keeps_services_together():
+    result = split_policy(POLICY, 2500)
+
+    for service, count in [("ec2", 60), ("iam", 30), ("sqs", 5)]:
+        statements = [
+            st
+            for policy in result
+            for st in policy["Statement"]
+            if any(x.startswith(f"{service}:") for x in st["Action"])
+        ]
+        assert len(statements) == 1
+        assert len([x for x in statements[0]["Action"] if service in x]) == count
+
+
+def test_split_policy_that_fits_is_unchanged():
+    assert split_policy(POLICY, 100000) == [POLICY]
+
+
+def test_split_policy_too_small():
+    with pytest.raises(ValueError, match="cannot fit"):
+        split_policy(POLICY, 150)
+
+
+def test_auto_split_policy_prefers_shortening():
+    policy = create_policy(statement(actions=actions("s3", 2)))
+    mp = Mock(side_effect=lambda x, **kwargs: x)
+
+    with patch(MINIMIZE_ADDR, new=mp):
+        result = auto_split_policy(policy, max_length=1000)
+
+    assert result == [json.dumps(policy, indent=2)]
+    mp.assert_not_called()
+
+
+def test_auto_split_policy_splits_shortest_form():
+    mp = Mock(side_effect=lambda x, **kwargs: x)
+
+    with patch(MINIMIZE_ADDR, new=mp):
+        result = auto_split_policy(POLICY, max_length=2000)
+
+    mp.assert_called_once()
+    assert len(result) > 1
+    assert all(len(x) <= 2000 and "\n" not in x for x in result)
+    assert permissions(*[json.loads(x) for x in result]) == permissions(POLICY)
+
+
+@pytest.fixture
+def no_minimize():
+    with patch(MINIMIZE_ADDR, new=Mock(side_effect=lambda x, **kwargs: x)):
+        yield
+
+
+def test_main_split_prints_json_array(no_minimize):
+    args = ["-A", "s3:GetObject", "-A", "s3:PutObject", "--split", "--max-length"]
+
+    result = json.loads(main(args + ["120"], return_policy=True))
+
+    assert len(result) == 2
+    assert permissions(*result) == [
+        ('"*"', "s3:getobject"),
+        ('"*"', "s3:putobject"),
+    ]
+
+
+def test_main_split_writes_numbered_policies(no_minimize, tmp_path):
+    out_dir = tmp_path / "out"
+    args = ["-A", "s3:GetObject", "-A", "s3:PutObject", "--split", "--max-length"]
+
+    result = main(args + ["120", "--out-dir", str(out_dir)], return_policy=True)
+
+    paths = [str(out_dir / "policy-1.json"), str(out_dir / "policy-2.json")]
+    assert json.loads(result) == {"policies": paths}
+    assert len(permissions(*[json.load(open(x)) for x in paths])) == 2
@@ -0,0 +1,127 @@
+import io
+import json
+
+import pytest
+
+from unittest.mock import patch
+
+from aws_policy_generator.stream import documents
+from aws_policy_generator.stream import load_document
+from aws_policy_generator._internal import argparser
+from aws_policy_generator._internal.main import main
+from aws_policy_generator._internal.main import stream_command
+from aws_policy_generator.yaml_generator import generate_from_spec
+
+GENERATE_FROM_SPEC_ADDR = "aws_policy_generator._internal.main.generate_from_spec"
+
+YAML_STREAM = """\
+# first
+policies:
+    - action: s3:GetObject
+---
+options:
+    include_service_wide_actions: true
+policies:
+    - service: s3
+      access_level: all
+...
+--- {policies: [{action: sqs:SendMessage}]}
+"""
+
+
+def spec_line(action, resource="*"):
+    return json.dumps({"policies": [{"action": action, "resource": resource}]}) + "\n"
+
+
+def test_documents_json_lines():
+    lines = [spec_line("s3:GetObject"), "\n", "# comment\n", spec_line("s3:PutObject")]
+
+    assert [load_document(x) for x in documents(lines)] == [
+        json.loads(lines[0]),
+        json.loads(lines[3]),
+    ]
+
+
+def test_documents_yaml_stream():
+    docs = [load_document(x) for x in documents(io.StringIO(YAML_STREAM))]
+
+    assert docs == [
+        {"policies": [{"action": "s3:GetObject"}]},
+        {
+            "options": {"include_service_wide_actions": True},
+            "policies": [{"service": "s3", "access_level": "all"}],
+        },
+        {"policies": [{"action": "sqs:SendMessage"}]},
+    ]
+
+
+def test_stream_writes_each_policy_before_reading_on():
+    output = io.StringIO()
+
+    def input_lines():
+        yield spec_line("s3:GetObject")
+        assert output.getvalue().count("\n") == 1
+        yield spec_line("s3:PutObject", "arn:aws:s3:::b/*")
+
+    stream_command(argparser.parser.parse_args([]), input_lines(), output)
+
+    first, second = [json.loads(x) for x in output.getvalue().splitlines()]
+    assert first["Statement"] == [
+        {"Effect": "Allow", "Resource": "*", "Action": "s3:getobject"}
+    ]
+    assert second["Statement"][0]["Resource"] == "arn:aws:s3:::b/*"
+
+
+def test_stream_reports_errors_and_carries_on():
+    output = io.StringIO()
+    lines = ['{"policies": [{"access_level": "read"}]}\n', "not: [valid\n", "---\n"]
+    lines.append(spec_line("s3:GetObject"))
+
+    stream_command(argparser.parser.parse_args([]), lines, output)
+
+    results = [json.loads(x) for x in output.getvalue().splitlines()]
+    assert [list(x) for x in results] == [
+        ["error"],
+        ["error"],
+        ["Version", "Statement"],
+    ]
+
+
+def test_main_stream(monkeypatch, capsys):
+    monkeypatch.setattr("sys.stdin", io.StringIO(YAML_STREAM))
+
+    main(["--stream"])
+
+    results = [json.loads(x) for x in capsys.readouterr().out.splitlines()]
+    assert [x["Statement"][0]["Action"] for x in results] == [
+        "s3:getobject",
+        "s3:*",
+        "sqs:sendmessage",
+    ]
+
+
+def test_main_stream_keeps_other_output_off_stdout(monkeypatch, capsys):
+    def noisy_generate_from_spec(spec, **kwargs):
+        print("generating")  # as policyuniverse prints while minimizing
+        return generate_from_spec(spec, **kwargs)
+
+    monkeypatch.setattr("sys.stdin", io.StringIO(YAML_STREAM))
+    with patch(GENERATE_FROM_SPEC_ADDR, new=noisy_generate_from_spec):
+        main(["--stream", "--auto-shorten", "-m", "1"])
+
+    captured = capsys.readouterr()
+    assert len([json.loads(x) for x in captured.out.splitlines()]) == 3
+    assert captured.err.count("generating\n") == 3
+
+
+@pytest.mark.parametrize(
+    "flag", [["-f", "x.yaml"], ["-r", "s3"], ["-A", "s3:GetObject"], ["--split"]]
+)
+def test_main_stream_rejects_items(monkeypatch, capsys, flag):
+    monkeypatch.setattr("sys.stdin", io.StringIO(YAML_STREAM))
+
+    with pytest.raises(SystemExit) as ex:
+        main(["--stream"] + flag)
+
+    assert ex.value.code == 2
+    assert "cannot be used with --stream" in capsys.readouterr().err
@@ -0,0 +1,101 @@
+import pytest
+
+from unittest.mock import patch
+
+from aws_policy_generator import trie_minimizer
+from aws_policy_generator.trie_minimizer import ActionTrie
+from aws_policy_generator.trie_minimizer import configure_minimizer
+from aws_policy_generator.trie_minimizer import minimize_actions
+from aws_policy_generator.trie_minimizer import minimize_policy
+from aws_policy_generator.trie_minimizer import service_actions
+
+from aws_iam_utils.util import create_policy, statement
+from policyuniverse.expander_minimizer import expand_policy
+
+ACTIONS = [
+    "s3:getobject",
+    "s3:getobjectacl",
+    "s3:getobjectattributes",
+    "s3:getbucketpolicy",
+    "s3:putobject",
+    "s3:putobjectacl",
+]
+
+
+def test_trie_minimize():
+    trie = ActionTrie("s3", ACTIONS)
+
+    assert trie.minimize(set(ACTIONS)) == ["s3:*"]
+    assert trie.minimize({"s3:putobject", "s3:putobjectacl"}) == ["s3:p*"]
+    # as short as s3:getobjectac*, and exact
+    assert trie.minimize({"s3:getobject", "s3:getobjectacl"}) == [
+        "s3:getobject",
+        "s3:getobjectacl",
+    ]
+    assert trie.minimize(
+        {"s3:getobject", "s3:getobjectacl", "s3:getobjectattributes"}
+    ) == ["s3:geto*"]
+    assert trie.minimize({"s3:putobject"}) == ["s3:putobject"]
+    assert trie.minimize(set()) == []
+
+
+def test_trie_minimize_single_action():
+    trie = ActionTrie("s3", ["s3:getobject", "s3:getobjectacl", "s3:gettag"])
+
+    assert trie.minimize({"s3:getobjectacl"}) == ["s3:getobjecta*"]
+    assert trie.minimize({"s3:gettag"}) == ["s3:gett*"]
+    assert trie.minimize({"s3:getobject"}) == ["s3:getobject"]
+
+
+def test_minimize_actions():
+    trie = ActionTrie("s3", ACTIONS)
+
+    with patch.object(trie_minimizer, "action_trie", new=lambda x: trie):
+        result = minimize_actions(
+            [
+                "s3:PutObject*",
+                "s3:GetObject",
+                "s3:NewAction",
+                "s3:PutNewThing",
+                "*",
+                "s3:Get*Acl",
+            ]
+        )
+
+    assert result == [
+        "*",
+        "s3:getobject",
+        "s3:getobjectacl",
+        "s3:newaction",
+        "s3:p*",
+    ]
+
+
+def test_minimize_policy_matches_same_actions():
+    actions = service_actions("s3")
+    granted = [x for x in actions if x.startswith("s3:get")][::3]
+    policy = create_policy(
+        statement(actions=granted, resource="*"),
+        statement(effect="Deny", actions="s3:DeleteBucket", resource="foo"),
+    )
+
+    result = minimize_policy(policy)
+
+    assert sum(len(x) for x in result["Statement"][0]["Action"]) < sum(
+        len(x) for x in granted
+    )
+    assert set(expand_policy(result)["Statement"][0]["Action"]) == set(granted)
+    assert result["Statement"][1] == {
+        **policy["Statement"][1],
+        "Action": ["s3:deletebucket"],
+    }
+
+
+def test_configure_minimizer():
+    with pytest.raises(ValueError):
+        configure_minimizer("unknown")
+
+    configure_minimizer("trie")
+    assert trie_minimizer.ACTIVE_MINIMIZER == "trie"
+
+    configure_minimizer("policyuniverse")
@@ -1,9 +1,13 @@
+import json
+
 from unittest.mock import Mock
 from unittest.mock import call
 from unittest.mock import patch
 from io import StringIO
 
 from aws_policy_generator import yaml_generator
+from aws_policy_generator.profiler import Observer
+from aws_policy_generator.profiler import observing
 from aws_iam_utils.constants import READ, WRITE, LIST
 from aws_iam_utils.checks import policies_are_equal
 from aws_iam_utils.combiner import collapse_policy_statements
@@ -247,6 +251,36 @@ def test_generate_with_action_and_multiple_resources():
     assert policies_are_equal(result, expected_policy)
 
 
+def test_generate_with_actions_and_multiple_resources():
+    input = """
+    policies:
+        - service: s3
+          access_level: all
+        - action: [ec2:DescribeRegions, s3:ListBucket]
+          resource:
+              - arn:aws:s3:::foo
+              - arn:aws:s3:::bar
+        - action: [ec2:DescribeRegions, s3:ListBucket]
+          resource:
+              - arn:aws:s3:::foo
+              - arn:aws:s3:::bar
+    """
+
+    result = yaml_generator.generate_from_yaml(input)
+
+    expected_policy = collapse_policy_statements(
+        create_policy(statement(actions=["s3:*"], resource="*")),
+        create_policy(
+            statement(
+                actions=["ec2:DescribeRegions", "s3:ListBucket"],
+                resource=["arn:aws:s3:::foo", "arn:aws:s3:::bar"],
+            )
+        ),
+    )
+
+    assert policies_are_equal(result, expected_policy)
+
+
 def test_generate_multi_services():
     input = """
     policies:
@@ -535,3 +569,112 @@ def test_generate_resource_types_with_include_service_wide_actions_in_both_place
     )
 
     assert policies_are_equal(result, expected_policy)
+
+
+def test_generate_parallel_threads_matches_serial():
+    input = """
+    policies:
+        - service: [iam, ec2, s3, sqs, sns]
+          access_level: write
+        - action: ec2:DescribeRegions
+        - service: lambda
+          resource_type: [function, layer]
+        - service: iam
+          access_level: write
+    """
+    generate_policy_for_service = Mock(side_effect=dummy_policy)
+    generate_policy_for_service_arn_type = Mock(side_effect=dummy_policy_arn_type)
+
+    with patch(GENERATE_POLICY_FOR_SERVICE_ADDR, new=generate_policy_for_service):
+        with patch(
+            GENERATE_POLICY_FOR_SERVICE_ARN_TYPE_ADDR,
+            new=generate_policy_for_service_arn_type,
+        ):
+            serial = yaml_generator.generate_from_yaml(input)
+            parallel = yaml_generator.generate_from_yaml(
+                input, jobs=4, executor="thread"
+            )
+
+    assert json.dumps(parallel, indent=2) == json.dumps(serial, indent=2)
+
+
+def test_generate_parallel_processes_matches_serial():
+    input = """
+    policies:
+        - service: [s3, ec2, iam, sqs]
+          access_level: all
+        - action: ec2:DescribeRegions
+          resource: arn:aws:ec2:::*
+        - action: s3:ListBucket
+    """
+    serial = yaml_generator.generate_from_yaml(input)
+    parallel = yaml_generator.generate_from_yaml(input, jobs=2, executor="process")
+
+    assert json.dumps(parallel, indent=2) == json.dumps(serial, indent=2)
+
+
+def test_generate_skips_subsumed_items():
+    input = """
+    policies:
+        - service: iam
+          access_level: list
+        - service: [iam, iam]
+        - service: s3
+          access_level: all
+        - service: s3
+          access_level: read
+    """
+    generate_policy_for_service = Mock(side_effect=dummy_policy)
+
+    with patch(GENERATE_POLICY_FOR_SERVICE_ADDR, new=generate_policy_for_service):
+        result = yaml_generator.generate_from_yaml(input)
+
+    generate_policy_for_service.assert_called_once_with("iam", [LIST, READ])
+
+    expected_policy = collapse_policy_statements(
+        dummy_policy("iam", [LIST, READ]),
+        create_policy(statement(actions=["s3:*"], resource="*")),
+    )
+    assert policies_are_equal(result, expected_policy)
+
+
+def test_generate_reports_stages():
+    input = """
+    policies:
+        - service: iam
+          resource_type: role
+          access_level: read
+        - action: ec2:DescribeRegions
+    """
+    events = []
+
+    class Recorder(Observer):
+        def stage_finished(self, event):
+            events.append((event.path, event.attributes))
+
+    with patch(
+        GENERATE_POLICY_FOR_SERVICE_ARN_TYPE_ADDR,
+        new=Mock(side_effect=dummy_policy_arn_type),
+    ):
+        with observing(Recorder()):
+            yaml_generator.generate_from_yaml(input)
+
+    assert [x[0] for x in events] == [
+        "parse",
+        "generate",
+        "generate",
+        "collapse",
+        "collapse",
+        "simplify",
+    ]
+    assert events[1][1] == {
+        "kind": "arn_type",
+        "service": "iam",
+        "access_levels": [LIST, READ],
+        "resource_type": "role",
+        "include_service_wide_actions": False,
+        "statements": 1,
+        "actions": 2,
+    }
+    assert events[2][1]["action"] == "ec2:DescribeRegions"
+    assert events[3][1]["policies"] == 2
@@ -11,11 +11,28 @@ def namespace(
     max_length=6144,
     auto_shorten=False,
     minimize=False,
+    minimizer=None,
     compact=False,
     action=None,
     file=None,
     no_wildcards=False,
+    print_plan=False,
     include_service_wide_actions=False,
+    no_cache=False,
+    no_index=False,
+    batch_dir=None,
+    output=None,
+    out_dir=None,
+    jobs=None,
+    executor="process",
+    incremental=False,
+    split=False,
+    import_profile=False,
+    profile=None,
+    profile_pstats=None,
+    trace=None,
+    stream=False,
+    socket=None,
 ):
     return Namespace(
         list=list,
@@ -25,11 +42,28 @@ def namespace(
         max_length=max_length,
         auto_shorten=auto_shorten,
         minimize=minimize,
+        minimizer=minimizer,
         compact=compact,
         action=action,
         file=file,
         no_wildcards=no_wildcards,
+        print_plan=print_plan,
         include_service_wide_actions=include_service_wide_actions,
+        no_cache=no_cache,
+        no_index=no_index,
+        batch_dir=batch_dir,
+        output=output,
+        out_dir=out_dir,
+        jobs=jobs,
+        executor=executor,
+        incremental=incremental,
+        split=split,
+        import_profile=import_profile,
+        profile=profile,
+        profile_pstats=profile_pstats,
+        trace=trace,
+        stream=stream,
+        socket=socket,
     )
 
 